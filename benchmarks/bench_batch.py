@@ -0,0 +1,66 @@
+"""
+Whole-pipeline wall time for a set of questions: run_pipeline in a loop
+vs. one run_pipeline_batch call. LLM stages go to the local stub
+chat-completions server, so their latency is controlled; retrieval and
+reranking run on the real engine and cross-encoder. Per-stage times show
+where batching the local models pays off.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_batch
+"""
+import logging
+logging.disable(logging.INFO)
+
+import io
+import os
+import time
+from contextlib import redirect_stdout
+from benchmarks.stub_llm_server import start_stub_server
+
+LLM_DELAY = 0.3   # simulated round-trip per LLM call, seconds
+
+server, base_url = start_stub_server(delay=LLM_DELAY)
+os.environ["GROQ_BASE_URL"] = base_url
+os.environ.setdefault("GROQ_API_KEY", "stub")
+
+from evaluate import TEST_QUESTIONS  # noqa: E402
+from src import rewriter  # noqa: E402
+from src.engine import embedding_cache, get_engine  # noqa: E402
+from src.pipeline import run_pipeline, run_pipeline_batch  # noqa: E402
+from src.reranker import score_cache  # noqa: E402
+
+# Every rewrite must reach the stub, and stub rewrites must not land on disk
+rewriter.rewrite_cache.disk = None
+
+def _stage_totals(results: list, batched: bool) -> dict:
+    keys = ("rewrite_s", "retrieval_s", "rerank_s")
+    # Batch-wide stages report the same time on every result
+    pick = (lambda k: results[0]["stage_timings"][k]) if batched else \
+           (lambda k: sum(r["stage_timings"][k] for r in results))
+    return {k: pick(k) for k in keys}
+
+if __name__ == "__main__":
+    engine = get_engine()
+    engine.bm25_index()
+    with redirect_stdout(io.StringIO()):   # warm up models and caches
+        run_pipeline(TEST_QUESTIONS[0], engine=engine, use_cache=False)
+
+    print(f"\n {len(TEST_QUESTIONS)} questions end to end (stub LLM {LLM_DELAY}s per call)")
+    print("="*78)
+    print(f"  {'':<22} {'rewrite':>10} {'retrieval':>10} {'rerank':>10} {'total':>10} {'LLM calls':>10}")
+    for label, batched in (("run_pipeline loop", False), ("run_pipeline_batch", True)):
+        rewriter.rewrite_cache.clear()
+        embedding_cache.clear()   # both sides embed and score every query
+        score_cache.clear()
+        t = time.perf_counter()
+        with redirect_stdout(io.StringIO()):
+            if batched:
+                results = run_pipeline_batch(TEST_QUESTIONS, engine=engine, use_cache=False)
+            else:
+                results = [run_pipeline(q, engine=engine, use_cache=False) for q in TEST_QUESTIONS]
+        total = time.perf_counter() - t
+        stages = _stage_totals(results, batched)
+        calls = sum(r["llm_calls"] for r in results)
+        print(f"  {label:<22} {stages['rewrite_s']:9.2f}s {stages['retrieval_s']:9.2f}s "
+              f"{stages['rerank_s']:9.2f}s {total:9.2f}s {calls:>10}")
+    server.shutdown()
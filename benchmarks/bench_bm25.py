@@ -0,0 +1,102 @@
+"""
+BM25 scoring + top-k selection: rank_bm25 (Python loop per doc + full
+argsort) vs. the CSR index in src/bm25_index.py (row gather + bincount +
+argpartition), on synthetic Zipfian corpora of 4k, 100k and 1M chunks.
+Indexes are built with BM25IndexWriter, as ingest builds them (chunk
+store and filter fields included).
+
+Also checks that the CSR scores are bit-identical to rank_bm25's.
+rank_bm25 keeps a Python dict per document, so the reference is skipped
+above REFERENCE_MAX_DOCS (it needs several GB at 1M chunks).
+
+    python -m benchmarks.bench_bm25
+"""
+import statistics
+import tempfile
+import time
+import numpy as np
+from rank_bm25 import BM25Okapi
+from src.bm25_index import BM25Index, BM25IndexWriter, top_k_indices
+
+CORPUS_SIZES = [4_000, 100_000, 1_000_000]
+REFERENCE_MAX_DOCS = 100_000
+VOCAB_SIZE = 50_000
+DOC_TOKENS = (30, 90)       # min/max tokens per synthetic chunk
+QUERY_TOKENS = 12           # about the length of a rewritten query
+NUM_QUERIES = 20
+TOP_K = 20
+WRITE_BATCH = 50_000        # docs per BM25IndexWriter.add call, as in ingest
+
+def synthetic_corpus(num_docs: int, rng):
+    lengths = rng.integers(DOC_TOKENS[0], DOC_TOKENS[1] + 1, size=num_docs)
+    tokens = (rng.zipf(1.3, size=int(lengths.sum())) - 1) % VOCAB_SIZE
+    return tokens, lengths
+
+def write_synthetic_index(path, tokens, lengths):
+    # The production layout: BM25IndexWriter with chunk store and filter fields
+    writer = BM25IndexWriter(path)
+    ends = np.cumsum(lengths)
+    for start in range(0, len(lengths), WRITE_BATCH):
+        stop = min(start + WRITE_BATCH, len(lengths))
+        docs = range(start, stop)
+        offset = int(ends[start - 1]) if start else 0
+        words = [f"w{t}" for t in tokens[offset:int(ends[stop - 1])].tolist()]
+        texts, pos = [], 0
+        for n in lengths[start:stop].tolist():
+            texts.append(" ".join(words[pos:pos + n]))
+            pos += n
+        metadatas = [{"ticker": f"T{i % 10}", "year": 2016 + i % 5, "source": f"T{i % 10} | {2016 + i % 5}"}
+                     for i in docs]
+        writer.add([f"chunk_{i}" for i in docs], texts, metadatas)
+    writer.finish()
+
+def reference_corpus(tokens, lengths) -> list:
+    words = [f"w{t}" for t in tokens.tolist()]
+    ends = np.cumsum(lengths).tolist()
+    starts = [0] + ends[:-1]
+    return [words[s:e] for s, e in zip(starts, ends)]
+
+def _time(fn, queries) -> list:
+    timings = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        timings.append((time.perf_counter() - t) * 1000)
+    return timings
+
+def run(num_docs: int, rng):
+    tokens, lengths = synthetic_corpus(num_docs, rng)
+    # Queries mix frequent and rare terms, like real rewritten queries
+    queries = [
+        [f"w{t}" for t in ((rng.zipf(1.1, size=QUERY_TOKENS) - 1) % VOCAB_SIZE).tolist()]
+        for _ in range(NUM_QUERIES)
+    ]
+
+    with tempfile.TemporaryDirectory() as path:
+        write_synthetic_index(path, tokens, lengths)
+        index = BM25Index(path)
+        csr = _time(lambda q: top_k_indices(index.get_scores(q), TOP_K), queries)
+
+        ref = None
+        exact = "skipped"
+        if num_docs <= REFERENCE_MAX_DOCS:
+            bm25 = BM25Okapi(reference_corpus(tokens, lengths))
+            ref = _time(lambda q: np.argsort(bm25.get_scores(q))[::-1][:TOP_K], queries)
+            exact = all(
+                np.array_equal(index.get_scores(q), bm25.get_scores(q)) for q in queries
+            )
+        postings = len(index.postings_doc)
+        del index  # release the memory maps before the directory is removed
+
+    print(f"\n  {num_docs:>9,} chunks | postings: {postings:,} | identical scores: {exact}")
+    print(f"    CSR + argpartition : median {statistics.median(csr):9.2f} ms")
+    if ref is not None:
+        print(f"    rank_bm25 + argsort: median {statistics.median(ref):9.2f} ms "
+              f"({statistics.median(ref) / statistics.median(csr):.0f}x slower)")
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(42)
+    print("\n BM25 scoring + top-k latency per query")
+    print("="*70)
+    for n in CORPUS_SIZES:
+        run(n, rng)
@@ -0,0 +1,96 @@
+"""
+Stage 4 wall time: sequential vs. concurrent vs. batched CRAG grading,
+against the local stub chat-completions server (no Groq quota used),
+then the correction path (query refinement included) on a stub retriever
+and reranker: grading the refined query's top 3 (the old path) vs. the
+merged, reranked pool graded until CRAG_TARGET_RELEVANT are found.
+
+    python -m benchmarks.bench_crag
+"""
+import io
+import json
+import os
+import time
+from contextlib import redirect_stdout
+from benchmarks.stub_llm_server import start_stub_server
+
+LLM_DELAY = 0.4   # simulated round-trip per call, seconds
+
+def _reply(prompt: str) -> str:
+    # Odd-numbered chunks are irrelevant, so grade order can be checked
+    if "JSON array of" in prompt:
+        chunks = prompt.split("\nChunk ")[1:]
+        return json.dumps(["IRRELEVANT" if "odd chunk" in c else "RELEVANT" for c in chunks])
+    return "IRRELEVANT" if "odd chunk" in prompt else "RELEVANT"
+
+server, base_url = start_stub_server(delay=LLM_DELAY, reply=_reply)
+os.environ["GROQ_BASE_URL"] = base_url
+os.environ.setdefault("GROQ_API_KEY", "stub")
+
+from src.crag import _correct, grade_chunks, grade_chunks_batch, refine_query  # noqa: E402
+
+def make_chunks(n: int, start: int = 0) -> list:
+    return [
+        {"id": f"c{i}", "source": f"STUB | {i}", "text": f"{'odd' if i % 2 else 'even'} chunk number {i}"}
+        for i in range(start, start + n)
+    ]
+
+def bench_correction(question: str):
+    # First pass: the top 3 of a 20-chunk pool, all irrelevant. The refined
+    # retrieval overlaps that pool by half, and the stub reranker puts the
+    # relevant chunks only the refined query found first.
+    pool = make_chunks(20)
+    first = [c for c in pool if int(c["id"][1:]) % 2][:3]
+    refined = make_chunks(20, start=10)
+    refined_only = {c["id"] for c in refined} - {c["id"] for c in pool}
+    rank = lambda c: (c["id"] not in refined_only, int(c["id"][1:]) % 2, int(c["id"][1:]))
+
+    def retrieve_fn(query, top_k=20):
+        return [dict(c) for c in refined]
+
+    def rerank_fn(query, chunks, top_k=3):
+        assert query != question, "the merged pool must be reranked against the refined query"
+        ranked = sorted(chunks, key=rank)[:top_k]
+        for c in ranked:
+            c["rerank_score"] = 0.5  # as src.reranker.rerank does, inside the LLM band
+        return ranked
+
+    t = time.perf_counter()
+    refine_query(question)
+    grades = grade_chunks(question, refined[:3])
+    elapsed = time.perf_counter() - t
+    print(f"  correction | refined top 3 (old) | {elapsed:5.2f}s | 3 grading calls, "
+          f"{grades.count('RELEVANT')} relevant")
+
+    chunks = [dict(c, crag_grade="IRRELEVANT", crag_gated=False) for c in first]
+    stats = {"llm_calls": 0}
+    t = time.perf_counter()
+    with redirect_stdout(io.StringIO()):
+        final = _correct(question, chunks, pool, retrieve_fn, rerank_fn, "parallel", stats, None, None)
+    elapsed = time.perf_counter() - t
+    assert all(c["crag_grade"] == "RELEVANT" for c in final), final
+    assert any(c["id"] in refined_only for c in final), "no refined-only chunk reached the final set"
+    assert not any("rerank_score" in c for c in pool + chunks), "caller's chunks were rescored"
+    print(f"  correction | merged + reranked   | {elapsed:5.2f}s | "
+          f"{stats['llm_calls'] - 1} grading calls, {len(final)} relevant")
+
+if __name__ == "__main__":
+    question = "How did NVIDIA discuss AI and GPU demand?"
+    print(f"\n CRAG grading wall time (stub round-trip {LLM_DELAY}s)")
+    print("="*60)
+    for n in (3, 6):
+        chunks = make_chunks(n)
+        expected = ["IRRELEVANT" if i % 2 else "RELEVANT" for i in range(n)]
+        for label, workers in (("sequential", 1), ("concurrent", 4)):
+            t = time.perf_counter()
+            grades = grade_chunks(question, chunks, max_workers=workers)
+            elapsed = time.perf_counter() - t
+            assert grades == expected, grades
+            print(f"  {n} chunks | {label:<10} | {elapsed:5.2f}s | {n} LLM calls")
+        t = time.perf_counter()
+        grades = grade_chunks_batch(question, chunks)
+        elapsed = time.perf_counter() - t
+        assert grades == expected, grades
+        print(f"  {n} chunks | {'batch':<10} | {elapsed:5.2f}s | 1 LLM call")
+    bench_correction(question)
+    server.shutdown()
@@ -0,0 +1,67 @@
+"""
+Query embedding cache under a repeating workload: retrieval queries are
+drawn with a Zipf-like skew from a fixed pool (popular rewrites come
+back often, as across users), and every query also runs a CRAG-style
+second retrieval on a refined form of itself. Each query runs through
+hybrid_retrieve with the shared embedding cache, then again with a
+zero-byte cache that never hits. The report shows the hit rate, the
+embedding time saved and the retrieval latency.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_embed_cache
+"""
+import logging
+logging.disable(logging.INFO)
+
+import random
+import statistics
+import time
+from src import engine as engine_module
+from src.cache import EmbeddingCache
+from src.engine import get_engine
+from src.hybrid_retriever import hybrid_retrieve
+from src.warmup import warmup
+
+POOL = [
+    "Apple Inc AAPL iPhone revenue growth guidance",
+    "NVIDIA GPU data center AI demand",
+    "supply chain disruption COVID-19 2020",
+    "Intel risk factors competition manufacturing delays",
+    "Microsoft Azure cloud revenue growth",
+    "AMD EPYC Ryzen market share versus Intel",
+    "Amazon AWS revenue growth guidance",
+    "gross margin expansion semiconductor companies",
+    "research and development investment spending",
+    "Micron DRAM NAND pricing outlook",
+]
+QUERIES = 200
+SKEW = 1.2   # Zipf exponent over POOL
+
+def workload(seed: int = 0) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** SKEW for rank in range(len(POOL))]
+    return rng.choices(POOL, weights=weights, k=QUERIES)
+
+def run(engine, queries: list) -> list:
+    timings = []
+    for q in queries:
+        t = time.perf_counter()
+        hybrid_retrieve(q, top_k=20, engine=engine)
+        hybrid_retrieve(f"{q} earnings call commentary", top_k=20, engine=engine)   # CRAG refine
+        timings.append(time.perf_counter() - t)
+    return timings
+
+if __name__ == "__main__":
+    engine = get_engine()
+    warmup(engine, wait=True)
+    queries = workload()
+
+    print(f"\n {QUERIES} queries (+ a refined re-retrieval each) over {len(POOL)} distinct texts")
+    print("="*78)
+    for label, cache in (("embedding cache", EmbeddingCache()), ("no cache", EmbeddingCache(max_bytes=0))):
+        engine_module.embedding_cache = cache
+        ms = [t * 1000 for t in run(engine, queries)]
+        stats = cache.stats()
+        print(f"  {label:<16} median {statistics.median(ms):7.1f} ms | mean {statistics.mean(ms):7.1f} ms | "
+              f"hit rate {stats['hit_rate']:.2f} | embedded {stats['misses']:>3} texts in "
+              f"{stats['embed_s']:.2f}s | saved {stats['saved_s']:.2f}s | {stats['bytes'] / 1024:.0f} KiB")
@@ -0,0 +1,185 @@
+"""
+Offline Basic vs Advanced RAG benchmark over a labeled question set.
+LLM stages are replayed from recorded fixtures (src.llm), so only the
+local models (embedder, BM25, cross-encoder) do real work and runs are
+deterministic. Each pipeline answers every question WORKERS at a time;
+the report has per-stage p50/p95/p99 (from each result's trace),
+end-to-end latency percentiles, queries/sec and recall@k of the chunks
+answered from against each question's labeled source transcripts. It
+is printed and written as JSON for comparing runs.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_eval --record   # once, against live Groq
+    python -m benchmarks.bench_eval            # replay: offline, no quota
+    python -m benchmarks.bench_eval --stub     # local stub server, no fixtures needed
+Options: --out PATH (default benchmarks/results/eval-<time>.json), --workers N
+"""
+import logging
+logging.disable(logging.INFO)
+
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+
+WORKERS = 8
+RECALL_K = 3
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+def _option(name: str, default=None):
+    return sys.argv[sys.argv.index(name) + 1] if name in sys.argv else default
+
+MODE = "record" if "--record" in sys.argv else "stub" if "--stub" in sys.argv else "replay"
+if MODE == "stub":
+    from benchmarks.stub_llm_server import start_stub_server
+    server, base_url = start_stub_server()
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+else:
+    os.environ["LLM_FIXTURE_MODE"] = MODE   # read by src.llm at import
+
+from evaluate import TEST_QUESTIONS, basic_rag  # noqa: E402
+from src import rewriter  # noqa: E402
+from src.engine import embedding_cache, get_engine  # noqa: E402
+from src.filters import transcript_fields  # noqa: E402
+from src.llm import LLM_FIXTURE_PATH, get_gateway  # noqa: E402
+from src.pipeline import run_pipeline  # noqa: E402
+from src.reranker import score_cache  # noqa: E402
+from src.tracing import percentiles, stage_percentiles  # noqa: E402
+from src.warmup import warmup  # noqa: E402
+
+COMPANIES = {
+    "AAPL": "Apple", "AMZN": "Amazon", "MSFT": "Microsoft", "GOOGL": "Google", "NVDA": "NVIDIA",
+    "AMD": "AMD", "INTC": "Intel", "CSCO": "Cisco", "ASML": "ASML", "MU": "Micron",
+}
+TOPICS = [
+    ("What did {name} say about revenue growth and guidance in {year}?", 2018),
+    ("How did {name} describe gross margin trends in {year}?", 2020),
+    ("What risks did {name} highlight in their earnings calls?", None),
+    ("How did {name} talk about capital returns and share buybacks?", None),
+]
+
+# (question, labeled tickers, labeled years or None); unlabeled questions
+# count toward latency and throughput but not recall
+LABELED_QUESTIONS = [
+    (TEST_QUESTIONS[0], ["AAPL"], [2018]),
+    (TEST_QUESTIONS[1], ["NVDA"], None),
+    (TEST_QUESTIONS[3], ["INTC"], None),
+    (TEST_QUESTIONS[4], ["MSFT"], None),
+    (TEST_QUESTIONS[6], ["AMD"], None),
+    (TEST_QUESTIONS[8], ["AMZN"], None),
+] + [
+    (template.format(name=name, year=year), [ticker], [year] if year else None)
+    for ticker, name in COMPANIES.items()
+    for template, year in TOPICS
+] + [
+    (q, None, None) for i, q in enumerate(TEST_QUESTIONS) if i in (2, 5, 7, 9)
+]
+
+def _matches(source: str, tickers: list, years: list) -> bool:
+    # "MU | 2019-Dec-18" against the labels
+    ticker, _, date = source.partition(" | ")
+    fields = transcript_fields(f"{date}-{ticker}")
+    return fields["ticker"] in tickers and (not years or fields["year"] in years)
+
+def recall_at_k(chunks: list, tickers: list, years: list, sources: list, k: int = RECALL_K) -> float:
+    """
+    Share of the labeled transcripts found among the first k chunks,
+    out of the most k chunks could find (min(k, labeled transcripts)).
+    """
+    relevant = {s for s in sources if _matches(s, tickers, years)}
+    if not relevant:
+        return None
+    found = {c["source"] for c in chunks[:k]} & relevant
+    return len(found) / min(k, len(relevant))
+
+def run_phase(label: str, fn, workers: int) -> tuple:
+    # Every question through fn, `workers` at a time; returns (results, wall seconds)
+    def timed(question):
+        t = time.perf_counter()
+        result = fn(question)
+        result["latency_s"] = time.perf_counter() - t
+        return result
+
+    t = time.perf_counter()
+    with redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(timed, [q for q, _, _ in LABELED_QUESTIONS]))
+    return results, time.perf_counter() - t
+
+def summarize(results: list, chunks_key: str, wall: float, sources: list) -> dict:
+    recalls = [
+        recall_at_k(r[chunks_key], tickers, years, sources)
+        for r, (_, tickers, years) in zip(results, LABELED_QUESTIONS) if tickers
+    ]
+    recalls = [r for r in recalls if r is not None]
+    traces = [r["trace"] for r in results]
+    spans = [s for t in traces for s in t["spans"]]
+    return {
+        "queries": len(results),
+        "wall_s": round(wall, 4),
+        "qps": round(len(results) / wall, 3),
+        "latency_s": percentiles([r["latency_s"] for r in results]),
+        f"recall@{RECALL_K}": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "recall_questions": len(recalls),
+        "llm_calls": sum(s["llm_calls"] for s in spans),
+        "prompt_tokens": sum(s["prompt_tokens"] for s in spans),
+        "completion_tokens": sum(s["completion_tokens"] for s in spans),
+        "stages": stage_percentiles(traces),
+        "embedding_cache": embedding_cache.stats(),
+        "rerank_score_cache": score_cache.stats(),
+    }
+
+if __name__ == "__main__":
+    if MODE == "replay" and not os.path.exists(LLM_FIXTURE_PATH):
+        sys.exit(f" No fixtures at {LLM_FIXTURE_PATH}: record them first with --record (or use --stub)")
+    workers = int(_option("--workers", WORKERS))
+    out = _option("--out", os.path.join(RESULTS_DIR, time.strftime("eval-%Y%m%d-%H%M%S.json")))
+
+    engine = get_engine()
+    warmup(engine, wait=True)   # model and index loads stay out of the latencies
+    sources = list(engine.chunk_store().sources) if not engine.use_shards else []
+    rewriter.rewrite_cache.disk = None   # every rewrite goes through the LLM layer
+    rewriter.rewrite_cache.clear()
+
+    print(f"\n {len(LABELED_QUESTIONS)} questions, {workers} at a time, LLM: {MODE}")
+    print("="*92)
+    report = {
+        "run": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "llm_mode": MODE,
+            "fixtures": LLM_FIXTURE_PATH if MODE != "stub" else None,
+            "workers": workers,
+            "questions": len(LABELED_QUESTIONS),
+            "recall_k": RECALL_K,
+        },
+        "pipelines": {},
+    }
+    phases = (
+        ("basic", basic_rag, "chunks"),
+        ("advanced", lambda q: run_pipeline(q, engine=engine, use_cache=False), "final_chunks"),
+    )
+    for label, fn, chunks_key in phases:
+        get_gateway().reset_usage()
+        embedding_cache.clear()
+        score_cache.clear()
+        results, wall = run_phase(label, fn, workers)
+        summary = summarize(results, chunks_key, wall, sources)
+        report["pipelines"][label] = summary
+        lat = summary["latency_s"]
+        recall = summary[f"recall@{RECALL_K}"]
+        print(f"  {label:<9} {summary['qps']:6.2f} q/s | latency p50 {lat['p50']:.3f}s "
+              f"p95 {lat['p95']:.3f}s p99 {lat['p99']:.3f}s | "
+              f"recall@{RECALL_K} {recall if recall is None else f'{recall:.3f}'} | "
+              f"LLM calls {summary['llm_calls']}")
+        for stage, row in sorted(summary["stages"].items(), key=lambda x: -x[1]["p95"]):
+            print(f"      {stage:<22} p50 {row['p50']:.4f}s  p95 {row['p95']:.4f}s  p99 {row['p99']:.4f}s")
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n Saved to: {out}")
+    if MODE == "stub":
+        server.shutdown()
@@ -0,0 +1,94 @@
+"""
+Ingest throughput per stage on a synthetic corpus of 10k transcripts:
+
+  read + chunk   serial loop vs. process pool (all 10k files)
+  embed + store  old path (Chroma embeds 100 documents per add) vs.
+                 SentenceTransformer.encode in large batches + upsert of
+                 precomputed vectors, on a sample of EMBED_SAMPLE chunks
+                 (embedding the full ~260k chunks takes hours on CPU)
+
+    python -m benchmarks.bench_ingest
+"""
+import logging
+logging.disable(logging.INFO)
+
+import os
+import tempfile
+import time
+import numpy as np
+import chromadb
+from chromadb.utils import embedding_functions
+from src.engine import EMBED_MODEL
+from src.ingest import (
+    EMBED_BATCH_SIZE, INGEST_WORKERS, STORE_BATCH_SIZE,
+    embed_texts, iter_transcripts, load_embedder,
+)
+
+NUM_TRANSCRIPTS = 10_000
+TRANSCRIPT_WORDS = (6_000, 12_000)   # real transcripts average ~9k words
+VOCAB_SIZE = 20_000
+EMBED_SAMPLE = 2_000
+TICKERS = ["AAPL", "AMZN", "MSFT", "GOOGL", "NVDA", "AMD", "INTC", "CSCO", "ASML", "MU"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+def write_corpus(path: str, rng) -> list:
+    vocab = np.array([f"term{i}" for i in range(VOCAB_SIZE)])
+    paths = []
+    for i in range(NUM_TRANSCRIPTS):
+        # Unique names: the ticker slot carries a counter
+        name = (f"{2000 + i % 25}-{MONTHS[i % 12]}-{1 + i % 28:02d}-"
+                f"{TICKERS[i % len(TICKERS)]}{i // len(TICKERS)}.txt")
+        n = int(rng.integers(*TRANSCRIPT_WORDS))
+        words = vocab[(rng.zipf(1.2, size=n) - 1) % VOCAB_SIZE]
+        with open(os.path.join(path, name), "w", encoding="utf-8") as f:
+            f.write(" ".join(words.tolist()))
+        paths.append(os.path.join(path, name))
+    return paths
+
+def _report(stage: str, label: str, n: int, seconds: float):
+    print(f"  {stage:<14} {label:<34} {n:>8,} chunks {seconds:8.1f}s "
+          f"{n / seconds:10,.0f} chunks/sec")
+
+if __name__ == "__main__":
+    rng = np.random.default_rng(7)
+    with tempfile.TemporaryDirectory() as root:
+        print(f"\n Writing {NUM_TRANSCRIPTS:,} synthetic transcripts...")
+        paths = write_corpus(root, rng)
+
+        print(f"\n Ingest throughput per stage ({INGEST_WORKERS} CPU workers)")
+        print("="*90)
+        for label, workers in (("serial", 1), (f"process pool ({INGEST_WORKERS})", INGEST_WORKERS)):
+            t = time.perf_counter()
+            parsed = list(iter_transcripts(paths, workers))
+            n = sum(len(doc["chunks"]) for doc in parsed)
+            _report("read + chunk", label, n, time.perf_counter() - t)
+
+        texts = [c["text"] for doc in parsed for c in doc["chunks"]][:EMBED_SAMPLE]
+        ids = [cid for doc in parsed for cid in doc["chunk_ids"]][:EMBED_SAMPLE]
+        metadatas = [{"source": c["source"]} for doc in parsed for c in doc["chunks"]][:EMBED_SAMPLE]
+        del parsed
+
+        client = chromadb.PersistentClient(path=os.path.join(root, "chroma"))
+        ef = embedding_functions.SentenceTransformerEmbeddingFunction(model_name=EMBED_MODEL)
+        ef(["warm up"])
+
+        old = client.create_collection("old", embedding_function=ef)
+        t = time.perf_counter()
+        for i in range(0, len(texts), 100):
+            old.add(documents=texts[i:i + 100], metadatas=metadatas[i:i + 100], ids=ids[i:i + 100])
+        _report("embed + store", "Chroma ef, add 100 at a time", len(texts), time.perf_counter() - t)
+
+        model = load_embedder()
+        model.encode(["warm up"])
+        new = client.create_collection("new", embedding_function=None)
+        t = time.perf_counter()
+        embeddings = embed_texts(model, texts, EMBED_BATCH_SIZE)
+        embed_s = time.perf_counter() - t
+        for i in range(0, len(texts), STORE_BATCH_SIZE):
+            new.upsert(ids=ids[i:i + STORE_BATCH_SIZE], embeddings=embeddings[i:i + STORE_BATCH_SIZE],
+                       documents=texts[i:i + STORE_BATCH_SIZE], metadatas=metadatas[i:i + STORE_BATCH_SIZE])
+        total_s = time.perf_counter() - t
+        _report("embed", f"encode, batch {EMBED_BATCH_SIZE}", len(texts), embed_s)
+        _report("store", f"upsert vectors, {STORE_BATCH_SIZE} at a time", len(texts), total_s - embed_s)
+        _report("embed + store", "staged pipeline", len(texts), total_s)
+        del old, new, client
@@ -0,0 +1,71 @@
+"""
+The shared LLM gateway against the local stub chat-completions server:
+  1. retries — the stub fails the first calls with 429 / 503, and every
+     call still succeeds after jittered backoff (honouring Retry-After);
+  2. pacing — a burst of concurrent calls against a low requests-per-minute
+     limit, showing that calls queue in the token bucket instead of being
+     rejected by the endpoint;
+  3. connection reuse — sequential calls over the pooled client vs. a new
+     client per call (what each stage module used to hold separately).
+
+Run from the project root:
+    python -m benchmarks.bench_llm_gateway
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from groq import Groq
+from benchmarks.stub_llm_server import start_stub_server
+from src.llm import LLMGateway
+
+CALLS = 20
+BURST_RPM = 120   # 2 calls/s once the bucket's first minute of capacity is spent
+MESSAGES = [{"role": "user", "content": "Which companies mentioned supply chain issues?"}]
+
+def _usage_line(label: str, gateway: LLMGateway, total: float):
+    u = gateway.usage()["bench"]
+    print(f"  {label:<26} calls {u['calls']:>3} | retries {u['retries']:>2} | errors {u['errors']:>2} | "
+          f"queued {u['queue_s']:6.2f}s (max {u['max_queue_s']:.2f}s) | {total:6.2f}s")
+
+def bench_retries():
+    server, url = start_stub_server(failures=(429, 503, 429, 503), retry_after=0.5)
+    gateway = LLMGateway(base_url=url, api_key="stub")
+    t = time.perf_counter()
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(lambda _: gateway.chat("bench", MESSAGES), range(4)))
+    _usage_line("4 calls, 4 injected fails", gateway, time.perf_counter() - t)
+    server.shutdown()
+
+def bench_pacing():
+    server, url = start_stub_server(delay=0.05)
+    gateway = LLMGateway(rpm=BURST_RPM, base_url=url, api_key="stub")
+    gateway.bucket._requests = 0.0   # start with an empty bucket so the limit binds
+    t = time.perf_counter()
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: gateway.chat("bench", MESSAGES), range(CALLS)))
+    _usage_line(f"{CALLS} calls at {BURST_RPM} rpm", gateway, time.perf_counter() - t)
+    server.shutdown()
+
+def bench_reuse():
+    server, url = start_stub_server()
+    gateway = LLMGateway(base_url=url, api_key="stub")
+    t = time.perf_counter()
+    for _ in range(CALLS):
+        gateway.chat("bench", MESSAGES)
+    pooled = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for _ in range(CALLS):
+        client = Groq(api_key="stub", base_url=url)
+        client.chat.completions.create(model="stub", messages=MESSAGES)
+        client.close()
+    fresh = time.perf_counter() - t
+    print(f"  {CALLS} sequential calls: pooled gateway {pooled * 1000 / CALLS:.1f} ms/call | "
+          f"new client per call {fresh * 1000 / CALLS:.1f} ms/call")
+    server.shutdown()
+
+if __name__ == "__main__":
+    print("\n LLM gateway against the stub server")
+    print("="*100)
+    bench_retries()
+    bench_pacing()
+    bench_reuse()
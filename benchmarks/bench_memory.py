@@ -0,0 +1,104 @@
+"""
+Worker memory for chunk lookups on a synthetic corpus of NUM_CHUNKS
+400-word chunks:
+
+  dicts   every chunk held as a Python dict of id/text/source, the way
+          the old in-process chunk list did
+  mmap    ChunkStore: texts and offsets memory-mapped, integer chunk ids,
+          text decoded only for the chunks a query returns
+
+Each layout is loaded in a fresh process; RSS is read from /proc (Linux).
+File-backed pages of the memory map are shared by every worker on the
+host, anonymous memory is per worker.
+
+    python -m benchmarks.bench_memory
+"""
+import multiprocessing as mp
+import tempfile
+import time
+import numpy as np
+from src.bm25_index import BM25Index, BM25IndexWriter
+from src.chunk_store import ChunkStore
+from src.ingest import CHUNK_SIZE
+
+NUM_CHUNKS = 200_000
+VOCAB_SIZE = 20_000
+BATCH = 10_000
+LOOKUPS = 1_000      # queries, each materializing TOP_K chunks
+TOP_K = 20
+TICKERS = ["AAPL", "AMZN", "MSFT", "GOOGL", "NVDA", "AMD", "INTC", "CSCO", "ASML", "MU"]
+
+def write_index(path: str):
+    rng = np.random.default_rng(7)
+    vocab = np.array([f"term{i}" for i in range(VOCAB_SIZE)])
+    writer = BM25IndexWriter(path)
+    for start in range(0, NUM_CHUNKS, BATCH):
+        ids, texts = [], []
+        for i in range(start, min(start + BATCH, NUM_CHUNKS)):
+            words = vocab[(rng.zipf(1.2, size=CHUNK_SIZE) - 1) % VOCAB_SIZE]
+            ids.append(f"{2000 + i % 25}-Jan-01-{TICKERS[i % len(TICKERS)]}:{i:016x}")
+            texts.append(" ".join(words.tolist()))
+        writer.add(ids, texts)
+    writer.finish()
+
+def _rss_mb() -> dict:
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            key, _, value = line.partition(":")
+            if key in ("VmRSS", "RssAnon", "RssFile"):
+                fields[key] = int(value.split()[0]) / 1024
+    return fields
+
+def _measure(layout: str, path: str, queue):
+    base = _rss_mb()
+    t = time.perf_counter()
+    ids = BM25Index(path).chunk_ids
+    if layout == "dicts":
+        store = ChunkStore(path)
+        chunks = {
+            cid: {"id": cid, "text": store.text(i), "source": store.source(i)}
+            for i, cid in enumerate(ids)
+        }
+        del store
+        lookup = lambda docs: [chunks[ids[d]] for d in docs]
+    else:
+        store = ChunkStore(path)
+        lookup = lambda docs: [
+            {"id": ids[d], "doc": d, "text": store.text(d), "source": store.source(d)} for d in docs
+        ]
+    load_s = time.perf_counter() - t
+
+    rng = np.random.default_rng(0)
+    queries = rng.integers(0, len(ids), size=(LOOKUPS, TOP_K))
+    t = time.perf_counter()
+    for docs in queries:
+        lookup(docs.tolist())
+    lookup_ms = (time.perf_counter() - t) / LOOKUPS * 1000
+
+    rss = _rss_mb()
+    queue.put({
+        "load_s": load_s,
+        "lookup_ms": lookup_ms,
+        "rss": rss["VmRSS"] - base["VmRSS"],
+        "anon": rss["RssAnon"] - base["RssAnon"],
+        "file": rss["RssFile"] - base["RssFile"],
+    })
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as path:
+        print(f"\n Writing {NUM_CHUNKS:,} synthetic chunks...")
+        write_index(path)
+
+        ctx = mp.get_context("spawn")
+        print(f"\n Worker memory after load + {LOOKUPS:,} lookups of top {TOP_K} (MB over baseline)")
+        print("="*80)
+        print(f"  {'layout':<8} {'load':>8} {'lookup':>11} {'RSS':>9} {'anon':>9} {'file (shared)':>15}")
+        for layout in ("dicts", "mmap"):
+            queue = ctx.Queue()
+            proc = ctx.Process(target=_measure, args=(layout, path, queue))
+            proc.start()
+            r = queue.get()
+            proc.join()
+            print(f"  {layout:<8} {r['load_s']:7.2f}s {r['lookup_ms']:8.3f} ms "
+                  f"{r['rss']:9.1f} {r['anon']:9.1f} {r['file']:15.1f}")
@@ -0,0 +1,85 @@
+"""
+Cross-encoder cost per reranker setting. Every question's 20 hybrid
+candidates are reranked under each RERANK_MODES entry (and each thread
+count in THREADS), with the score cache cleared before each query.
+Reported: per-query latency, and agreement with the "accurate" mode:
+how many of its top 3 chunks each setting also picks (overlap@3) and
+how often both put the same chunk first (top-1). A final pass re-asks
+every question and reranks the union with a CRAG-style second pool
+under the default mode with the cache kept warm, to show what the score
+cache saves.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_rerank
+"""
+import logging
+logging.disable(logging.INFO)
+
+import os
+import statistics
+import time
+from evaluate import TEST_QUESTIONS
+from src import reranker
+from src.engine import get_engine
+from src.hybrid_retriever import hybrid_retrieve
+
+TOP_K = 3
+THREADS = sorted({1, 2, os.cpu_count() or 1})
+REFERENCE = "accurate"
+
+def _ids(chunks: list) -> list:
+    return [c["id"] for c in chunks]
+
+def run(pools: list) -> tuple:
+    # Reranks each (question, pool) from a cold score cache; returns (timings, top-k ids)
+    reranker.get_ranker()   # model load stays out of the timings
+    timings, tops = [], []
+    for q, pool in pools:
+        reranker.score_cache.clear()
+        t = time.perf_counter()
+        top = reranker.rerank(q, [dict(c) for c in pool], top_k=TOP_K)
+        timings.append(time.perf_counter() - t)
+        tops.append(_ids(top))
+    return timings, tops
+
+def agreement(tops: list, reference: list) -> tuple:
+    overlap = statistics.mean(len(set(a) & set(b)) / TOP_K for a, b in zip(tops, reference))
+    top1 = statistics.mean(a[:1] == b[:1] for a, b in zip(tops, reference))
+    return overlap, top1
+
+def _report(label: str, timings: list, overlap: float, top1: float):
+    ms = [t * 1000 for t in timings]
+    print(f"  {label:<40} median {statistics.median(ms):7.1f} ms | max {max(ms):7.1f} ms | "
+          f"overlap@{TOP_K} {overlap:5.2f} | top-1 {top1:5.2f}")
+
+if __name__ == "__main__":
+    engine = get_engine()
+    pools = [(q, hybrid_retrieve(q, top_k=20, engine=engine)) for q in TEST_QUESTIONS]
+    mode, threads = reranker.RERANK_MODE, reranker.RERANK_THREADS
+
+    print(f"\n Reranking {len(pools)} questions x 20 candidates, score cache cleared per query")
+    print("="*102)
+    reranker.RERANK_MODE, reranker.RERANK_THREADS = REFERENCE, None
+    _, reference = run(pools)
+    for name, settings in reranker.RERANK_MODES.items():
+        for n in (None, *THREADS):
+            reranker.RERANK_MODE, reranker.RERANK_THREADS = name, n
+            timings, tops = run(pools)
+            label = f"{name:<8} {settings['model'][9:]:<15} {settings['max_tokens']:>3} tok {n or 'all':>3} thr"
+            _report(label, timings, *agreement(tops, reference))
+
+    # A refined re-retrieval mostly returns chunks the first rerank already scored
+    reranker.RERANK_MODE, reranker.RERANK_THREADS = mode, threads
+    refined = [(q, hybrid_retrieve(f"{q} financial results", top_k=20, engine=engine)) for q in TEST_QUESTIONS]
+    for label, keep in (("second pass, cache cleared", False), ("second pass, cache kept", True)):
+        timings = []
+        for (q, pool), (_, again) in zip(pools, refined):
+            reranker.score_cache.clear()
+            reranker.rerank(q, [dict(c) for c in pool], top_k=TOP_K)
+            if not keep:
+                reranker.score_cache.clear()
+            t = time.perf_counter()
+            reranker.rerank(q, [dict(c) for c in again], top_k=TOP_K)
+            timings.append(time.perf_counter() - t)
+        ms = [t * 1000 for t in timings]
+        print(f"  {label:<40} median {statistics.median(ms):7.1f} ms | max {max(ms):7.1f} ms")
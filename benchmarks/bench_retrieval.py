@@ -0,0 +1,63 @@
+"""
+Per-query retrieval latency: rebuilding the embedder + Chroma client on
+every call (the old behaviour) vs. one resident RetrievalEngine.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_retrieval
+"""
+import logging
+logging.disable(logging.INFO)
+
+import statistics
+import time
+from src.engine import RetrievalEngine, embedding_cache
+from src.hybrid_retriever import hybrid_retrieve
+
+QUERIES = [
+    "Apple Inc AAPL iPhone revenue growth guidance",
+    "NVIDIA GPU data center AI demand",
+    "supply chain disruption COVID-19 2020",
+    "Intel risk factors competition manufacturing delays",
+    "Microsoft Azure cloud revenue growth",
+]
+ROUNDS = 3
+
+def _report(label: str, timings: list):
+    ms = [t * 1000 for t in timings]
+    print(f"  {label:<28} mean {statistics.mean(ms):8.1f} ms | "
+          f"median {statistics.median(ms):8.1f} ms | max {max(ms):8.1f} ms")
+
+def bench_rebuild_per_query(warm: RetrievalEngine) -> list:
+    timings = []
+    for _ in range(ROUNDS):
+        for q in QUERIES:
+            embedding_cache.clear()   # measure the embedding too (see bench_embed_cache)
+            t = time.perf_counter()
+            engine = RetrievalEngine()
+            # The old code cached BM25 at module level, so only the embedder
+            # and client were rebuilt per call — share the warm BM25 state.
+            engine._bm25 = warm.bm25_index()
+            hybrid_retrieve(q, top_k=20, engine=engine)
+            timings.append(time.perf_counter() - t)
+    return timings
+
+def bench_resident(engine: RetrievalEngine) -> list:
+    timings = []
+    for _ in range(ROUNDS):
+        for q in QUERIES:
+            embedding_cache.clear()   # measure the embedding too (see bench_embed_cache)
+            t = time.perf_counter()
+            hybrid_retrieve(q, top_k=20, engine=engine)
+            timings.append(time.perf_counter() - t)
+    return timings
+
+if __name__ == "__main__":
+    print("\n Warming up resident engine...")
+    engine = RetrievalEngine()
+    engine.bm25_index()
+    hybrid_retrieve(QUERIES[0], top_k=20, engine=engine)
+
+    print(f"\n Per-query hybrid retrieval latency ({ROUNDS * len(QUERIES)} queries)")
+    print("="*70)
+    _report("before (rebuild per query)", bench_rebuild_per_query(engine))
+    _report("after (resident engine)", bench_resident(engine))
@@ -0,0 +1,91 @@
+"""
+Stages 1 + 2 wall time: rewrite-then-retrieve vs. speculative retrieval
+on the original question while the rewrite is in flight. The rewrite goes
+to the local stub chat-completions server, so its latency is controlled.
+
+Two cases: the rewrite differs from the question (Stage 2 still has to
+retrieve for it, speculation only widens the pool), and the rewrite comes
+back unchanged (the speculative pool is used as is). Only the second
+case can save time; in the first, the merged pool also makes Stage 3
+rerank up to twice as many chunks, which is not included here.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_speculative
+"""
+import logging
+logging.disable(logging.INFO)
+
+import io
+import os
+import statistics
+import time
+from contextlib import redirect_stdout
+from functools import partial
+from benchmarks.stub_llm_server import default_reply, start_stub_server
+
+LLM_DELAY = 0.3   # simulated rewrite round-trip, seconds
+ROUNDS = 3
+QUERIES = [
+    "How is Apple doing?",
+    "What did NVIDIA say about AI demand?",
+    "What risks did companies mention in 2020?",
+    "How fast is Azure growing?",
+    "Did Intel talk about manufacturing delays?",
+]
+
+echo_rewrites = False
+
+def _reply(prompt: str) -> str:
+    if echo_rewrites and "User Question: " in prompt:
+        return prompt.split("User Question: ")[1].split("\n")[0]
+    return default_reply(prompt)
+
+server, base_url = start_stub_server(delay=LLM_DELAY, reply=_reply)
+os.environ["GROQ_BASE_URL"] = base_url
+os.environ.setdefault("GROQ_API_KEY", "stub")
+
+from src import rewriter  # noqa: E402
+from src.engine import get_engine  # noqa: E402
+from src.hybrid_retriever import hybrid_retrieve  # noqa: E402
+from src.pipeline import _retrieve  # noqa: E402
+from src.tracing import Trace  # noqa: E402
+
+# Every rewrite must reach the stub, and stub rewrites must not land on disk
+rewriter.rewrite_cache.disk = None
+
+def run(speculative: bool, retrieve_fn) -> dict:
+    timings = {"rewrite_s": [], "retrieval_s": [], "overlap_s": [], "total_s": []}
+    for _ in range(ROUNDS):
+        for q in QUERIES:
+            rewriter.rewrite_cache.clear()
+            t = time.perf_counter()
+            with redirect_stdout(io.StringIO()):   # silence the stage banners
+                _, _, stage = _retrieve(q, retrieve_fn, {"llm_calls": 0}, speculative, Trace(q))
+            timings["total_s"].append(time.perf_counter() - t)
+            for key in ("rewrite_s", "retrieval_s"):
+                timings[key].append(stage[key])
+            timings["overlap_s"].append(stage.get("overlap_s", 0.0))
+    return {k: statistics.median(v) * 1000 for k, v in timings.items()}
+
+if __name__ == "__main__":
+    engine = get_engine()
+    engine.bm25_index()
+    retrieve_fn = partial(hybrid_retrieve, engine=engine)
+    retrieve_fn(QUERIES[0], top_k=20)
+
+    print(f"\n Stages 1 + 2 median latency (stub rewrite {LLM_DELAY}s, "
+          f"{ROUNDS * len(QUERIES)} queries)")
+    print("="*74)
+    for echo in (False, True):
+        echo_rewrites = echo
+        print(f"\n  rewrite {'unchanged' if echo else 'differs'}")
+        print(f"  {'':<12} {'rewrite':>10} {'retrieval':>10} {'overlapped':>11} {'total':>10}")
+        results = {label: run(flag, retrieve_fn)
+                   for label, flag in (("sequential", False), ("speculative", True))}
+        for label, r in results.items():
+            print(f"  {label:<12} {r['rewrite_s']:8.1f}ms {r['retrieval_s']:8.1f}ms "
+                  f"{r['overlap_s']:9.1f}ms {r['total_s']:8.1f}ms")
+        # Overlap is only a saving when the pool is used as is; total_s is what counts
+        delta = results["speculative"]["total_s"] - results["sequential"]["total_s"]
+        print(f"  speculative vs sequential: {delta:+.1f} ms per question (negative = faster)")
+    server.shutdown()
@@ -0,0 +1,63 @@
+"""
+Startup cost of the CLI, each scenario in a fresh interpreter:
+  - import time of src.pipeline (models and clients now load lazily);
+  - first query latency with everything loading on demand, serially;
+  - first query after warmup(wait=True), and the warm-up itself;
+  - first query asked THINK_S seconds after a background warm-up,
+    as when main.py shows its prompt while the warm-up runs.
+LLM stages go to the local stub server.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_startup
+"""
+import json
+import os
+import subprocess
+import sys
+from benchmarks.stub_llm_server import start_stub_server
+
+QUESTION = "What did Apple say about iPhone revenue in 2018?"
+THINK_S = 3.0   # simulated time the user spends typing the first question
+
+SCENARIO = """
+import time
+t = time.perf_counter()
+import io, json, logging
+from contextlib import redirect_stdout
+logging.disable(logging.INFO)
+from src.engine import get_engine
+from src.pipeline import run_pipeline
+from src.warmup import warmup
+imported = time.perf_counter() - t
+mode, question, think = {mode!r}, {question!r}, {think!r}
+with redirect_stdout(io.StringIO()):
+    w = warmup(get_engine(), wait=(mode == "warm")) if mode != "cold" else None
+    if mode == "background":
+        time.sleep(think)
+    t = time.perf_counter()
+    run_pipeline(question, engine=get_engine(), use_cache=False)
+print(json.dumps({{"import_s": imported, "first_query_s": time.perf_counter() - t,
+                  "warmup_s": w.elapsed() if w else None, "warmup": w.timings if w else None}}))
+"""
+
+def run(mode: str) -> dict:
+    code = SCENARIO.format(mode=mode, question=QUESTION, think=THINK_S)
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    server, base_url = start_stub_server(delay=0.2)
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+
+    print(f"\n Startup and first query, fresh process each (stub LLM 0.2s per call)")
+    print("="*78)
+    print(f"  {'':<28} {'imports':>9} {'warm-up':>9} {'1st query':>10}")
+    for label, mode in (("lazy, no warm-up", "cold"), ("warmup(wait=True)", "warm"),
+                        (f"background, asked at {THINK_S:.0f}s", "background")):
+        r = run(mode)
+        warm = f"{r['warmup_s']:8.2f}s" if r["warmup_s"] is not None else f"{'-':>9}"
+        print(f"  {label:<28} {r['import_s']:8.2f}s {warm} {r['first_query_s']:9.2f}s")
+        if r["warmup"]:
+            print(f"      {', '.join(f'{k} {v:.2f}s' for k, v in sorted(r['warmup'].items()))}")
+    server.shutdown()
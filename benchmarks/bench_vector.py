@@ -0,0 +1,110 @@
+"""
+Vector search backends on the ingested corpus: Chroma's HNSW query vs.
+the numpy exact search over exported float32 / float16 / int8 matrices.
+
+For each precision: recall@k against Chroma and against exact float32
+search, latency for one query and for a batch of BATCH queries (search
+only; query embedding is done once up front), and matrix size.
+
+Run from the project root after ingest:
+    python -m benchmarks.bench_vector
+"""
+import logging
+logging.disable(logging.INFO)
+
+import os
+import statistics
+import tempfile
+import time
+import numpy as np
+from src.engine import RetrievalEngine
+from src.vector_index import PRECISIONS, VectorIndex, export_vector_index
+from benchmarks.bench_retrieval import QUERIES as BASE_QUERIES
+
+QUERIES = BASE_QUERIES + [
+    "AMD data center CPU market share gains",
+    "Cisco networking product orders backlog",
+    "ASML EUV lithography shipments",
+    "Micron DRAM pricing memory downturn",
+    "Amazon AWS operating margin",
+    "Google search advertising revenue YouTube",
+    "gross margin outlook next quarter",
+    "share buyback dividend capital return",
+]
+TOP_K = 20
+BATCH = 32
+ROUNDS = 5
+
+def _ms(timings: list) -> float:
+    return statistics.median(timings) * 1000
+
+def _recall(found: list, truth: list) -> float:
+    return statistics.mean(len(set(f) & set(t)) / len(t) for f, t in zip(found, truth) if t)
+
+def time_chroma(collection, vectors: np.ndarray) -> tuple:
+    single = []
+    for _ in range(ROUNDS):
+        for v in vectors:
+            t = time.perf_counter()
+            collection.query(query_embeddings=[v.tolist()], n_results=TOP_K, include=["distances"])
+            single.append(time.perf_counter() - t)
+    batch = np.resize(vectors, (BATCH, vectors.shape[1])).tolist()
+    batched = []
+    for _ in range(ROUNDS):
+        t = time.perf_counter()
+        collection.query(query_embeddings=batch, n_results=TOP_K, include=["distances"])
+        batched.append(time.perf_counter() - t)
+    ids = collection.query(query_embeddings=vectors.tolist(), n_results=TOP_K, include=["distances"])["ids"]
+    return ids, _ms(single), _ms(batched)
+
+def time_numpy(index: VectorIndex, vectors: np.ndarray) -> tuple:
+    index.search(vectors[:1], TOP_K)   # page the matrix in
+    single = []
+    for _ in range(ROUNDS):
+        for v in vectors:
+            t = time.perf_counter()
+            index.search(v, TOP_K)
+            single.append(time.perf_counter() - t)
+    batch = np.resize(vectors, (BATCH, vectors.shape[1]))
+    batched = []
+    for _ in range(ROUNDS):
+        t = time.perf_counter()
+        index.search(batch, TOP_K)
+        batched.append(time.perf_counter() - t)
+    docs, _ = index.search(vectors, TOP_K)
+    return docs, _ms(single), _ms(batched)
+
+def _row(label: str, single: float, batched: float, mb: float, vs_chroma: float, vs_exact: float):
+    print(f"  {label:<10} {single:9.2f} ms {batched:11.2f} ms {mb:9.1f} MB "
+          f"{vs_chroma:10.3f} {vs_exact:10.3f}")
+
+if __name__ == "__main__":
+    print("\n Loading engine and embedding queries...")
+    engine = RetrievalEngine()
+    chunk_ids = engine.bm25_index().chunk_ids
+    vectors = np.asarray(engine.embedding_function(QUERIES), dtype=np.float32)
+
+    chroma_ids, chroma_single, chroma_batch = time_chroma(engine.collection, vectors)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        for precision in PRECISIONS:
+            path = os.path.join(root, precision)
+            print(f" Exporting {precision} matrix ({len(chunk_ids):,} chunks)...")
+            export_vector_index(engine.collection, chunk_ids, path, precision)
+            index = VectorIndex(path)
+            docs, single, batched = time_numpy(index, vectors)
+            ids = [[chunk_ids[d] for d in row] for row in docs.tolist()]
+            mb = os.path.getsize(os.path.join(path, "embeddings.npy")) / 1e6
+            results[precision] = (ids, single, batched, mb)
+            del index
+
+    exact = results["float32"][0]
+    print(f"\n Vector search, top {TOP_K} ({len(QUERIES)} queries; batch = {BATCH} queries)")
+    print("="*78)
+    print(f"  {'backend':<10} {'1 query':>12} {'batch':>14} {'matrix':>12} "
+          f"{'recall':>10} {'recall':>10}")
+    print(f"  {'':<10} {'':>12} {'':>14} {'':>12} {'vs chroma':>10} {'vs exact':>10}")
+    _row("chroma", chroma_single, chroma_batch, float("nan"), 1.0, _recall(chroma_ids, exact))
+    for precision, (ids, single, batched, mb) in results.items():
+        _row(precision, single, batched, mb, _recall(ids, chroma_ids), _recall(ids, exact))
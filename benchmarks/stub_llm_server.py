@@ -0,0 +1,147 @@
+"""
+Local stand-in for the Groq chat-completions endpoint, so the LLM stages
+can be exercised and timed without network access or API quota.
+
+Point the Groq client at it through GROQ_BASE_URL, set any time before the
+first LLM call (the shared client is created on first use):
+    python -m benchmarks.stub_llm_server 8765 0.3     # port, delay (s)
+    GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=stub python main.py
+
+Or start it in-process with start_stub_server().
+"""
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+def default_reply(prompt: str) -> str:
+    if "JSON array of" in prompt:
+        return json.dumps(["RELEVANT"] * prompt.count("\nChunk "))
+    if "relevance grader" in prompt:
+        return "RELEVANT"
+    if "search query expert" in prompt or "reformulating financial questions" in prompt:
+        return "stub rewritten query revenue growth guidance"
+    return "Stub answer based on the provided context [Source: STUB | 2020-Jan-01]"
+
+class _Handler(BaseHTTPRequestHandler):
+    delay = 0.0          # before the response (or first streamed token)
+    token_delay = 0.02   # between streamed tokens
+    reply = staticmethod(default_reply)
+    calls = 0
+    failures = ()        # status per request to fail, in order (429s carry Retry-After)
+    retry_after = 1.0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        prompt = body["messages"][-1]["content"]
+        with _Handler.lock:
+            type(self).calls += 1
+            failure = self.failures[self.calls - 1] if self.calls <= len(self.failures) else None
+        time.sleep(self.delay)
+        if failure:
+            self._fail(failure)
+            return
+
+        content = self.reply(prompt)
+        if body.get("stream"):
+            self._stream(body, content)
+            return
+        payload = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": len(prompt.split()),
+                "completion_tokens": len(content.split()),
+                "total_tokens": len(prompt.split()) + len(content.split()),
+            },
+        }
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client gave up (per-call timeout)
+
+    def _fail(self, status: int):
+        data = json.dumps({"error": {"message": f"stub failure {status}", "type": "stub"}}).encode()
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            if status == 429:
+                self.send_header("Retry-After", str(self.retry_after))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def _stream(self, body: dict, content: str):
+        # Server-sent events, one word per chunk, like the real endpoint
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                if i:
+                    time.sleep(self.token_delay)
+                event = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": body.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": word + (" " if i < len(words) - 1 else "")},
+                        "finish_reason": None,
+                    }],
+                }
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub_server(port: int = 0, delay: float = 0.0, reply=None, token_delay: float = 0.02,
+                      failures: tuple = (), retry_after: float = 1.0):
+    """
+    Serves the stub on a background thread. `failures` lists HTTP statuses
+    for the first requests to fail with (e.g. (429, 503)), to exercise
+    client retries. Returns (server, base_url); the handler class is
+    server.RequestHandlerClass and its `calls` attribute counts requests
+    served.
+    """
+    handler = type("StubHandler", (_Handler,), {
+        "delay": delay, "token_delay": token_delay, "calls": 0,
+        "failures": tuple(failures), "retry_after": retry_after,
+    })
+    if reply is not None:
+        handler.reply = staticmethod(reply)
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8765
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.3
+    server, url = start_stub_server(port, delay)
+    print(f" Stub chat-completions server on {url} (delay {delay}s) — Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
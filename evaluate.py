@@ -2,11 +2,15 @@ import logging
 logging.disable(logging.INFO)
 
 import time
+from src.engine import embedding_cache, get_engine
 from src.rewriter import rewrite_query
 from src.retriever import retrieve
-from src.reranker import rerank
+from src.reranker import rerank, score_cache
 from src.generator import generate_answer
-from src.pipeline import run_pipeline
+from src.pipeline import run_pipeline_batch
+from src.llm import get_gateway
+from src.tracing import Trace
+from src.warmup import warmup
 
 # ── 10 test questions covering different query types ──────────────────────────
 TEST_QUESTIONS = [
@@ -27,19 +31,18 @@ def basic_rag(query: str) -> dict:
     Basic RAG — no rewriting, no reranking, no CRAG.
     Just raw vector search → generate. This is what everyone else builds.
     """
-    chunks = retrieve(query, top_k=3)
-    answer = generate_answer(query, chunks)
+    trace = Trace(query)
+    with trace.span("retrieval") as s:
+        chunks = retrieve(query, top_k=3, engine=get_engine())
+        s.candidates_out = len(chunks)
+    with trace.span("generate", len(chunks)):
+        answer = generate_answer(query, chunks)
     return {
         "chunks": chunks,
-        "answer": answer
+        "answer": answer,
+        "trace": trace.to_dict()
     }
 
-def advanced_rag(query: str) -> dict:
-    """
-    Your full 5-stage pipeline.
-    """
-    return run_pipeline(query)
-
 def score_answer(answer: str) -> dict:
     """
     Simple automated scoring — checks for signals of answer quality.
@@ -68,6 +71,17 @@ def run_evaluation():
     print("="*70)
     print(f"  Running {len(TEST_QUESTIONS)} test questions through both systems...\n")
 
+    warmup(get_engine(), wait=True)  # load models + indexes once, before the timed runs
+
+    # Advanced RAG runs as one batch: local models batch across questions,
+    # LLM stages overlap. Per-question time is the batch wall time / N; a
+    # result's own latency_s only says when it finished within the batch.
+    print("   Running Advanced RAG on all questions (batched)...")
+    t0 = time.time()
+    advanced_results = run_pipeline_batch(TEST_QUESTIONS, engine=get_engine())
+    batch_time = time.time() - t0
+    print(f"   Advanced RAG batch done in {round(batch_time, 2)}s\n")
+
     results = []
 
     for i, question in enumerate(TEST_QUESTIONS, 1):
@@ -79,15 +93,10 @@ def run_evaluation():
         basic = basic_rag(question)
         basic_time = round(time.time() - t1, 2)
         basic_scores = score_answer(basic["answer"])
-        
-        time.sleep(1)  # avoid Groq rate limit
 
-        print("   Running Advanced RAG...")
-        
-        # Advanced RAG
-        t2 = time.time()
-        advanced = advanced_rag(question)
-        advanced_time = round(time.time() - t2, 2)
+        # Advanced RAG (already run above)
+        advanced = advanced_results[i - 1]
+        advanced_time = round(batch_time / len(TEST_QUESTIONS), 2)
         advanced_scores = score_answer(advanced["answer"])
 
         results.append({
@@ -107,8 +116,6 @@ def run_evaluation():
         print(f"  Basic score: {basic_scores['total_score']}/4 | "
               f"Advanced score: {advanced_scores['total_score']}/4 | "
               f"Winner: {winner}\n")
-        
-        time.sleep(1)  # avoid rate limit between questions
 
     # ── Print Summary Table ────────────────────────────────────────────────────
     print("\n" + "="*70)
@@ -151,6 +158,17 @@ def run_evaluation():
           f"{round((advanced_total - basic_total) / max(basic_total,1) * 100, 1)}% "
           f"better than Basic RAG")
 
+    print(f"\n   LLM usage by stage:")
+    for stage, u in sorted(get_gateway().usage().items()):
+        print(f"   {stage:<12} calls {u['calls']:>3} | retries {u['retries']:>2} | "
+              f"tokens {u['prompt_tokens'] + u['completion_tokens']:>6} | "
+              f"queued {u['queue_s']:.1f}s (max {u['max_queue_s']:.1f}s)")
+    e = embedding_cache.stats()
+    print(f"   Query embeddings: {e['hits']} cached / {e['misses']} embedded "
+          f"(hit rate {e['hit_rate']:.0%}, ~{e['saved_s']:.2f}s saved)")
+    r = score_cache.stats()
+    print(f"   Rerank scores   : {r['hits']} cached / {r['misses']} scored (hit rate {r['hit_rate']:.0%})")
+
     # ── Print Detailed Answers for Best Examples ───────────────────────────────
     print("\n" + "="*70)
     print("   DETAILED COMPARISON — Top 3 Most Interesting Results")
@@ -1,6 +1,15 @@
+import time
+_start = time.perf_counter()
+
+from src.engine import get_engine
+from src.filters import describe_filters
 from src.pipeline import run_pipeline
+from src.warmup import warmup
 import logging
 logging.disable(logging.INFO)
+
+IMPORT_S = time.perf_counter() - _start
+
 def main():
     print("\n" + "="*60)
     print("   EarningsIQ — Earnings Call Intelligence System")
@@ -12,6 +21,12 @@ def main():
     print("="*60)
     print("  Type 'quit' to exit\n")
 
+    engine = get_engine()
+    # Models and indexes load in the background while the prompt waits
+    warm = warmup(engine)
+    print(f"  Imports: {IMPORT_S:.2f}s | loading models and indexes in the background...\n")
+    first_query = True
+
     while True:
         query = input(" Your question: ").strip()
         
@@ -22,14 +37,25 @@ def main():
             break
         
         print("\n Processing pipeline...\n")
-        result = run_pipeline(query)
+        if first_query and not warm.done():
+            print(f"   Waiting on {warm.report()}\n")
+        result = run_pipeline(query, engine=engine, stream=True)
         
         print(f"\n{'='*60}")
         print(f" Rewritten Query:")
         print(f"   {result['rewritten_query']}\n")
         
+        if result.get('filters'):
+            print(f" Filters: {describe_filters(result['filters'])}\n")
+        
         print(f" CRAG Status: {result['crag_status']}")
-        print(f"   (PASSED = chunks were relevant | CORRECTED = re-retrieved)\n")
+        print(f"   (PASSED = chunks were relevant | CORRECTED = re-retrieved | "
+              f"NO_CONTEXT = nothing relevant found)")
+        print(f"   LLM calls: {result['llm_calls']} | "
+              f"chunks gated/graded: {result['crag_gated']}/{result['crag_graded']}")
+        if result.get('crag_timeouts'):
+            print(f"   Grading calls timed out: {result['crag_timeouts']} (graded AMBIGUOUS)")
+        print()
         
         print(f" Final Sources Used:")
         for i, chunk in enumerate(result['final_chunks'], 1):
@@ -38,7 +64,15 @@ def main():
         
         print(f"\n Answer:")
         print("-"*60)
-        print(result['answer'])
+        for token in result['answer_stream']:
+            print(token, end="", flush=True)
+        print()
+        print("-"*60)
+        print(f" First token: {result['ttft_s']}s | Total: {result['latency_s']}s")
+        if first_query:
+            print(f" First query after startup: {result['latency_s']}s | imports {IMPORT_S:.2f}s | "
+                  f"{warm.report()}")
+            first_query = False
         print("="*60 + "\n")
 
 if __name__ == "__main__":
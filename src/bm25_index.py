@@ -0,0 +1,507 @@
+import json
+import math
+import os
+import shutil
+import tempfile
+from array import array
+from pathlib import Path
+import numpy as np
+from src.chunk_store import OFFSETS_FILE, SOURCE_FILE, SOURCES_FILE, TEXT_FILE, ChunkStore
+from src.filters import transcript_fields
+
+BM25_PATH = "bm25_index"   # written next to chroma_db/
+
+# Same defaults as rank_bm25.BM25Okapi so scores stay comparable
+K1 = 1.5
+B = 0.75
+EPSILON = 0.25
+
+BLOCK_SIZE = 1 << 22   # postings per block when BM25IndexWriter lays out the index
+
+def tokenize(text: str) -> list:
+    return text.lower().split()
+
+def build_bm25_index(chunk_ids: list, texts, path=BM25_PATH, metadatas: list = None,
+                     k1=K1, b=B, epsilon=EPSILON):
+    """Tokenizes `texts` and writes their BM25 index to `path`."""
+    writer = BM25IndexWriter(path, k1=k1, b=b, epsilon=epsilon)
+    writer.add(chunk_ids, texts, metadatas)
+    writer.finish()
+
+class BM25IndexWriter:
+    """
+    Builds an index at `path` with bounded memory: each add() tokenizes
+    its batch and spills the postings to disk, and finish() lays out the
+    CSR arrays with an external distribution sort (postings bucketed by
+    term range, each bucket about BLOCK_SIZE postings, sorted in memory
+    and appended). Resident memory grows with the vocabulary and a few
+    bytes per doc, not with the text or the postings.
+
+    The chunk store (src.chunk_store) is written alongside, in the same
+    doc order, so BM25 doc ids double as integer chunk ids.
+
+    With base=True the index already at `path` is patched instead: the
+    postings of remove()d docs are dropped, the survivors keep their
+    order, added docs follow them, and IDF, avgdl and the term weights
+    are recomputed from the stored term frequencies. Terms left without
+    postings are dropped from the vocabulary. Scores match a full
+    rebuild up to float rounding: the IDF floor sums over the
+    vocabulary, whose order then follows ingest history.
+
+    With a `corpus` index, the docs are a partition of it (a shard): IDF
+    and avgdl are taken from the corpus, not the partition, so scores
+    are identical to the corpus index's and comparable across shards.
+
+    The postings form a CSR term-document matrix (rows = terms, columns
+    = docs):
+      postings_ptr.npy     CSR indptr, one row per term
+      postings_doc.npy     CSR indices (doc ids, ascending within a row)
+      postings_weight.npy  CSR data: BM25 term weight of each posting
+      postings_tf.npy      raw term frequency of each posting
+      doc_len.npy          tokens per doc
+      idf.npy              per-term IDF (BM25Okapi rules)
+      doc_ticker.npy, doc_year.npy, tickers.json  filter fields per doc
+      vocab.json           term dictionary (term id = list position)
+      chunk_ids.json       Chroma id of each doc
+      meta.json            corpus size, avgdl, k1, b
+    Every array is a plain .npy so the retriever can memory-map it.
+    Files are swapped in with os.replace, so processes that have the old
+    index mapped keep reading a valid copy.
+    """
+
+    def __init__(self, path=BM25_PATH, base: bool = False, k1=K1, b=B, epsilon=EPSILON,
+                 corpus: "BM25Index" = None):
+        self.path = Path(path)
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        self.corpus = corpus
+        self.base = BM25Index(path) if base else None
+        self.vocab = dict(self.base.vocab) if base else {}
+        self.tickers = {t: i for i, t in enumerate(self.base.tickers)} if base else {}
+        if base and not ChunkStore.exists(path):
+            raise ValueError(f"{path} has no chunk store to patch; rebuild the index")
+        self.sources = {s: i for i, s in enumerate(ChunkStore(path).sources)} if base else {}
+        self.removed = set()
+        self.added = set()   # only tracked when patching
+        self.doc_len = array("i")
+        self.doc_ticker, self.doc_year = array("i"), array("h")
+        self.doc_source, self.text_len = array("i"), array("q")
+        self._spill = None
+
+    def remove(self, chunk_ids):
+        self.removed.update(chunk_ids)
+
+    def add(self, chunk_ids: list, texts, metadatas: list = None):
+        """
+        Adds a batch of docs. `metadatas` (Chroma metadata dicts) supply
+        the ticker/year used for filtering; without them they are read
+        from the "source" field or the chunk id.
+        """
+        chunk_ids, texts = list(chunk_ids), list(texts)
+        if not chunk_ids:
+            return
+        if self._spill is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._spill = tempfile.TemporaryDirectory(dir=self.path, prefix=".spill-")
+            self._files = {
+                name: open(os.path.join(self._spill.name, name), "wb")
+                for name in ("term", "doc", "tf", "text")
+            }
+            self._ids = open(os.path.join(self._spill.name, "ids"), "w", encoding="utf-8")
+        postings = _tokenize_postings(texts, self.vocab, start=len(self.doc_len))
+        for name, arr in zip(("term", "doc", "tf"), postings):
+            self._files[name].write(arr.tobytes())
+        self.doc_len.extend(postings[3])
+        for cid, metadata in zip(chunk_ids, metadatas or [None] * len(chunk_ids)):
+            ticker, year = _filter_fields(cid, metadata)
+            self.doc_ticker.append(self.tickers.setdefault(ticker, len(self.tickers)))
+            self.doc_year.append(year)
+            source = metadata["source"] if metadata and "source" in metadata else _source_from_id(cid)
+            self.doc_source.append(self.sources.setdefault(source, len(self.sources)))
+        encoded = [text.encode("utf-8") for text in texts]
+        self._files["text"].write(b"".join(encoded))
+        self.text_len.extend(len(e) for e in encoded)
+        self._ids.writelines(json.dumps(cid) + "\n" for cid in chunk_ids)
+        if self.base is not None:
+            self.added.update(chunk_ids)
+
+    def finish(self):
+        base = self.base
+        if self._spill is not None:
+            for f in (*self._files.values(), self._ids):
+                f.close()
+
+        if base is not None:
+            # Re-added ids replace their old postings (e.g. a re-run after a crash)
+            gone = self.removed | self.added
+            keep = np.fromiter((cid not in gone for cid in base.chunk_ids), dtype=bool,
+                               count=len(base.chunk_ids))
+            new_doc = np.cumsum(keep, dtype=np.int64) - 1
+            doc_len = np.concatenate([np.asarray(base.doc_len)[keep], np.frombuffer(self.doc_len, dtype=np.int32)])
+            num_kept = int(keep.sum())
+            if base.doc_ticker is not None:
+                base_ticker, base_year = np.asarray(base.doc_ticker), np.asarray(base.doc_year)
+            else:
+                # Index written before filter fields were stored
+                fields = [_filter_fields(cid, None) for cid in base.chunk_ids]
+                base_ticker = np.array([self.tickers.setdefault(t, len(self.tickers)) for t, _ in fields],
+                                       dtype=np.int32)
+                base_year = np.array([y for _, y in fields], dtype=np.int16)
+            doc_ticker = np.concatenate([base_ticker[keep], np.frombuffer(self.doc_ticker, dtype=np.int32)])
+            doc_year = np.concatenate([base_year[keep], np.frombuffer(self.doc_year, dtype=np.int16)])
+        else:
+            keep = new_doc = None
+            doc_len = np.frombuffer(self.doc_len, dtype=np.int32)
+            doc_ticker = np.frombuffer(self.doc_ticker, dtype=np.int32)
+            doc_year = np.frombuffer(self.doc_year, dtype=np.int16)
+            num_kept = 0
+        num_docs = len(doc_len)
+        self._write_chunk_store(keep)
+
+        def blocks():
+            # (term, doc, tf) with final doc ids; per term, docs ascend
+            if base is not None:
+                ptr = np.asarray(base.postings_ptr)
+                total = int(ptr[-1])
+                for s in range(0, total, BLOCK_SIZE):
+                    e = min(s + BLOCK_SIZE, total)
+                    terms = np.searchsorted(ptr, np.arange(s, e), side="right") - 1
+                    docs = _read_block(self.path / "postings_doc.npy", s, e)
+                    alive = keep[docs]
+                    tf = _read_block(self.path / "postings_tf.npy", s, e)
+                    yield terms[alive], new_doc[docs[alive]], tf[alive]
+            if self._spill is not None:
+                spilled = [os.path.join(self._spill.name, name) for name in ("term", "doc", "tf")]
+                total = os.path.getsize(spilled[0]) // 4
+                for s in range(0, total, BLOCK_SIZE):
+                    e = min(s + BLOCK_SIZE, total)
+                    term, doc, tf = (_read_block(f, s, e, raw=True) for f in spilled)
+                    yield term, doc.astype(np.int64) + num_kept, tf
+
+        # Pass 1: document frequencies, then drop terms without postings
+        df = np.zeros(len(self.vocab), dtype=np.int64)
+        for term, _, _ in blocks():
+            df += np.bincount(term, minlength=len(self.vocab))
+        used = df > 0
+        new_term = np.cumsum(used, dtype=np.int64) - 1
+        terms = [t for t, u in zip(self.vocab, used.tolist()) if u]
+        df = df[used]
+        postings_ptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(df, out=postings_ptr[1:])
+        total = int(postings_ptr[-1])
+
+        if self.corpus is not None:
+            idf = np.asarray(self.corpus.idf)[[self.corpus.vocab[t] for t in terms]]
+            avgdl = self.corpus.avgdl
+        else:
+            idf = _okapi_idf(df, num_docs, self.epsilon)
+            avgdl = int(np.sum(doc_len, dtype=np.int64)) / max(num_docs, 1)
+
+        # Pass 2: distribute postings into one bucket file per window of
+        # consecutive terms (about BLOCK_SIZE postings each). Blocks arrive
+        # in doc order per term, and appending keeps that order.
+        starts = [0]
+        for t in range(1, len(terms)):
+            if postings_ptr[t] - postings_ptr[starts[-1]] >= BLOCK_SIZE:
+                starts.append(t)
+        window_of_term = np.repeat(np.arange(len(starts)), np.diff(starts + [len(terms)]))
+        sort_dir = tempfile.TemporaryDirectory(dir=self.path, prefix=".sort-")
+        buckets = [open(os.path.join(sort_dir.name, str(w)), "wb") for w in range(len(starts))]
+        for term, doc, tf in blocks():
+            term = new_term[term]
+            window = window_of_term[term]
+            order = np.argsort(window, kind="stable")
+            records = np.stack([term[order], doc[order], tf[order]], axis=1).astype(np.int32)
+            counts = np.bincount(window, minlength=len(starts))
+            for w, part in enumerate(np.split(records, np.cumsum(counts)[:-1])):
+                if len(part):
+                    buckets[w].write(part.tobytes())
+        for f in buckets:
+            f.close()
+
+        # Pass 3: sort each bucket by term in memory and append it to the
+        # output rows; the CSR row order is the term order
+        chunk_ids = [cid for cid, k in zip(base.chunk_ids, keep) if k] if base is not None else []
+        if self._spill is not None:
+            with open(os.path.join(self._spill.name, "ids"), encoding="utf-8") as f:
+                chunk_ids.extend(json.loads(line) for line in f)
+        self.base = base = None   # release the memory maps before the files are replaced
+
+        out = {
+            "postings_doc": _open_npy(self.path / "postings_doc.npy.tmp", np.int32, total),
+            "postings_tf": _open_npy(self.path / "postings_tf.npy.tmp", np.int32, total),
+            "postings_weight": _open_npy(self.path / "postings_weight.npy.tmp", np.float64, total),
+        }
+        for w in range(len(starts)):
+            bucket = os.path.join(sort_dir.name, str(w))
+            records = np.fromfile(bucket, dtype=np.int32).reshape(-1, 3)
+            os.remove(bucket)
+            records = records[np.argsort(records[:, 0], kind="stable")]
+            docs, tf = records[:, 1], records[:, 2]
+            out["postings_doc"].write(docs.tobytes())
+            out["postings_tf"].write(tf.tobytes())
+            out["postings_weight"].write(
+                _term_weights(tf, doc_len[docs], avgdl, self.k1, self.b).tobytes()
+            )
+        sort_dir.cleanup()
+        for name, f in out.items():
+            f.close()
+            os.replace(self.path / f"{name}.npy.tmp", self.path / f"{name}.npy")
+
+        _save(self.path / "postings_ptr.npy", postings_ptr)
+        _save(self.path / "doc_len.npy", np.asarray(doc_len, dtype=np.int32))
+        _save(self.path / "idf.npy", idf)
+        _save(self.path / "doc_ticker.npy", np.asarray(doc_ticker, dtype=np.int32))
+        _save(self.path / "doc_year.npy", np.asarray(doc_year, dtype=np.int16))
+        _save(self.path / "tickers.json", list(self.tickers))
+        _save(self.path / "vocab.json", terms)
+        _save(self.path / "chunk_ids.json", chunk_ids)
+        # meta.json goes last: BM25Index.exists() keys on it
+        _save(self.path / "meta.json", {"num_docs": num_docs, "avgdl": avgdl, "k1": self.k1, "b": self.b})
+        if self._spill is not None:
+            self._spill.cleanup()
+            self._spill = None
+
+    def _write_chunk_store(self, keep):
+        # Surviving texts in their order (one read per run of kept docs),
+        # then the spilled new ones; nothing is decoded
+        text_tmp = self.path / (TEXT_FILE + ".tmp")
+        lengths = [np.frombuffer(self.text_len, dtype=np.int64)]
+        doc_source = [np.frombuffer(self.doc_source, dtype=np.int32)]
+        with open(text_tmp, "wb") as out:
+            if self.base is not None:
+                base_offsets = np.load(self.path / OFFSETS_FILE)
+                lengths.insert(0, np.diff(base_offsets)[keep])
+                doc_source.insert(0, np.load(self.path / SOURCE_FILE)[keep])
+                edges = np.flatnonzero(np.diff(np.concatenate([[0], keep.astype(np.int8), [0]])))
+                with open(self.path / TEXT_FILE, "rb") as src:
+                    for start, stop in zip(edges[::2], edges[1::2]):
+                        src.seek(int(base_offsets[start]))
+                        _copy_bytes(src, out, int(base_offsets[stop] - base_offsets[start]))
+            if self._spill is not None:
+                with open(os.path.join(self._spill.name, "text"), "rb") as src:
+                    shutil.copyfileobj(src, out)
+        lengths = np.concatenate(lengths)
+        offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+        os.replace(text_tmp, self.path / TEXT_FILE)
+        _save(self.path / SOURCE_FILE, np.concatenate(doc_source).astype(np.int32))
+        _save(self.path / SOURCES_FILE, list(self.sources))
+        _save(self.path / OFFSETS_FILE, offsets)
+
+def _copy_bytes(src, dst, n: int, chunk: int = 1 << 24):
+    while n > 0:
+        data = src.read(min(chunk, n))
+        if not data:
+            break
+        dst.write(data)
+        n -= len(data)
+
+def _source_from_id(chunk_id: str) -> str:
+    # "2019-Dec-18-MU:<hash>" → "MU | 2019-Dec-18"
+    parts = chunk_id.rsplit(":", 1)[0].split("-")
+    return f"{parts[-1]} | {'-'.join(parts[:-1])}"
+
+def _filter_fields(chunk_id: str, metadata: dict) -> tuple:
+    # (ticker, year) for the candidate filter
+    if metadata and "ticker" in metadata:
+        return metadata["ticker"], int(metadata.get("year", 0))
+    if metadata and "source" in metadata:
+        ticker, _, date = metadata["source"].partition(" | ")
+        fields = transcript_fields(f"{date}-{ticker}")
+    else:
+        # Stable chunk ids are "<file stem>:<hash>"
+        fields = transcript_fields(chunk_id.rsplit(":", 1)[0])
+    return fields["ticker"], fields["year"]
+
+def _read_block(file, start: int, stop: int, raw: bool = False) -> np.ndarray:
+    # Plain reads, not a memory map: mapped pages would count toward RSS
+    offset = 0
+    dtype = np.dtype(np.int32)
+    if not raw:
+        with open(file, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            read_header = (np.lib.format.read_array_header_1_0 if version == (1, 0)
+                           else np.lib.format.read_array_header_2_0)
+            _, _, dtype = read_header(f)
+            offset = f.tell()
+    return np.fromfile(file, dtype=dtype, count=stop - start, offset=offset + start * dtype.itemsize)
+
+def _open_npy(file: Path, dtype, size: int):
+    # .npy header for a 1-D array; the caller appends the data
+    f = open(file, "wb")
+    np.lib.format.write_array_header_1_0(f, {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": (size,),
+    })
+    return f
+
+def _tokenize_postings(texts: list, vocab: dict, start: int = 0):
+    # (term, doc, tf) postings in doc order; new terms are added to `vocab`
+    post_term, post_doc, post_tf = array("i"), array("i"), array("i")
+    doc_len = array("i")
+
+    for doc_id, text in enumerate(texts, start):
+        tokens = tokenize(text)
+        doc_len.append(len(tokens))
+        counts = {}
+        for tok in tokens:
+            counts[tok] = counts.get(tok, 0) + 1
+        for tok, tf in counts.items():
+            post_term.append(vocab.setdefault(tok, len(vocab)))
+            post_doc.append(doc_id)
+            post_tf.append(tf)
+
+    return tuple(np.frombuffer(a, dtype=np.int32) for a in (post_term, post_doc, post_tf, doc_len))
+
+def _save(file: Path, data):
+    tmp = file.with_name(file.name + ".tmp")
+    if file.suffix == ".npy":
+        with open(tmp, "wb") as f:
+            np.save(f, data)
+    else:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+    os.replace(tmp, file)
+
+def _term_weights(tf, dl, avgdl: float, k1: float, b: float) -> np.ndarray:
+    # Same expression (and operation order) as BM25Okapi.get_scores
+    tf = tf.astype(np.float64)
+    dl = dl.astype(np.int64)
+    return tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl))
+
+def _okapi_idf(df, num_docs: int, epsilon: float) -> np.ndarray:
+    # Mirrors BM25Okapi._calc_idf term by term (same order, same math.log)
+    # so the persisted scores are identical to rank_bm25's.
+    idf = np.empty(len(df), dtype=np.float64)
+    idf_sum = 0.0
+    negative = []
+    for term_id, freq in enumerate(df.tolist()):
+        value = math.log(num_docs - freq + 0.5) - math.log(freq + 0.5)
+        idf[term_id] = value
+        idf_sum += value
+        if value < 0:
+            negative.append(term_id)
+    if len(df):
+        idf[negative] = epsilon * (idf_sum / len(df))
+    return idf
+
+class BM25Index:
+    """Read-only view over a persisted index; arrays are memory-mapped."""
+
+    def __init__(self, path=BM25_PATH):
+        path = Path(path)
+        self.postings_ptr = np.load(path / "postings_ptr.npy", mmap_mode="r")
+        self.postings_doc = np.load(path / "postings_doc.npy", mmap_mode="r")
+        self.postings_tf = np.load(path / "postings_tf.npy", mmap_mode="r")
+        self.doc_len = np.load(path / "doc_len.npy", mmap_mode="r")
+        self.idf = np.load(path / "idf.npy", mmap_mode="r")
+        with open(path / "vocab.json", encoding="utf-8") as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        with open(path / "chunk_ids.json", encoding="utf-8") as f:
+            self.chunk_ids = json.load(f)
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.num_docs = meta["num_docs"]
+        self.avgdl = meta["avgdl"]
+        self.k1 = meta["k1"]
+        self.b = meta["b"]
+
+        if (path / "doc_ticker.npy").exists():
+            self.doc_ticker = np.load(path / "doc_ticker.npy", mmap_mode="r")
+            self.doc_year = np.load(path / "doc_year.npy", mmap_mode="r")
+            with open(path / "tickers.json", encoding="utf-8") as f:
+                self.tickers = json.load(f)
+        else:
+            # Index written before filter fields were stored: no pre-filtering
+            self.doc_ticker = self.doc_year = None
+            self.tickers = []
+
+        if (path / "postings_weight.npy").exists():
+            self.postings_weight = np.load(path / "postings_weight.npy", mmap_mode="r")
+        else:
+            # Index written before weights were persisted
+            self.postings_weight = _term_weights(
+                self.postings_tf, self.doc_len[self.postings_doc], self.avgdl, self.k1, self.b
+            )
+
+    @staticmethod
+    def exists(path=BM25_PATH) -> bool:
+        return (Path(path) / "meta.json").exists()
+
+    def candidate_mask(self, filters: dict) -> np.ndarray:
+        """
+        Bool mask of the docs matching {"ticker": [...], "year": [...]},
+        or None when there is nothing to filter (or the index predates
+        filter fields).
+        """
+        if not filters or self.doc_ticker is None:
+            return None
+        mask = np.ones(self.num_docs, dtype=bool)
+        if filters.get("ticker"):
+            ticker_ids = [i for i, t in enumerate(self.tickers) if t in filters["ticker"]]
+            mask &= np.isin(self.doc_ticker, ticker_ids)
+        if filters.get("year"):
+            mask &= np.isin(self.doc_year, filters["year"])
+        return mask
+
+    def get_scores(self, tokenized_query: list, mask: np.ndarray = None) -> np.ndarray:
+        """
+        BM25 score of every doc: gathers the CSR row of each query term,
+        scales it by the term's IDF and sums per doc with one bincount.
+        Repeated query terms count once per occurrence, like rank_bm25,
+        and contributions are added in query order so the floats match.
+        With a candidate `mask`, postings of other docs are dropped before
+        the sum and those docs score 0.
+        """
+        ptr = self.postings_ptr
+        rows = [self.vocab[tok] for tok in tokenized_query if tok in self.vocab]
+        if not rows:
+            return np.zeros(self.num_docs, dtype=np.float64)
+
+        docs = np.concatenate([self.postings_doc[ptr[t]:ptr[t + 1]] for t in rows])
+        contrib = np.concatenate([
+            float(self.idf[t]) * self.postings_weight[ptr[t]:ptr[t + 1]] for t in rows
+        ])
+        if mask is not None:
+            keep = mask[docs]
+            docs, contrib = docs[keep], contrib[keep]
+        return np.bincount(docs, weights=contrib, minlength=self.num_docs)
+
+    def get_scores_batch(self, tokenized_queries: list, masks: list = None) -> np.ndarray:
+        """
+        get_scores for several queries at once: postings of every query
+        are gathered together and summed with a single bincount over
+        (query, doc) cells. Returns a (queries x docs) array whose rows
+        equal get_scores of each query. `masks` holds one mask (or None)
+        per query.
+        """
+        ptr = self.postings_ptr
+        masks = masks or [None] * len(tokenized_queries)
+        cells, contribs = [], []
+        for q, (tokens, mask) in enumerate(zip(tokenized_queries, masks)):
+            rows = [self.vocab[tok] for tok in tokens if tok in self.vocab]
+            if not rows:
+                continue
+            docs = np.concatenate([self.postings_doc[ptr[t]:ptr[t + 1]] for t in rows])
+            contrib = np.concatenate([
+                float(self.idf[t]) * self.postings_weight[ptr[t]:ptr[t + 1]] for t in rows
+            ])
+            if mask is not None:
+                keep = mask[docs]
+                docs, contrib = docs[keep], contrib[keep]
+            cells.append(docs.astype(np.int64) + q * self.num_docs)
+            contribs.append(contrib)
+        size = len(tokenized_queries) * self.num_docs
+        if not cells:
+            return np.zeros((len(tokenized_queries), self.num_docs), dtype=np.float64)
+        scores = np.bincount(np.concatenate(cells), weights=np.concatenate(contribs), minlength=size)
+        return scores.reshape(len(tokenized_queries), self.num_docs)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first, without a full sort."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(scores, -k)[-k:]
+    return idx[np.argsort(scores[idx])[::-1]]
@@ -0,0 +1,281 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+
+CACHE_DIR = "cache"
+ANSWER_CACHE_PATH = os.path.join(CACHE_DIR, "answers.sqlite")
+CORPUS_VERSION_PATH = os.path.join(CACHE_DIR, "corpus_version")
+EMBED_CACHE_BYTES = 32 * 1024 * 1024   # ~21k MiniLM query vectors
+
+class LRUCache:
+    """Thread-safe in-memory LRU with optional per-entry TTL (seconds)."""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+class SQLiteCache:
+    """
+    On-disk key/value tier with TTL. Values are stored as JSON. SQLite's
+    file locking (WAL mode) makes it safe to share between processes.
+    The connection is opened on first use, and again in a forked child:
+    a connection must not be used on both sides of a fork.
+    """
+
+    def __init__(self, path: str, table: str, ttl: float = None):
+        self.path = path
+        self.table = table
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+        self._inherited = []
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called with self._lock held
+        if self._conn is None or self._pid != os.getpid():
+            if self._conn is not None:
+                # Closing the parent's connection here could checkpoint or
+                # unlink its WAL under it; just never touch it again
+                self._inherited.append(self._conn)
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            with conn:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL)"
+                )
+            self._conn, self._pid = conn, os.getpid()
+        return self._conn
+
+    def get(self, key):
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT value, expires FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        if expires is not None and expires < time.time():
+            self.delete(key)
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock:
+            with self._connection() as conn:
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires),
+                )
+
+    def delete(self, key):
+        with self._lock:
+            with self._connection() as conn:
+                conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._lock:
+            with self._connection() as conn:
+                conn.execute(f"DELETE FROM {self.table}")
+
+class TieredCache:
+    """
+    Memory LRU in front of an optional SQLite tier. Disk hits are promoted
+    to memory. Keeps hit/miss counters for reporting.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = None, path: str = None,
+                 table: str = "cache"):
+        self.memory = LRUCache(maxsize, ttl)
+        self.disk = SQLiteCache(path, table, ttl) if path else None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is not None:
+            self._bump("memory_hits")
+            return value
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+                self._bump("disk_hits")
+                return value
+        self._bump("misses")
+        return None
+
+    def set(self, key, value):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+        with self._lock:
+            self.memory_hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        total = hits + self.misses
+        return {
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+        }
+
+    def _bump(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+class EmbeddingCache:
+    """
+    Thread-safe LRU of query embeddings, keyed by (model name, exact
+    text). Vectors are kept as read-only float32 arrays and the cache is
+    bounded by their total size in bytes. Counts hits and misses, and
+    estimates the embedding time saved as hits x the mean embedding time
+    per missed text.
+    """
+
+    def __init__(self, max_bytes: int = EMBED_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.embed_s = 0.0   # time spent embedding misses
+        self.embedded = 0    # texts embedded on misses
+        self._data = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def embed(self, model: str, texts: list, embed_fn) -> np.ndarray:
+        """
+        Embeddings of `texts` (len(texts) x dim float32), calling
+        embed_fn(list of texts) once for the distinct texts not cached.
+        """
+        with self._lock:
+            vectors = []
+            for text in texts:
+                vector = self._data.get((model, text))
+                if vector is not None:
+                    self._data.move_to_end((model, text))
+                vectors.append(vector)
+            missing = [i for i, v in enumerate(vectors) if v is None]
+            # A text repeated within the batch is embedded once: one miss, then hits
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            self.hits += len(texts) - len(unique)
+            self.misses += len(unique)
+        if missing:
+            t = time.perf_counter()
+            embedded = np.asarray(embed_fn(unique), dtype=np.float32)
+            elapsed = time.perf_counter() - t
+            fresh = {}
+            for text, row in zip(unique, embedded):
+                row = row.copy()   # don't pin the whole batch in memory
+                row.flags.writeable = False
+                fresh[text] = row
+            with self._lock:
+                self.embed_s += elapsed
+                self.embedded += len(unique)
+                for text, row in fresh.items():
+                    self._set((model, text), row)
+            for i in missing:
+                vectors[i] = fresh[texts[i]]
+        return np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+
+    def _set(self, key: tuple, vector: np.ndarray):
+        old = self._data.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._data[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes and self._data:
+            _, evicted = self._data.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            per_text = self.embed_s / self.embedded if self.embedded else 0.0
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "embed_s": round(self.embed_s, 4),
+                "saved_s": round(self.hits * per_text, 4),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.embedded = 0
+            self.embed_s = 0.0
+
+    def __len__(self):
+        return len(self._data)
+
+def corpus_version() -> str:
+    """Token that changes every time the corpus is re-ingested."""
+    try:
+        with open(CORPUS_VERSION_PATH, encoding="utf-8") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return "0"
+
+def invalidate_answer_cache():
+    """
+    Invalidation hook for re-ingest. Bumps the corpus version, which
+    question-level answers are keyed on (so running processes miss too),
+    and drops them from disk. Answers keyed on the exact chunk set stay:
+    they are only reused if the same chunk ids and texts come back.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(CORPUS_VERSION_PATH, "w", encoding="utf-8") as f:
+        f.write(uuid.uuid4().hex)
+    if os.path.exists(ANSWER_CACHE_PATH):
+        SQLiteCache(ANSWER_CACHE_PATH, "answers").clear()
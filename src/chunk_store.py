@@ -0,0 +1,41 @@
+import json
+from pathlib import Path
+import numpy as np
+
+# Written into the BM25 index directory by BM25IndexWriter, so a chunk's
+# integer id is its BM25 doc id
+TEXT_FILE = "chunk_text.bin"          # UTF-8 texts, back to back
+OFFSETS_FILE = "chunk_offsets.npy"    # byte offset of each text (+ end)
+SOURCE_FILE = "doc_source.npy"        # interned source id of each chunk
+SOURCES_FILE = "sources.json"         # source strings ("TICKER | DATE")
+
+class ChunkStore:
+    """
+    Read-only chunk texts and sources. The text blob and offsets are
+    memory-mapped, so a worker only pages in the chunks it reads and
+    nothing is held as Python strings until text() is called.
+    """
+
+    def __init__(self, path):
+        path = Path(path)
+        self.offsets = np.load(path / OFFSETS_FILE, mmap_mode="r")
+        self.doc_source = np.load(path / SOURCE_FILE, mmap_mode="r")
+        with open(path / SOURCES_FILE, encoding="utf-8") as f:
+            self.sources = json.load(f)
+        if (path / TEXT_FILE).stat().st_size:
+            self._blob = np.memmap(path / TEXT_FILE, dtype=np.uint8, mode="r")
+        else:
+            self._blob = np.empty(0, dtype=np.uint8)   # can't memory-map zero bytes
+
+    @staticmethod
+    def exists(path) -> bool:
+        return (Path(path) / OFFSETS_FILE).exists()
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def text(self, doc: int) -> str:
+        return self._blob[self.offsets[doc]:self.offsets[doc + 1]].tobytes().decode("utf-8")
+
+    def source(self, doc: int) -> str:
+        return self.sources[self.doc_source[doc]]
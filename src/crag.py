@@ -1,9 +1,32 @@
-import os
-from groq import Groq
-from dotenv import load_dotenv
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from src.llm import LLM_MODEL, TIMEOUT_ERRORS, chat
+from src.tracing import bind, span
 
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+CRAG_MAX_WORKERS = 4        # concurrent grading calls
+CRAG_GRADE_TIMEOUT = None   # seconds per grading call (None = gateway default)
+
+# "parallel"   one grading call per chunk, run concurrently
+# "sequential" one grading call per chunk, one after another
+# "batch"      all chunks in a single call, per-chunk fallback if unparseable
+GRADING_MODES = ("parallel", "sequential", "batch")
+CRAG_GRADING_MODE = "parallel"
+
+# Reranker-score gate: chunks with rerank_score >= CRAG_ACCEPT_SCORE are
+# taken as RELEVANT, and <= CRAG_REJECT_SCORE as IRRELEVANT, without an LLM
+# call. Only the uncertain band in between is graded. None disables a side.
+# These, like CRAG_GRADE_TIMEOUT, are read at call time wherever an
+# argument is left as None.
+CRAG_ACCEPT_SCORE = 0.9
+CRAG_REJECT_SCORE = 0.05
+
+# Correction: the refined query's candidates are merged with the original
+# pool and reranked together, then graded in rank order until
+# CRAG_TARGET_RELEVANT are RELEVANT or the top CRAG_CORRECTION_DEPTH have
+# all been graded. Chunks graded in the first pass keep their grade.
+CRAG_TARGET_RELEVANT = 2
+CRAG_CORRECTION_DEPTH = 6
 
 GRADE_PROMPT = """You are a relevance grader for a financial RAG system.
 
@@ -19,6 +42,21 @@ Transcript Chunk: {chunk}
 
 Grade (one word only):"""
 
+BATCH_GRADE_PROMPT = """You are a relevance grader for a financial RAG system.
+
+Given a user question and {n} numbered chunks from earnings call transcripts, grade whether each chunk is useful for answering the question.
+
+Grade each chunk with ONLY one of these three words:
+- RELEVANT   (chunk directly helps answer the question)
+- IRRELEVANT (chunk has nothing to do with the question)
+- AMBIGUOUS  (chunk is partially related but not directly useful)
+
+User Question: {question}
+
+{chunks}
+
+Respond with ONLY a JSON array of {n} grades in chunk order, e.g. ["RELEVANT", "IRRELEVANT", "AMBIGUOUS"]:"""
+
 REFINE_PROMPT = """You are a financial search query expert.
 
 The original query failed to retrieve good results. 
@@ -29,19 +67,24 @@ Problem: Retrieved chunks were mostly irrelevant
 
 Write a completely different search query (one line only):"""
 
-def grade_chunk(question: str, chunk: str) -> str:
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
+def grade_chunk(question: str, chunk: str, timeout: float = None) -> str:
+    content = chat(
+        "crag_grade",
+        [
             {"role": "user", "content": GRADE_PROMPT.format(
                 question=question,
                 chunk=chunk[:500]  # grade on first 500 chars
             )}
         ],
+        model=LLM_MODEL,
         temperature=0.0,
-        max_tokens=10
+        max_tokens=10,
+        timeout=timeout
     )
-    grade = response.choices[0].message.content.strip().upper()
+    return _parse_grade(content)
+
+def _parse_grade(text: str) -> str:
+    grade = text.strip().upper()
     # Clean up in case model adds extra words
     if "RELEVANT" in grade and "IRRELEVANT" not in grade:
         return "RELEVANT"
@@ -50,31 +93,218 @@ def grade_chunk(question: str, chunk: str) -> str:
     else:
         return "AMBIGUOUS"
 
+def grade_chunks_batch(question: str, chunks: list, timeout: float = None, stats: dict = None):
+    """
+    Grades all chunks with a single LLM call (timeout defaults to
+    CRAG_GRADE_TIMEOUT). Returns grades in chunk order, or None if the
+    call timed out (counted in stats["timeouts"]) or the verdict list
+    can't be parsed.
+    """
+    timeout = CRAG_GRADE_TIMEOUT if timeout is None else timeout
+    numbered = "\n\n".join(
+        f"Chunk {i}:\n{c['text'][:500]}"  # grade on first 500 chars
+        for i, c in enumerate(chunks, 1)
+    )
+    try:
+        content = chat(
+            "crag_grade",
+            [
+                {"role": "user", "content": BATCH_GRADE_PROMPT.format(
+                    n=len(chunks),
+                    question=question,
+                    chunks=numbered
+                )}
+            ],
+            model=LLM_MODEL,
+            temperature=0.0,
+            max_tokens=10 * len(chunks) + 20,
+            timeout=timeout
+        )
+    except TIMEOUT_ERRORS:
+        print(f"   CRAG: batch grading timed out for {len(chunks)} chunks")
+        _count(stats, "timeouts", 1)
+        return None
+    
+    match = re.search(r"\[.*?\]", content, re.DOTALL)
+    if not match:
+        return None
+    try:
+        verdicts = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    if len(verdicts) != len(chunks) or not all(isinstance(v, str) for v in verdicts):
+        return None
+    return [_parse_grade(v) for v in verdicts]
+
+def grade_chunks(question: str, chunks: list, max_workers: int = CRAG_MAX_WORKERS,
+                 timeout: float = None, stats: dict = None) -> list:
+    """
+    Grades chunks concurrently on a bounded thread pool (timeout defaults
+    to CRAG_GRADE_TIMEOUT, and includes time queued in the gateway).
+    Grades come back in chunk order; a call that times out counts as
+    AMBIGUOUS and is counted in stats["timeouts"].
+    """
+    timeout = CRAG_GRADE_TIMEOUT if timeout is None else timeout
+    timed_out = []
+    
+    def _grade(chunk):
+        try:
+            return grade_chunk(question, chunk["text"], timeout=timeout)
+        except TIMEOUT_ERRORS:
+            print(f"     CRAG: grading timed out for {chunk['source']}")
+            timed_out.append(chunk)
+            return "AMBIGUOUS"
+    
+    if max_workers <= 1 or len(chunks) <= 1:
+        grades = [_grade(c) for c in chunks]
+    else:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            grades = list(pool.map(bind(_grade), chunks))
+    _count(stats, "timeouts", len(timed_out))
+    return grades
+
+def gate_chunks(chunks: list, accept_score: float = None, reject_score: float = None) -> list:
+    """
+    Grades chunks from their cross-encoder rerank_score alone (thresholds
+    default to CRAG_ACCEPT_SCORE / CRAG_REJECT_SCORE).
+    Returns one grade per chunk, or None where the LLM still has to decide.
+    """
+    accept_score = CRAG_ACCEPT_SCORE if accept_score is None else accept_score
+    reject_score = CRAG_REJECT_SCORE if reject_score is None else reject_score
+    gates = []
+    for c in chunks:
+        score = c.get("rerank_score")
+        if score is not None and accept_score is not None and score >= accept_score:
+            gates.append("RELEVANT")
+        elif score is not None and reject_score is not None and score <= reject_score:
+            gates.append("IRRELEVANT")
+        else:
+            gates.append(None)
+    return gates
+
+def _grade(question: str, chunks: list, mode: str, stats: dict,
+           accept_score: float, reject_score: float) -> list:
+    with span("crag.grade", len(chunks)) as s:
+        grades = gate_chunks(chunks, accept_score, reject_score)
+        uncertain = [c for c, g in zip(chunks, grades) if g is None]
+        _count(stats, "gated", len(chunks) - len(uncertain))
+        _count(stats, "graded", len(uncertain))
+        for c, g in zip(chunks, grades):
+            c["crag_gated"] = g is not None
+        
+        llm_grades = iter(_grade_with_llm(question, uncertain, mode, stats))
+        grades = [g if g is not None else next(llm_grades) for g in grades]
+        s.candidates_out = len(grades) - grades.count("IRRELEVANT")
+        s.attrs.update(gated=len(chunks) - len(uncertain), graded=len(uncertain))
+    return grades
+
+def _grade_with_llm(question: str, chunks: list, mode: str, stats: dict) -> list:
+    if not chunks:
+        return []
+    if mode == "batch" and len(chunks) > 1:
+        _count(stats, "llm_calls", 1)
+        grades = grade_chunks_batch(question, chunks, stats=stats)
+        if grades is not None:
+            return grades
+        print("   CRAG: No usable batch verdict, grading chunk by chunk...")
+    
+    _count(stats, "llm_calls", len(chunks))
+    workers = 1 if mode == "sequential" else CRAG_MAX_WORKERS
+    return grade_chunks(question, chunks, max_workers=workers, stats=stats)
+
+def _count(stats: dict, key: str, n: int):
+    if stats is not None:
+        stats[key] = stats.get(key, 0) + n
+
+def _print_grades(chunks: list):
+    for c in chunks:
+        print(f"     → {c['source']}: {c['crag_grade']}{' (gated)' if c['crag_gated'] else ''}")
+
 def refine_query(query: str) -> str:
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "user", "content": REFINE_PROMPT.format(query=query)}
-        ],
+    return chat(
+        "crag_refine",
+        [{"role": "user", "content": REFINE_PROMPT.format(query=query)}],
+        model=LLM_MODEL,
         temperature=0.4,
         max_tokens=100
-    )
-    return response.choices[0].message.content.strip()
+    ).strip()
+
+def _correct(question: str, chunks: list, candidates: list, retrieve_fn, rerank_fn,
+             mode: str, stats: dict, accept_score: float, reject_score: float) -> list:
+    # Refined retrieval, merged with the original pool and reranked against
+    # the refined query; graded in rank order, fewest calls first. Returns
+    # up to len(chunks) RELEVANT/AMBIGUOUS chunks, or [] if none turn up.
+    with span("crag.retrieval") as s:
+        refined = refine_query(question)
+        _count(stats, "llm_calls", 1)
+        print(f"   Refined query: {refined}")
+        
+        new_chunks = retrieve_fn(refined, top_k=20)
+        s.candidates_out = len(new_chunks)
+    
+    # Graded chunks come first, so a chunk found again keeps its grade
+    pool = {}
+    for c in list(chunks) + list(candidates or []) + new_chunks:
+        pool.setdefault(c["id"], c)
+    if rerank_fn is None:
+        from src.reranker import rerank as rerank_fn
+    with span("crag.rerank", len(pool)) as s:
+        # Copies, so rerank_score on the caller's chunks isn't overwritten
+        ranked = rerank_fn(refined, [dict(c) for c in pool.values()], top_k=len(pool))
+        s.candidates_out = len(ranked)
+    
+    print("   CRAG: Re-grading merged pool in rerank order...")
+    # Chunks already graded IRRELEVANT don't take up any of the depth
+    top = [c for c in ranked if c.get("crag_grade") != "IRRELEVANT"][:CRAG_CORRECTION_DEPTH]
+    reused = sum("crag_grade" in c for c in top)
+    while True:
+        relevant = sum(c.get("crag_grade") == "RELEVANT" for c in top)
+        ungraded = [c for c in top if "crag_grade" not in c]
+        if relevant >= CRAG_TARGET_RELEVANT or not ungraded:
+            break
+        # Only as many as could still be missing, so an early stop wastes no calls
+        batch = ungraded[:CRAG_TARGET_RELEVANT - relevant]
+        for chunk, grade in zip(batch, _grade(question, batch, mode, stats, accept_score, reject_score)):
+            chunk["crag_grade"] = grade
+    
+    graded = [c for c in top if "crag_grade" in c]
+    print(f"   CRAG: {len(graded) - reused} graded, {reused} grades reused, "
+          f"{relevant} relevant in the top {len(top)}")
+    final_chunks = [c for c in graded if c["crag_grade"] == "RELEVANT"]
+    final_chunks += [c for c in graded if c["crag_grade"] == "AMBIGUOUS"]
+    final_chunks = final_chunks[:len(chunks)]
+    _print_grades(final_chunks)
+    return final_chunks
 
-def apply_crag(question: str, chunks: list, retrieve_fn) -> tuple[list, str]:
+def apply_crag(question: str, chunks: list, retrieve_fn, mode: str = None,
+               stats: dict = None, accept_score: float = None,
+               reject_score: float = None, candidates: list = None,
+               rerank_fn=None) -> tuple[list, str]:
     """
     Grades each chunk. If too many are irrelevant,
-    refines the query and retrieves again.
-    Returns (final_chunks, crag_status)
+    refines the query and retrieves again (see _correct).
+    `mode` is one of GRADING_MODES (default CRAG_GRADING_MODE). Chunks whose
+    rerank_score clears the accept/reject thresholds (default
+    CRAG_ACCEPT_SCORE / CRAG_REJECT_SCORE) skip the LLM.
+    `candidates` is the pool `chunks` were reranked from, merged into the
+    correction pool; `rerank_fn(query, chunks, top_k=...)` reranks that
+    pool against the refined query (default: src.reranker.rerank).
+    If stats is given, "llm_calls", "gated", "graded" and "timeouts"
+    (grading calls that timed out) are added to it.
+    Returns (final_chunks, crag_status). crag_status is "PASSED",
+    "CORRECTED", or "NO_CONTEXT" when correction found nothing better than
+    IRRELEVANT; final_chunks is then empty.
     """
+    mode = mode or CRAG_GRADING_MODE
+    if mode not in GRADING_MODES:
+        raise ValueError(f"Unknown CRAG grading mode: {mode!r}")
+    
     print("   CRAG: Grading chunk relevance...")
     
-    grades = []
-    for chunk in chunks:
-        grade = grade_chunk(question, chunk["text"])
+    grades = _grade(question, chunks, mode, stats, accept_score, reject_score)
+    for chunk, grade in zip(chunks, grades):
         chunk["crag_grade"] = grade
-        grades.append(grade)
-        print(f"     → {chunk['source']}: {grade}")
+    _print_grades(chunks)
     
     relevant_count = grades.count("RELEVANT")
     irrelevant_count = grades.count("IRRELEVANT")
@@ -82,19 +312,9 @@ def apply_crag(question: str, chunks: list, retrieve_fn) -> tuple[list, str]:
     # If majority irrelevant → refine and re-retrieve
     if irrelevant_count >= 2 or relevant_count == 0:
         print(f"   CRAG: Too many irrelevant chunks ({irrelevant_count}/3). Refining query...")
-        refined = refine_query(question)
-        print(f"   Refined query: {refined}")
-        
-        new_chunks = retrieve_fn(refined, top_k=20)
-        
-        # Re-grade the new chunks
-        print("   CRAG: Re-grading refined results...")
-        for chunk in new_chunks[:3]:
-            grade = grade_chunk(question, chunk["text"])
-            chunk["crag_grade"] = grade
-            print(f"     → {chunk['source']}: {grade}")
-        
-        return new_chunks[:3], "CORRECTED"
+        final_chunks = _correct(question, chunks, candidates, retrieve_fn, rerank_fn,
+                                mode, stats, accept_score, reject_score)
+        return final_chunks, "CORRECTED" if final_chunks else "NO_CONTEXT"
     
     # Filter to only relevant/ambiguous chunks
     good_chunks = [c for c in chunks if c["crag_grade"] != "IRRELEVANT"]
@@ -0,0 +1,260 @@
+import threading
+import numpy as np
+from src.bm25_index import BM25_PATH, BM25Index, build_bm25_index
+from src.cache import EmbeddingCache, corpus_version
+from src.chunk_store import ChunkStore
+from src.filters import chroma_where
+from src.shards import SHARDS_PATH, ShardPool, build_shards, load_manifest, shards_exist
+from src.vector_index import (
+    VECTOR_PATH, VECTOR_PRECISION, VectorIndex, export_vector_index, fingerprint,
+)
+
+CHROMA_PATH = "chroma_db"
+COLLECTION_NAME = "transcripts"
+EMBED_MODEL = "all-MiniLM-L6-v2"
+
+# "chroma" queries the HNSW collection; "numpy" runs an exact search over
+# embeddings exported next to it (see src.vector_index)
+VECTOR_BACKEND = "chroma"
+# Scatter hybrid retrieval over per-ticker-group (or per-year) shards in
+# worker processes instead of searching one index here (see src.shards)
+USE_SHARDS = False
+
+# Query text -> embedding, shared by every engine (keys include the model)
+# and so by first-pass retrieval and CRAG re-retrieval alike
+embedding_cache = EmbeddingCache()
+
+class RetrievalEngine:
+    """
+    Long-lived retrieval state: one embedder, one Chroma client/collection
+    handle, the BM25 index and the chunk store that shares its doc ids,
+    and (numpy backend) the exported embedding matrix. Build it once at
+    process start and share it between the pipeline, CRAG re-retrieval
+    and evaluation. Construction is cheap: the embedder, the Chroma
+    collection and the indexes each load on first use, independently,
+    so src.warmup can load them in parallel. After a re-ingest, refresh()
+    drops the indexes so they reopen from the new files.
+    """
+
+    def __init__(self, chroma_path: str = CHROMA_PATH, model_name: str = EMBED_MODEL,
+                 bm25_path: str = BM25_PATH, vector_backend: str = None,
+                 vector_path: str = VECTOR_PATH, vector_precision: str = VECTOR_PRECISION,
+                 use_shards: bool = None, shards_path: str = SHARDS_PATH):
+        self.chroma_path = chroma_path
+        self.bm25_path = bm25_path
+        self.vector_path = vector_path
+        self.vector_precision = vector_precision
+        self.vector_backend = vector_backend or VECTOR_BACKEND
+        if self.vector_backend not in ("chroma", "numpy"):
+            raise ValueError(f"unknown vector backend {self.vector_backend!r}")
+        self.use_shards = USE_SHARDS if use_shards is None else use_shards
+        self.shards_path = shards_path
+        self.model_name = model_name
+        self._embedder = None
+        self._client = None
+        self._collection = None
+        self._model_lock = threading.Lock()
+        self._chroma_lock = threading.Lock()
+        self._bm25 = None
+        self._store = None
+        self._doc_index = None
+        self._vectors = None
+        self._shards = None
+        self._version = None   # corpus version the indexes were loaded under
+        self._lock = threading.Lock()
+
+    @property
+    def embedding_function(self):
+        """The sentence-transformers embedder, loaded on first use."""
+        if self._embedder is None:
+            with self._model_lock:
+                if self._embedder is None:
+                    from chromadb.utils import embedding_functions
+                    self._embedder = embedding_functions.SentenceTransformerEmbeddingFunction(
+                        model_name=self.model_name
+                    )
+        return self._embedder
+
+    @property
+    def collection(self):
+        """
+        The Chroma collection, opened on first use. Queries pass their own
+        embeddings (see vector_query), so opening it doesn't wait for the
+        embedder to load.
+        """
+        if self._collection is None:
+            with self._chroma_lock:
+                if self._collection is None:
+                    import chromadb
+                    self._client = chromadb.PersistentClient(path=self.chroma_path)
+                    self._collection = self._client.get_collection(
+                        COLLECTION_NAME, embedding_function=None
+                    )
+        return self._collection
+
+    @property
+    def client(self):
+        """The Chroma client behind collection."""
+        self.collection   # opens the client with it
+        return self._client
+
+    def embed(self, texts: list) -> np.ndarray:
+        """Query embeddings (float32, one row per text), served from embedding_cache when repeated."""
+        return embedding_cache.embed(self.model_name, list(texts),
+                                     lambda missing: self.embedding_function(missing))
+
+    def bm25_index(self) -> BM25Index:
+        """Returns the memory-mapped BM25 index, loading it on first use."""
+        if self._bm25 is None:
+            with self._lock:
+                if self._bm25 is None:
+                    # Read before the files, so a re-ingest racing the load
+                    # shows up as a mismatch in refresh()
+                    self._version = corpus_version()
+                    self._bm25 = self._load_bm25_index()
+        return self._bm25
+
+    def refresh(self) -> str:
+        """
+        Compares the corpus version (src.cache.corpus_version) with the one
+        the indexes were loaded under. If ingest has bumped it since, the
+        BM25 index, chunk store, exported vectors and shards are dropped
+        and reopen on next use. Returns the version now being served.
+        """
+        version = corpus_version()
+        with self._lock:
+            if self._version is not None and self._version != version:
+                print("   Corpus re-ingested — reloading indexes")
+                if self._shards is not None:
+                    self._shards.close()
+                self._bm25 = self._store = self._vectors = self._shards = None
+                self._version = None
+            return self._version or version
+
+    def chunk_store(self) -> ChunkStore:
+        """Memory-mapped chunk texts/sources, indexed by BM25 doc id."""
+        if self._store is None:
+            bm25 = self.bm25_index()
+            with self._lock:
+                if self._store is None:
+                    self._doc_index = {cid: i for i, cid in enumerate(bm25.chunk_ids)}
+                    self._store = ChunkStore(self.bm25_path)
+        return self._store
+
+    def vector_index(self) -> VectorIndex:
+        """
+        The memory-mapped embedding matrix (rows = BM25 doc ids), exported
+        from Chroma on first use or when ingest has changed the doc ids.
+        """
+        if self._vectors is None:
+            bm25 = self.bm25_index()
+            with self._lock:
+                if self._vectors is None:
+                    self._vectors = self._load_vector_index(bm25)
+        return self._vectors
+
+    def _load_vector_index(self, bm25: BM25Index) -> VectorIndex:
+        expected = fingerprint(bm25.chunk_ids)
+        if VectorIndex.exists(self.vector_path):
+            index = VectorIndex(self.vector_path)
+            if index.fingerprint == expected and index.precision == self.vector_precision:
+                return index
+        print(f"   Exporting {self.vector_precision} embeddings for the numpy backend...")
+        export_vector_index(self.collection, bm25.chunk_ids, self.vector_path,
+                            self.vector_precision)
+        return VectorIndex(self.vector_path)
+
+    def shard_pool(self) -> ShardPool:
+        """
+        The shard coordinator and its worker processes. Shards are split
+        off the corpus index on first use, or again when ingest has
+        changed it.
+        """
+        if self._shards is None:
+            bm25 = self.bm25_index()
+            with self._lock:
+                if self._shards is None:
+                    current = (shards_exist(self.shards_path) and
+                               load_manifest(self.shards_path)["fingerprint"] == fingerprint(bm25.chunk_ids))
+                    if not current:
+                        print("   Building retrieval shards...")
+                        build_shards(self.collection, self.bm25_path, self.shards_path,
+                                     precision=self.vector_precision)
+                    self._shards = ShardPool(self.shards_path)
+        return self._shards
+
+    def vector_query(self, query_texts: list, n_results: int, filters: dict = None,
+                     embeddings: np.ndarray = None) -> dict:
+        """
+        Nearest chunks for a batch of queries from the configured backend,
+        shaped like Chroma's query(): {"ids": [[...]], "distances": [[...]]}
+        with one list per query. `embeddings` are the queries' vectors if
+        already computed (see embed). The numpy backend reports the squared
+        L2 distance of the unit vectors (2 - 2·cos), which is what the
+        collection's default "l2" space returns.
+        """
+        if embeddings is None:
+            embeddings = self.embed(query_texts)
+        if self.vector_backend == "chroma":
+            return self.collection.query(
+                query_embeddings=embeddings.tolist(),
+                n_results=n_results,
+                where=chroma_where(filters or {}),
+                include=["distances"]
+            )
+        bm25 = self.bm25_index()
+        index = self.vector_index()
+        mask = bm25.candidate_mask(filters)
+        if mask is not None and not mask.any():
+            mask = None
+        docs, sims = index.search(embeddings, n_results, mask)
+        return {
+            "ids": [[bm25.chunk_ids[d] for d in row] for row in docs.tolist()],
+            "distances": (2 - 2 * sims.astype(np.float64)).tolist(),
+        }
+
+    def _load_bm25_index(self) -> BM25Index:
+        if not BM25Index.exists(self.bm25_path) or not ChunkStore.exists(self.bm25_path):
+            # Vector store predates the persisted index — build it once
+            # from the collection and save it for every later process.
+            print("   Building BM25 index (first time only)...")
+            all_data = self.collection.get(include=["documents", "metadatas"])
+            build_bm25_index(all_data["ids"], all_data["documents"], self.bm25_path,
+                             all_data["metadatas"])
+        index = BM25Index(self.bm25_path)
+        print(f"   BM25 index loaded over {index.num_docs} chunks")
+        return index
+
+    def get_chunks(self, ids: list) -> dict:
+        """
+        Fetches {id: {"doc", "text", "source"}} for the given Chroma ids
+        from the chunk store; "doc" is the integer chunk id. Ids the store
+        doesn't know yet (Chroma ahead of it) are read from Chroma.
+        """
+        if not ids:
+            return {}
+        store = self.chunk_store()
+        chunks = {}
+        for cid in ids:
+            doc = self._doc_index.get(cid)
+            if doc is not None:
+                chunks[cid] = {"doc": doc, "text": store.text(doc), "source": store.source(doc)}
+        missing = [cid for cid in ids if cid not in chunks]
+        if missing:
+            data = self.collection.get(ids=missing, include=["documents", "metadatas"])
+            for i, cid in enumerate(data["ids"]):
+                chunks[cid] = {"doc": None, "text": data["documents"][i],
+                               "source": data["metadatas"][i]["source"]}
+        return chunks
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> RetrievalEngine:
+    """Returns the process-wide engine, creating it on first call."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = RetrievalEngine()
+    return _engine
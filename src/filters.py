@@ -0,0 +1,94 @@
+import re
+from datetime import datetime
+from pathlib import Path
+
+# Company names (lower case) and tickers that map a question to a ticker filter
+COMPANY_NAMES = {
+    "AAPL": ["apple"],
+    "AMZN": ["amazon", "aws"],
+    "MSFT": ["microsoft", "azure"],
+    "GOOGL": ["google", "alphabet"],
+    "NVDA": ["nvidia"],
+    "AMD": ["amd", "advanced micro devices"],
+    "INTC": ["intel"],
+    "CSCO": ["cisco"],
+    "ASML": ["asml"],
+    "MU": ["micron"],
+}
+
+_NAME_PATTERNS = [
+    (ticker, re.compile(r"\b(?:" + "|".join(re.escape(n) for n in names) + r")(?:'s)?\b", re.I))
+    for ticker, names in COMPANY_NAMES.items()
+]
+# Tickers only count in upper case ("MU", not "mu")
+_TICKER_PATTERN = re.compile(r"\b(" + "|".join(COMPANY_NAMES) + r")\b")
+_YEAR_RANGE_PATTERN = re.compile(r"\b(20\d\d)\s*(?:-|–|to|through)\s*(20\d\d)\b")
+_YEAR_PATTERN = re.compile(r"\b(20\d\d)\b")
+
+def transcript_fields(filename: str) -> dict:
+    """
+    Structured metadata from a transcript file name (or chunk id stem):
+    2019-Dec-18-MU.txt → {"ticker": "MU", "year": 2019, "quarter": 4,
+    "date": "2019-12-18"}. "quarter" is the calendar quarter of the call.
+    """
+    parts = Path(filename).stem.split("-")
+    ticker = parts[-1]
+    try:
+        day = datetime.strptime("-".join(parts[:-1]), "%Y-%b-%d")
+    except ValueError:
+        return {"ticker": ticker, "year": 0, "quarter": 0, "date": "-".join(parts[:-1])}
+    return {
+        "ticker": ticker,
+        "year": day.year,
+        "quarter": (day.month - 1) // 3 + 1,
+        "date": day.strftime("%Y-%m-%d"),
+    }
+
+def extract_filters(query: str) -> dict:
+    """
+    Maps company names/tickers and years mentioned in a question to
+    {"ticker": [...], "year": [...]}; keys without a match are left out,
+    so a question naming neither returns {} (search everything).
+    "2017-2019" and "2017 to 2019" expand to every year in between;
+    "2017 and 2019" is just those two years.
+    """
+    filters = {}
+    tickers = [t for t, pattern in _NAME_PATTERNS if pattern.search(query)]
+    tickers += [t for t in _TICKER_PATTERN.findall(query) if t not in tickers]
+    if tickers:
+        filters["ticker"] = tickers
+
+    years = set()
+    for start, end in _YEAR_RANGE_PATTERN.findall(query):
+        lo, hi = sorted((int(start), int(end)))
+        years.update(range(lo, hi + 1))
+    years.update(int(y) for y in _YEAR_PATTERN.findall(query))
+    if years:
+        filters["year"] = sorted(years)
+    return filters
+
+def chroma_where(filters: dict) -> dict:
+    """The same filters as a Chroma `where` clause (None when empty)."""
+    clauses = [
+        {key: values[0]} if len(values) == 1 else {key: {"$in": list(values)}}
+        for key, values in filters.items() if values
+    ]
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+def describe_filters(filters: dict) -> str:
+    return " | ".join(f"{key}: {', '.join(map(str, values))}" for key, values in filters.items())
+
+if __name__ == "__main__":
+    checks = [
+        ("How did Apple do in 2017 and 2019?", {"ticker": ["AAPL"], "year": [2017, 2019]}),
+        ("NVDA data center revenue 2017-2019", {"ticker": ["NVDA"], "year": [2017, 2018, 2019]}),
+        ("Micron pricing from 2016 to 2018", {"ticker": ["MU"], "year": [2016, 2017, 2018]}),
+        ("what about w1 at mu", {}),
+    ]
+    print(" Filter Extraction Test\n" + "="*50)
+    for query, expected in checks:
+        filters = extract_filters(query)
+        print(f"{query!r:45} → {describe_filters(filters) or '(none)'}")
+        assert filters == expected, (query, filters, expected)
@@ -1,9 +1,4 @@
-import os
-from groq import Groq
-from dotenv import load_dotenv
-
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from src.llm import LLM_MODEL, chat, chat_stream
 
 ANSWER_PROMPT = """You are EarningsIQ, an expert financial analyst assistant specializing in NASDAQ earnings call analysis.
 
@@ -23,24 +18,36 @@ User Question: {question}
 
 Answer:"""
 
-def generate_answer(question: str, chunks: list) -> str:
+def _build_messages(question: str, chunks: list) -> list:
     context = "\n\n---\n\n".join([
         f"[Source: {c['source']}]\n{c['text']}"
         for c in chunks
     ])
-    
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "user", "content": ANSWER_PROMPT.format(
-                context=context,
-                question=question
-            )}
-        ],
+    return [
+        {"role": "user", "content": ANSWER_PROMPT.format(
+            context=context,
+            question=question
+        )}
+    ]
+
+def generate_answer(question: str, chunks: list) -> str:
+    return chat(
+        "generate",
+        _build_messages(question, chunks),
+        model=LLM_MODEL,
+        temperature=0.1,
+        max_tokens=600
+    ).strip()
+
+def generate_answer_stream(question: str, chunks: list):
+    """Same as generate_answer, but yields text fragments as they arrive."""
+    yield from chat_stream(
+        "generate",
+        _build_messages(question, chunks),
+        model=LLM_MODEL,
         temperature=0.1,
         max_tokens=600
     )
-    return response.choices[0].message.content.strip()
 
 if __name__ == "__main__":
     # Test with hardcoded chunks first
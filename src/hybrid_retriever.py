@@ -1,107 +1,185 @@
-import chromadb
 import numpy as np
-from chromadb.utils import embedding_functions
-from rank_bm25 import BM25Okapi
+from src.bm25_index import tokenize, top_k_indices
+from src.engine import RetrievalEngine, get_engine
+from src.tracing import span
 
-CHROMA_PATH = "chroma_db"
-
-# Cache BM25 index so we don't rebuild every call
-_bm25_index = None
-_all_chunks = None
-
-def _build_bm25_index():
-    global _bm25_index, _all_chunks
-    
-    if _bm25_index is not None:
-        return _bm25_index, _all_chunks
+def hybrid_retrieve(query: str, top_k: int = 20, engine: RetrievalEngine = None,
+                    filters: dict = None) -> list:
+    """
+    Vector + BM25 search fused 60/40. `filters` ({"ticker": [...],
+    "year": [...]}, see src.filters) restrict both searches to matching
+    transcripts: a Chroma `where` clause (the same mask on the numpy
+    vector backend) and a BM25 candidate mask.
+    Filters are ignored if they match no chunk, or if the BM25 index
+    predates filter fields (re-run ingest to add them).
+    With a sharded engine the query is scattered to the shards instead
+    (see sharded_retrieve); the results have the same shape.
+    """
+    engine = engine or get_engine()
+    if engine.use_shards:
+        return sharded_retrieve(query, top_k, engine, filters)
+    bm25 = engine.bm25_index()
     
-    print("   Building BM25 index (first time only)...")
-    ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
-    client = chromadb.PersistentClient(path=CHROMA_PATH)
-    collection = client.get_collection("transcripts", embedding_function=ef)
+    mask = bm25.candidate_mask(filters)
+    if mask is None or not mask.any():
+        filters, mask = None, None
     
-    # Pull all documents from ChromaDB
-    all_data = collection.get(include=["documents", "metadatas"])
+    # --- Vector Search ---
+    # Scores only: texts come from the chunk store, and only for the final top_k
+    with span("retrieval.vector") as s:
+        vector_results = engine.vector_query([query], top_k, filters)
+        vector_hits = list(zip(vector_results["ids"][0], vector_results["distances"][0]))
+        s.candidates_out = len(vector_hits)
     
-    docs = all_data["documents"]
-    metas = all_data["metadatas"]
+    # --- BM25 Search ---
+    with span("retrieval.bm25", _searched(bm25, mask)) as s:
+        tokenized_query = tokenize(query)
+        bm25_scores = bm25.get_scores(tokenized_query, mask)
+        
+        bm25_hits = _top_bm25(bm25, bm25_scores, mask, top_k)
+        s.candidates_out = len(bm25_hits)
     
-    _all_chunks = [
-        {"text": docs[i], "source": metas[i]["source"]}
-        for i in range(len(docs))
+    ranked = fuse_scores(vector_hits, bm25_hits, top_k)
+    chunks = engine.get_chunks([chunk_id for chunk_id, _ in ranked])
+    return [
+        {"id": chunk_id, **chunks[chunk_id], **scores}
+        for chunk_id, scores in ranked
     ]
+
+def hybrid_retrieve_batch(queries: list, top_k: int = 20, engine: RetrievalEngine = None,
+                          filters: list = None) -> list:
+    """
+    hybrid_retrieve for many queries: all queries embedded in one call,
+    then one vector search per distinct filter set on those vectors (a
+    single matmul when none differ), BM25 for all queries in one
+    get_scores_batch pass, and one chunk lookup for the union of the
+    results. `filters` holds one dict (or None) per query. Returns one
+    result list per query, equal to hybrid_retrieve's.
+    Sharded engines fall back to one scatter-gather per query.
+    """
+    engine = engine or get_engine()
+    filters = list(filters or [None] * len(queries))
+    if engine.use_shards:
+        return [sharded_retrieve(q, top_k, engine, f) for q, f in zip(queries, filters)]
+    bm25 = engine.bm25_index()
+    
+    masks = []
+    for i, f in enumerate(filters):
+        mask = bm25.candidate_mask(f)
+        if mask is None or not mask.any():
+            filters[i], mask = None, None
+        masks.append(mask)
+    
+    # --- Vector Search: one embedding pass, then one search per filter set ---
+    with span("retrieval.embed"):
+        embeddings = engine.embed(queries)
+    groups = {}
+    for i, f in enumerate(filters):
+        groups.setdefault(repr(sorted((f or {}).items())), []).append(i)
+    vector_hits = [None] * len(queries)
+    with span("retrieval.vector") as s:
+        for members in groups.values():
+            results = engine.vector_query([queries[i] for i in members], top_k, filters[members[0]],
+                                          embeddings=embeddings[members])
+            for i, ids, distances in zip(members, results["ids"], results["distances"]):
+                vector_hits[i] = list(zip(ids, distances))
+        s.candidates_out = sum(len(h) for h in vector_hits)
     
-    # Tokenize for BM25
-    tokenized = [doc["text"].lower().split() for doc in _all_chunks]
-    _bm25_index = BM25Okapi(tokenized)
+    # --- BM25 Search: every query in one pass ---
+    with span("retrieval.bm25", sum(_searched(bm25, m) for m in masks)) as s:
+        bm25_scores = bm25.get_scores_batch([tokenize(q) for q in queries], masks)
+        bm25_hits = [_top_bm25(bm25, bm25_scores[i], masks[i], top_k) for i in range(len(queries))]
+        s.candidates_out = sum(len(h) for h in bm25_hits)
     
-    print(f"   BM25 index built over {len(_all_chunks)} chunks")
-    return _bm25_index, _all_chunks
+    ranked = [fuse_scores(vector_hits[i], bm25_hits[i], top_k) for i in range(len(queries))]
+    chunks = engine.get_chunks(list({chunk_id for r in ranked for chunk_id, _ in r}))
+    return [
+        [{"id": chunk_id, **chunks[chunk_id], **scores} for chunk_id, scores in r]
+        for r in ranked
+    ]
+
+def _searched(bm25, mask: np.ndarray) -> int:
+    # Documents a BM25 search scores: the filter's candidates, else all
+    return int(mask.sum()) if mask is not None else bm25.num_docs
 
-def hybrid_retrieve(query: str, top_k: int = 20) -> list:
-    ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
-    client = chromadb.PersistentClient(path=CHROMA_PATH)
-    collection = client.get_collection("transcripts", embedding_function=ef)
+def _top_bm25(bm25, scores: np.ndarray, mask: np.ndarray, top_k: int) -> list:
+    # (id, raw score) of the top BM25 results, among the candidates when filtered
+    if mask is None:
+        top = top_k_indices(scores, top_k)
+    else:
+        candidate_docs = np.flatnonzero(mask)
+        top = candidate_docs[top_k_indices(scores[candidate_docs], top_k)]
+    return [(bm25.chunk_ids[idx], float(scores[idx])) for idx in top]
+
+def sharded_retrieve(query: str, top_k: int = 20, engine: RetrievalEngine = None,
+                     filters: dict = None) -> list:
+    """
+    Scatter-gather hybrid_retrieve over the engine's shards (src.shards).
+    The query is embedded once here; each routed shard returns its own
+    top_k vector and BM25 hits, and the global top_k of each is fused
+    exactly as in hybrid_retrieve. Shard BM25 scores use corpus-wide
+    IDF/avgdl, so the max used for normalization is the global one.
+    "doc" is None: integer ids are local to a shard.
+    """
+    engine = engine or get_engine()
+    with span("retrieval.embed"):
+        query_vector = engine.embed([query])
+    # Vector and BM25 search run together inside each shard worker
+    with span("retrieval.shards") as s:
+        results = engine.shard_pool().search(query_vector, tokenize(query), top_k, filters)
+        s.attrs["shards"] = len(results)
     
-    # --- Vector Search ---
-    vector_results = collection.query(
-        query_texts=[query],
-        n_results=top_k
-    )
-    vector_chunks = {}
-    for i, doc in enumerate(vector_results["documents"][0]):
-        source = vector_results["metadatas"][0][i]["source"]
-        score = 1 - vector_results["distances"][0][i]
-        key = doc[:100]  # use first 100 chars as unique key
-        vector_chunks[key] = {
-            "text": doc,
-            "source": source,
-            "vector_score": round(score, 4),
+    vector_hits = sorted((hit for r in results for hit in r[0]), key=lambda x: x[1])[:top_k]
+    bm25_hits = sorted((hit for r in results for hit in r[1]), key=lambda x: x[1], reverse=True)[:top_k]
+    texts = {cid: text for r in results for cid, text in r[2].items()}
+    
+    ranked = fuse_scores(vector_hits, bm25_hits, top_k)
+    return [
+        {"id": chunk_id, "doc": None, "text": texts[chunk_id][0], "source": texts[chunk_id][1], **scores}
+        for chunk_id, scores in ranked
+    ]
+
+def fuse_scores(vector_hits: list, bm25_hits: list, top_k: int) -> list:
+    """
+    Fuses (id, l2 distance) vector hits and (id, raw BM25 score) hits,
+    best BM25 first, into the top_k [(id, scores)] by hybrid score.
+    """
+    candidates = {}
+    for chunk_id, distance in vector_hits:
+        candidates[chunk_id] = {
+            "vector_score": round(1 - distance, 4),
             "bm25_score": 0.0
         }
     
-    # --- BM25 Search ---
-    bm25, all_chunks = _build_bm25_index()
-    tokenized_query = query.lower().split()
-    bm25_scores = bm25.get_scores(tokenized_query)
-    
-    # Get top BM25 results
-    top_bm25_idx = np.argsort(bm25_scores)[::-1][:top_k]
-    
     # Normalize BM25 scores to 0-1
-    max_bm25 = bm25_scores[top_bm25_idx[0]] if bm25_scores[top_bm25_idx[0]] > 0 else 1
+    max_bm25 = bm25_hits[0][1] if bm25_hits and bm25_hits[0][1] > 0 else 1
     
-    for idx in top_bm25_idx:
-        chunk = all_chunks[idx]
-        key = chunk["text"][:100]
-        norm_score = round(float(bm25_scores[idx]) / max_bm25, 4)
-        
-        if key in vector_chunks:
-            vector_chunks[key]["bm25_score"] = norm_score
-        else:
-            vector_chunks[key] = {
-                "text": chunk["text"],
-                "source": chunk["source"],
-                "vector_score": 0.0,
-                "bm25_score": norm_score
-            }
+    for chunk_id, score in bm25_hits:
+        scores = candidates.setdefault(chunk_id, {"vector_score": 0.0, "bm25_score": 0.0})
+        scores["bm25_score"] = round(score / max_bm25, 4)
     
     # --- Combine Scores (60% vector, 40% BM25) ---
-    for key in vector_chunks:
-        c = vector_chunks[key]
+    for c in candidates.values():
         c["hybrid_score"] = round(
             0.6 * c["vector_score"] + 0.4 * c["bm25_score"], 4
         )
     
     # Sort by hybrid score
-    final = sorted(
-        vector_chunks.values(),
-        key=lambda x: x["hybrid_score"],
+    return sorted(
+        candidates.items(),
+        key=lambda x: x[1]["hybrid_score"],
         reverse=True
-    )
-    
-    return final[:top_k]
\ No newline at end of file
+    )[:top_k]
+
+def merge_candidates(*pools: list) -> list:
+    """
+    Union of several hybrid_retrieve results, de-duplicated by chunk id.
+    A chunk found by more than one query keeps its best hybrid score.
+    """
+    merged = {}
+    for pool in pools:
+        for c in pool:
+            best = merged.get(c["id"])
+            if best is None or c["hybrid_score"] > best["hybrid_score"]:
+                merged[c["id"]] = c
+    return sorted(merged.values(), key=lambda x: x["hybrid_score"], reverse=True)
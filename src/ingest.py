@@ -1,13 +1,32 @@
+import hashlib
+import json
 import os
-import re
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import chromadb
-from chromadb.utils import embedding_functions
+from src.bm25_index import BM25_PATH, BM25Index, BM25IndexWriter
+from src.cache import invalidate_answer_cache
+from src.chunk_store import ChunkStore
+from src.engine import COLLECTION_NAME, EMBED_MODEL
+from src.filters import transcript_fields
+from src.shards import SHARDS_PATH, build_shards, shards_exist
+from src.shards import load_manifest as load_shard_manifest
+from src.vector_index import VECTOR_PATH, VectorIndex, export_vector_index
 
 DATA_PATH = Path("data/transcripts")
 CHROMA_PATH = "chroma_db"
+MANIFEST_PATH = os.path.join(CHROMA_PATH, "ingest_manifest.json")
 CHUNK_SIZE = 400      # words per chunk
 CHUNK_OVERLAP = 50    # word overlap between chunks
+INGEST_WORKERS = os.cpu_count() or 1   # processes for read + chunk
+EMBED_BATCH_SIZE = 256    # chunks per SentenceTransformer.encode batch
+EMBED_THREADS = None      # torch intra-op threads (None = torch default, all cores)
+STORE_BATCH_SIZE = 1000   # chunks per Chroma upsert/delete
+INGEST_BATCH_SIZE = 2048  # chunks in flight between chunking and storing (bounds memory)
+METADATA_VERSION = 2      # bump when chunk metadata fields change; stored per manifest entry
 
 def parse_filename(filename):
     # Handles format like: 2019-Dec-18-MU.txt → ("MU", "2019-Dec-18")
@@ -17,30 +36,39 @@ def parse_filename(filename):
     date = "-".join(parts[:-1])
     return ticker, date
 
-def load_transcripts(data_path):
-    documents = []
-    path = Path(data_path)
-    txt_files = list(path.glob("*.txt"))
-    
-    if not txt_files:
-        print(" No .txt files found! Check your data/transcripts folder.")
-        return []
-    
-    for txt_file in txt_files:
-        try:
-            with open(txt_file, "r", encoding="utf-8", errors="ignore") as f:
-                text = f.read()
-            ticker, date = parse_filename(txt_file.name)
-            documents.append({
-                "text": text,
-                "source": f"{ticker} | {date}",
-                "filename": txt_file.name
-            })
-            print(f"   Loaded: {txt_file.name}")
-        except Exception as e:
-            print(f"    Skipped {txt_file.name}: {e}")
-    
-    return documents
+def transcript_metadata(filename: str) -> dict:
+    """Chroma metadata shared by every chunk of a transcript."""
+    ticker, date = parse_filename(filename)
+    return {"source": f"{ticker} | {date}", **transcript_fields(filename)}
+
+def chunk_ids(filename: str, chunks: list) -> list:
+    """
+    Stable chunk ids: file stem + hash of the chunk text. Unchanged chunks
+    keep their id across re-ingests no matter what else was added; a
+    repeated text within one file gets a "-2", "-3"... suffix.
+    """
+    stem = Path(filename).stem
+    ids, seen = [], {}
+    for c in chunks:
+        digest = hashlib.sha1(c["text"].encode("utf-8")).hexdigest()[:16]
+        seen[digest] = seen.get(digest, 0) + 1
+        ids.append(f"{stem}:{digest}" + (f"-{seen[digest]}" if seen[digest] > 1 else ""))
+    return ids
+
+def load_manifest() -> dict:
+    """{filename: {"mtime", "sha1", "chunk_ids"}} of the last ingest."""
+    try:
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_manifest(manifest: dict):
+    os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp, MANIFEST_PATH)
 
 def chunk_text(text, source, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
     words = text.split()
@@ -57,56 +85,266 @@ def chunk_text(text, source, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP):
             })
     return chunks
 
-def build_vectorstore():
-    print("\n Loading transcripts...")
-    documents = load_transcripts(DATA_PATH)
-    
-    if not documents:
+def scan_transcripts(data_path, manifest: dict):
+    """
+    Compares the transcript folder with the manifest by mtime only, so
+    unchanged files are never opened.
+    Returns (paths to parse, manifest entries to keep, removed filenames).
+    """
+    to_parse, unchanged = [], {}
+    present = set()
+    for txt_file in sorted(Path(data_path).glob("*.txt")):
+        present.add(txt_file.name)
+        entry = manifest.get(txt_file.name)
+        if entry is not None and entry["mtime"] == txt_file.stat().st_mtime:
+            unchanged[txt_file.name] = entry
+        else:
+            to_parse.append(str(txt_file))
+    removed = [name for name in manifest if name not in present]
+    return to_parse, unchanged, removed
+
+def parse_transcript(path: str) -> dict:
+    """
+    Reads, hashes and chunks one transcript. Top-level so it can run in a
+    worker process; only the chunks travel back, not the raw text.
+    """
+    txt_file = Path(path)
+    try:
+        mtime = txt_file.stat().st_mtime
+        with open(txt_file, "rb") as f:
+            raw = f.read()
+    except Exception as e:
+        return {"filename": txt_file.name, "error": str(e)}
+    ticker, date = parse_filename(txt_file.name)
+    chunks = chunk_text(raw.decode("utf-8", errors="ignore"), f"{ticker} | {date}")
+    return {
+        "filename": txt_file.name,
+        "metadata": transcript_metadata(txt_file.name),
+        "mtime": mtime,
+        "sha1": hashlib.sha1(raw).hexdigest(),
+        "chunks": chunks,
+        "chunk_ids": chunk_ids(txt_file.name, chunks),
+    }
+
+def iter_transcripts(paths: list, workers: int = INGEST_WORKERS):
+    """
+    parse_transcript over `paths`, yielded in order. Only a couple of
+    files per worker are in flight, so parsed text never piles up.
+    """
+    if workers <= 1 or len(paths) < 2:
+        yield from map(parse_transcript, paths)
         return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path in paths:
+            pending.append(pool.submit(parse_transcript, path))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def load_embedder(model_name: str = EMBED_MODEL):
+    from sentence_transformers import SentenceTransformer
+    if EMBED_THREADS:
+        import torch
+        torch.set_num_threads(EMBED_THREADS)
+    return SentenceTransformer(model_name)
+
+def embed_texts(model, texts: list, batch_size: int = EMBED_BATCH_SIZE) -> list:
+    # Same vectors Chroma's SentenceTransformerEmbeddingFunction would
+    # produce (unnormalized), so queries embedded by the engine still match
+    return model.encode(texts, batch_size=batch_size, convert_to_numpy=True).tolist()
+
+def _rate(n: int, seconds: float) -> str:
+    return f"{n} chunks in {seconds:.1f}s ({n / seconds if seconds > 0 else 0:,.0f} chunks/sec)"
+
+def _peak_rss_mb() -> float:
+    try:
+        import resource
+    except ImportError:   # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def build_vectorstore(rebuild: bool = False, workers: int = INGEST_WORKERS,
+                      embed_batch_size: int = EMBED_BATCH_SIZE):
+    """
+    Brings chroma_db/ and bm25_index/ in line with data/transcripts.
+    Only new or edited transcripts are chunked and embedded, and only the
+    chunks whose text changed are added or deleted. rebuild=True (or a
+    store without a manifest, i.e. one with positional ids) starts over.
+
+    Everything streams: transcripts are read + chunked in a process pool,
+    and every INGEST_BATCH_SIZE new chunks are embedded, upserted into
+    Chroma and spilled to the BM25 writer before the next batch is
+    gathered, so peak memory does not grow with the corpus (only the
+    manifest's chunk ids do). Returns the per-stage throughput report.
+    """
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    report = {stage: [0, 0.0] for stage in ("chunk", "embed", "store", "bm25")}
     
-    print(f"\n  Chunking {len(documents)} transcripts...")
-    all_chunks = []
-    for doc in documents:
-        chunks = chunk_text(doc["text"], doc["source"])
-        all_chunks.extend(chunks)
-        print(f"  {doc['source']}: {len(chunks)} chunks")
+    manifest = {} if rebuild else load_manifest()
+    if not manifest:
+        # Delete old collection if rebuilding
+        try:
+            client.delete_collection(COLLECTION_NAME)
+            print("    Cleared old collection")
+        except Exception:
+            pass
+    # Every upsert passes its own embeddings (one load_embedder() model per
+    # ingest), so the collection needs no embedding function of its own
+    collection = client.get_or_create_collection(COLLECTION_NAME, embedding_function=None)
     
-    print(f"\n Total chunks: {len(all_chunks)}")
+    print("\n Scanning transcripts...")
+    to_parse, new_manifest, removed = scan_transcripts(DATA_PATH, manifest)
+    if not to_parse and not new_manifest and not removed:
+        print(" No .txt files found! Check your data/transcripts folder.")
+        return report
     
-    print("\n🔮 Setting up ChromaDB with sentence-transformers embeddings...")
-    ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
+    # A manifest without an index (deleted bm25_index/) is rebuilt from Chroma at the end
+    bm25_exists = BM25Index.exists(BM25_PATH) and ChunkStore.exists(BM25_PATH)
+    bm25 = BM25IndexWriter(BM25_PATH, base=bool(manifest)) if not manifest or bm25_exists else None
+    embedder = None
+    batch = []
+    added = deleted = migrated = 0
     
-    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    def delete(ids: list):
+        nonlocal deleted
+        for i in range(0, len(ids), STORE_BATCH_SIZE):
+            collection.delete(ids=ids[i:i + STORE_BATCH_SIZE])
+        if bm25 is not None:
+            bm25.remove(ids)
+        deleted += len(ids)
     
-    # Delete old collection if rebuilding
-    try:
-        client.delete_collection("transcripts")
-        print("    Cleared old collection")
-    except:
-        pass
+    def flush():
+        nonlocal embedder, added
+        if not batch:
+            return
+        ids = [cid for cid, _, _ in batch]
+        texts = [c["text"] for _, c, _ in batch]
+        metadatas = [metadata for _, _, metadata in batch]
+        
+        t = time.perf_counter()
+        embedder = embedder or load_embedder()
+        embeddings = embed_texts(embedder, texts, embed_batch_size)
+        _add(report, "embed", len(ids), t)
+        
+        t = time.perf_counter()
+        for i in range(0, len(ids), STORE_BATCH_SIZE):
+            collection.upsert(
+                ids=ids[i:i + STORE_BATCH_SIZE],
+                embeddings=embeddings[i:i + STORE_BATCH_SIZE],
+                documents=texts[i:i + STORE_BATCH_SIZE],
+                metadatas=metadatas[i:i + STORE_BATCH_SIZE]
+            )
+        _add(report, "store", len(ids), t)
+        
+        if bm25 is not None:
+            t = time.perf_counter()
+            bm25.add(ids, texts, metadatas)
+            _add(report, "bm25", len(ids), t)
+        added += len(ids)
+        batch.clear()
+        print(f"  Embedded + stored {added} new chunks...", end="\r")
+    
+    def migrate(ids: list, metadata: dict):
+        # Metadata-only update: no re-embedding; BM25 re-derives its fields
+        nonlocal migrated
+        for i in range(0, len(ids), STORE_BATCH_SIZE):
+            collection.update(ids=ids[i:i + STORE_BATCH_SIZE], metadatas=[metadata] * len(ids[i:i + STORE_BATCH_SIZE]))
+        migrated += len(ids)
     
-    collection = client.create_collection("transcripts", embedding_function=ef)
+    print(f"\n  Processing {len(to_parse)} new/changed transcripts on {workers} processes "
+          f"({len(new_manifest)} unchanged, {len(removed)} removed)...")
+    for name in removed:
+        delete(manifest[name]["chunk_ids"])
+    for name, entry in new_manifest.items():
+        if entry.get("metadata_version") != METADATA_VERSION:
+            migrate(entry["chunk_ids"], transcript_metadata(name))
+            entry["metadata_version"] = METADATA_VERSION
+    if migrated:
+        print(f"  Updated metadata of {migrated} unchanged chunks")
     
-    print("\n Embedding and storing chunks (this takes 5-10 mins)...")
+    t = time.perf_counter()
+    for doc in iter_transcripts(to_parse, workers):
+        name = doc["filename"]
+        if "error" in doc:
+            print(f"    Skipped {name}: {doc['error']}")
+            if name in manifest:
+                # Keep its old chunks (and entry) until it can be read again
+                new_manifest[name] = manifest[name]
+            t = time.perf_counter()
+            continue
+        _add(report, "chunk", len(doc["chunks"]), t)
+        entry = manifest.get(name)
+        if entry is not None and entry["sha1"] == doc["sha1"]:
+            new_manifest[name] = {**entry, "mtime": doc["mtime"]}   # touched, not edited
+            if entry.get("metadata_version") != METADATA_VERSION:
+                migrate(entry["chunk_ids"], doc["metadata"])
+                new_manifest[name]["metadata_version"] = METADATA_VERSION
+        else:
+            # Chunks whose text survived an edit keep their id and embedding
+            old_ids = set(entry["chunk_ids"]) if entry is not None else set()
+            new_ids = set(doc["chunk_ids"])
+            delete(sorted(old_ids - new_ids))
+            batch.extend(
+                (cid, chunk, doc["metadata"]) for cid, chunk in zip(doc["chunk_ids"], doc["chunks"])
+                if cid not in old_ids
+            )
+            # Kept chunks of an edited file get their metadata refreshed
+            kept = [cid for cid in doc["chunk_ids"] if cid in old_ids]
+            if kept and entry.get("metadata_version") != METADATA_VERSION:
+                migrate(kept, doc["metadata"])
+            new_manifest[name] = {"mtime": doc["mtime"], "sha1": doc["sha1"], "chunk_ids": doc["chunk_ids"],
+                                  "metadata_version": METADATA_VERSION}
+            print(f"   {'Changed' if entry else 'New'}: {name} ({len(doc['chunks'])} chunks)")
+            if len(batch) >= INGEST_BATCH_SIZE:
+                flush()
+        t = time.perf_counter()
+    flush()
     
-    texts = [c["text"] for c in all_chunks]
-    metadatas = [{"source": c["source"]} for c in all_chunks]
-    ids = [f"chunk_{i}" for i in range(len(all_chunks))]
+    if not added and not deleted and not migrated and bm25_exists:
+        save_manifest(new_manifest)
+        print("\n Already up to date.")
+        return report
     
-    # Insert in batches of 100
-    batch_size = 100
-    for i in range(0, len(all_chunks), batch_size):
-        collection.add(
-            documents=texts[i:i+batch_size],
-            metadatas=metadatas[i:i+batch_size],
-            ids=ids[i:i+batch_size]
-        )
-        print(f"  Stored {min(i+batch_size, len(all_chunks))}/{len(all_chunks)} chunks...", end="\r")
+    print("\n\n Writing BM25 inverted index...")
+    t = time.perf_counter()
+    if bm25 is None:
+        bm25 = BM25IndexWriter(BM25_PATH)
+        for offset in range(0, collection.count(), STORE_BATCH_SIZE):
+            page = collection.get(include=["documents", "metadatas"], limit=STORE_BATCH_SIZE, offset=offset)
+            bm25.add(page["ids"], page["documents"], page["metadatas"])
+    bm25.finish()
+    report["bm25"][1] += time.perf_counter() - t
     
-    print(f"\n\n Done! Vector store built with {len(all_chunks)} chunks.")
-    print(f" Saved to: {CHROMA_PATH}/")
+    # Keep an exported numpy-backend matrix in step with the new doc ids
+    if VectorIndex.exists(VECTOR_PATH):
+        print(" Re-exporting embeddings for the numpy vector backend...")
+        export_vector_index(collection, BM25Index(BM25_PATH).chunk_ids, VECTOR_PATH,
+                            VectorIndex(VECTOR_PATH).precision)
+    if shards_exist(SHARDS_PATH):
+        manifest = load_shard_manifest(SHARDS_PATH)
+        print(" Rebuilding retrieval shards...")
+        build_shards(collection, BM25_PATH, SHARDS_PATH, by=manifest["by"],
+                     num_shards=len(manifest["shards"]), precision=manifest["precision"])
+    save_manifest(new_manifest)
+    
+    # Answers cached against the old corpus must not be served again
+    invalidate_answer_cache()
+    
+    for stage, (n, seconds) in report.items():
+        print(f"  {stage:<6} {_rate(n, seconds)}")
+    peak = _peak_rss_mb()
+    if peak is not None:
+        print(f"  Peak RSS: {peak:,.0f} MB")
+    print(f"\n Done! +{added} / -{deleted} chunks, {collection.count()} in the vector store.")
+    print(f" Saved to: {CHROMA_PATH}/ and {BM25_PATH}/")
+    return report
+
+def _add(report: dict, stage: str, n: int, start: float):
+    report[stage][0] += n
+    report[stage][1] += time.perf_counter() - start
 
 if __name__ == "__main__":
-    build_vectorstore()
\ No newline at end of file
+    build_vectorstore(rebuild="--rebuild" in sys.argv)
@@ -0,0 +1,318 @@
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dotenv import load_dotenv
+from src import tracing
+
+load_dotenv()
+
+LLM_MODEL = "llama-3.3-70b-versatile"
+
+# Account limits the scheduler paces against (Groq free tier, llama-3.3-70b)
+RATE_LIMIT_RPM = 30
+RATE_LIMIT_TPM = 12_000
+
+LLM_TIMEOUT = 60.0        # seconds per call, queueing and retries included
+MAX_RETRIES = 4           # on 429 / 5xx / connection errors
+BACKOFF_BASE = 0.5        # seconds; doubles per retry, full jitter
+BACKOFF_MAX = 8.0
+POOL_CONNECTIONS = 16     # keep-alive connections shared by every stage
+
+CHARS_PER_TOKEN = 4       # prompt size estimate until the response reports usage
+
+# "record" saves every completion to LLM_FIXTURE_PATH; "replay" answers
+# from it without touching the network (e.g. offline benchmarks)
+LLM_FIXTURE_MODE = os.getenv("LLM_FIXTURE_MODE") or None
+LLM_FIXTURE_PATH = os.getenv("LLM_FIXTURE_PATH", os.path.join("fixtures", "llm_calls.jsonl"))
+FIXTURE_MODES = ("record", "replay")
+
+class LLMDeadlineExceeded(TimeoutError):
+    """The call's deadline passed while it was queued, backing off or waiting on the response."""
+
+class LLMFixtureMissing(LookupError):
+    """Replay mode met a request that was never recorded."""
+
+# What callers treat as "this call timed out" (the client's own timeouts are re-raised as this)
+TIMEOUT_ERRORS = (LLMDeadlineExceeded,)
+
+class FixtureStore:
+    """
+    Recorded completions as JSON lines, keyed by a hash of the request
+    (model, messages, temperature, max_tokens). Appends are thread-safe;
+    a later recording of the same request wins on load.
+    """
+
+    def __init__(self, path: str = LLM_FIXTURE_PATH):
+        self.path = path
+        self._entries = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(model: str, messages: list, temperature: float, max_tokens: int) -> str:
+        request = json.dumps([model, messages, temperature, max_tokens], sort_keys=True)
+        return hashlib.sha1(request.encode()).hexdigest()
+
+    def get(self, key: str) -> dict:
+        return self._entries.get(key)
+
+    def put(self, key: str, stage: str, content: str, prompt_tokens: int, completion_tokens: int):
+        entry = {"key": key, "stage": stage, "content": content,
+                 "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+        with self._lock:
+            self._entries[key] = entry
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class TokenBucket:
+    """
+    Requests-per-minute and tokens-per-minute buckets, refilled
+    continuously. acquire() blocks until both have room for a call and
+    its estimated tokens; settle() corrects the estimate once the
+    response reports real usage. pause() holds every caller back, e.g.
+    for a 429's Retry-After.
+    """
+
+    def __init__(self, rpm: float = RATE_LIMIT_RPM, tpm: float = RATE_LIMIT_TPM):
+        self.rpm, self.tpm = rpm, tpm
+        self._requests, self._tokens = float(rpm), float(tpm)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+        self._updated = now
+
+    def acquire(self, tokens: int, deadline: float = None) -> float:
+        """Waits for capacity; returns the seconds spent waiting."""
+        tokens = min(tokens, self.tpm)   # a call larger than a minute's budget still goes
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = max(
+                    self._paused_until - now,
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                )
+                if wait <= 0:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return now - start
+            if deadline is not None and time.monotonic() + wait > deadline:
+                raise LLMDeadlineExceeded(f"rate limit wait of {wait:.1f}s passes the deadline")
+            time.sleep(wait)
+
+    def settle(self, estimated: int, actual: int):
+        with self._lock:
+            self._tokens += estimated - actual
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+class LLMGateway:
+    """
+    The one chat-completions client for every LLM stage: a pooled HTTP
+    connection, a TokenBucket in front of each call, jittered backoff
+    on 429/5xx/connection errors, and a deadline per call covering
+    queueing, retries and the request itself. Usage is tracked per stage
+    name (tokens, calls, retries, queueing delay). With a fixture_mode
+    (FIXTURE_MODES) completions are recorded to, or replayed from, a
+    FixtureStore; replayed calls skip the rate limiter.
+    """
+
+    def __init__(self, rpm: float = RATE_LIMIT_RPM, tpm: float = RATE_LIMIT_TPM,
+                 max_retries: int = MAX_RETRIES, timeout: float = LLM_TIMEOUT,
+                 base_url: str = None, api_key: str = None,
+                 fixture_mode: str = LLM_FIXTURE_MODE, fixture_path: str = LLM_FIXTURE_PATH):
+        if fixture_mode is not None and fixture_mode not in FIXTURE_MODES:
+            raise ValueError(f"Unknown LLM fixture mode: {fixture_mode!r}")
+        self.fixture_mode = fixture_mode
+        self.fixtures = FixtureStore(fixture_path) if fixture_mode else None
+        api_key = api_key or os.getenv("GROQ_API_KEY")
+        if api_key is None and fixture_mode == "replay":
+            api_key = "replay"   # never sent
+        # Imported here, not at module import: the client library alone takes ~0.2s to load
+        import httpx
+        from groq import Groq
+        self.client = Groq(
+            api_key=api_key,
+            base_url=base_url,   # None: GROQ_BASE_URL or the public endpoint
+            max_retries=0,       # retries are scheduled here, against the bucket
+            http_client=httpx.Client(limits=httpx.Limits(
+                max_connections=POOL_CONNECTIONS, max_keepalive_connections=POOL_CONNECTIONS
+            )),
+        )
+        self.bucket = TokenBucket(rpm, tpm)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self._usage = {}
+        self._lock = threading.Lock()
+
+    def chat(self, stage: str, messages: list, model: str = LLM_MODEL, temperature: float = 0.0,
+             max_tokens: int = 256, timeout: float = None) -> str:
+        """Completion text for `messages`, accounted to `stage`."""
+        key = self._fixture_key(model, messages, temperature, max_tokens)
+        if self.fixture_mode == "replay":
+            return self._replay(stage, key)
+        response, estimate = self._create(stage, messages, model, temperature, max_tokens, timeout,
+                                           stream=False)
+        usage = response.usage
+        if usage is not None:
+            self.bucket.settle(estimate, usage.total_tokens)
+            self._record(stage, prompt_tokens=usage.prompt_tokens,
+                         completion_tokens=usage.completion_tokens)
+        tracing.record_llm(usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+        content = response.choices[0].message.content
+        if self.fixture_mode == "record":
+            self.fixtures.put(key, stage, content, usage.prompt_tokens if usage else 0,
+                              usage.completion_tokens if usage else 0)
+        return content
+
+    def chat_stream(self, stage: str, messages: list, model: str = LLM_MODEL,
+                    temperature: float = 0.0, max_tokens: int = 256, timeout: float = None):
+        """
+        Yields text fragments as they arrive. Retries only cover opening
+        the stream; completion tokens are estimated from the text.
+        Replayed completions are yielded word by word.
+        """
+        key = self._fixture_key(model, messages, temperature, max_tokens)
+        if self.fixture_mode == "replay":
+            words = self._replay(stage, key).split(" ")
+            for i, word in enumerate(words):
+                yield word + (" " if i < len(words) - 1 else "")
+            return
+        stream, estimate = self._create(stage, messages, model, temperature, max_tokens, timeout,
+                                        stream=True)
+        parts = []
+        for event in stream:
+            if event.choices and event.choices[0].delta.content:
+                parts.append(event.choices[0].delta.content)
+                yield event.choices[0].delta.content
+        prompt = _estimate_prompt(messages)
+        completion = sum(len(p) for p in parts) // CHARS_PER_TOKEN
+        self.bucket.settle(estimate, prompt + completion)
+        self._record(stage, prompt_tokens=prompt, completion_tokens=completion)
+        tracing.record_llm(prompt, completion)
+        if self.fixture_mode == "record":
+            self.fixtures.put(key, stage, "".join(parts), prompt, completion)
+
+    def _fixture_key(self, model: str, messages: list, temperature: float, max_tokens: int) -> str:
+        if self.fixtures is None:
+            return None
+        return FixtureStore.key(model, messages, temperature, max_tokens)
+
+    def _replay(self, stage: str, key: str) -> str:
+        entry = self.fixtures.get(key)
+        if entry is None:
+            raise LLMFixtureMissing(
+                f"{stage}: no recorded completion for request {key[:12]} in {self.fixtures.path} "
+                f"(record it with LLM_FIXTURE_MODE=record)"
+            )
+        self._record(stage, calls=1, prompt_tokens=entry["prompt_tokens"],
+                     completion_tokens=entry["completion_tokens"])
+        tracing.record_llm(entry["prompt_tokens"], entry["completion_tokens"])
+        return entry["content"]
+
+    def _create(self, stage: str, messages: list, model: str, temperature: float,
+                max_tokens: int, timeout: float, stream: bool) -> tuple:
+        from groq import APIConnectionError, APIStatusError, APITimeoutError
+        deadline = time.monotonic() + (timeout if timeout is not None else self.timeout)
+        estimate = _estimate_prompt(messages) + max_tokens
+        for attempt in range(self.max_retries + 1):
+            queued = self.bucket.acquire(estimate, deadline)
+            self._record(stage, calls=1, queue_s=queued, retries=int(attempt > 0))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded(f"{stage}: deadline passed while queued")
+            try:
+                response = self.client.chat.completions.create(
+                    model=model, messages=messages, temperature=temperature,
+                    max_tokens=max_tokens, stream=stream, timeout=remaining,
+                )
+                return response, estimate
+            except APITimeoutError as e:
+                self.bucket.settle(estimate, 0)
+                raise LLMDeadlineExceeded(f"{stage}: request timed out") from e
+            except (APIStatusError, APIConnectionError) as e:
+                self.bucket.settle(estimate, 0)
+                self._record(stage, errors=1)
+                status = getattr(e, "status_code", None)
+                if status is not None and status != 429 and status < 500:
+                    raise   # 4xx other than rate limiting won't improve
+                if attempt == self.max_retries:
+                    raise
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+                retry_after = _retry_after(e)
+                if retry_after is not None:
+                    delay = max(delay, retry_after)
+                    self.bucket.pause(retry_after)
+                if time.monotonic() + delay > deadline:
+                    raise
+                time.sleep(delay)
+
+    def _record(self, stage: str, **counts):
+        with self._lock:
+            usage = self._usage.setdefault(stage, {
+                "calls": 0, "retries": 0, "errors": 0, "prompt_tokens": 0,
+                "completion_tokens": 0, "queue_s": 0.0, "max_queue_s": 0.0,
+            })
+            for key, value in counts.items():
+                usage[key] += value
+            if "queue_s" in counts:
+                usage["max_queue_s"] = max(usage["max_queue_s"], counts["queue_s"])
+
+    def usage(self) -> dict:
+        """{stage: {calls, retries, errors, prompt_tokens, completion_tokens, queue_s, max_queue_s}}"""
+        with self._lock:
+            return {stage: dict(u) for stage, u in self._usage.items()}
+
+    def reset_usage(self):
+        with self._lock:
+            self._usage.clear()
+
+def _estimate_prompt(messages: list) -> int:
+    return sum(len(m["content"]) for m in messages) // CHARS_PER_TOKEN
+
+def _retry_after(error) -> float:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway() -> LLMGateway:
+    """Returns the process-wide gateway, creating it on first call."""
+    global _gateway
+    if _gateway is None:
+        with _gateway_lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+def chat(stage: str, messages: list, **kwargs) -> str:
+    return get_gateway().chat(stage, messages, **kwargs)
+
+def chat_stream(stage: str, messages: list, **kwargs):
+    return get_gateway().chat_stream(stage, messages, **kwargs)
@@ -1,35 +1,373 @@
-from src.rewriter import rewrite_query
-from src.hybrid_retriever import hybrid_retrieve
-from src.reranker import rerank
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from src.cache import ANSWER_CACHE_PATH, TieredCache
+from src.engine import RetrievalEngine, get_engine
+from src.filters import describe_filters, extract_filters
+from src.rewriter import rewrite_query, normalize_question
+from src.hybrid_retriever import hybrid_retrieve, hybrid_retrieve_batch, merge_candidates
+from src import crag, reranker
+from src.reranker import rerank, rerank_batch
 from src.crag import apply_crag
-from src.generator import generate_answer
+from src.generator import ANSWER_PROMPT, generate_answer, generate_answer_stream
+from src.tracing import Trace, log_trace
 
-def run_pipeline(query: str) -> dict:
-    # Stage 1: Query Rewriting
-    print("   Stage 1: Rewriting query...")
-    rewritten = rewrite_query(query)
+ANSWER_CACHE_SIZE = 512
+ANSWER_CACHE_TTL = 7 * 24 * 3600   # seconds
+
+# Speculative mode retrieves for the original question while the rewrite
+# is in flight. SPECULATIVE_MERGE=False drops that pool whenever the
+# rewrite differs from the question instead of reranking the union.
+# It only saves time when rewrites come back unchanged; otherwise it adds
+# a retrieval (and, merged, up to twice the rerank pool), see _retrieve.
+SPECULATIVE_RETRIEVAL = False
+SPECULATIVE_MERGE = True
+
+# Questions in flight at once in the LLM stages of run_pipeline_batch
+BATCH_LLM_WORKERS = 4
+
+# Question -> full result for the current corpus version: repeats skip every stage
+result_cache = TieredCache(
+    maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, path=ANSWER_CACHE_PATH, table="answers"
+)
+# (question, final chunk ids + texts) -> answer: skips generation when
+# retrieval lands on exactly the chunks a previous run answered from
+chunk_set_cache = TieredCache(
+    maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL, path=ANSWER_CACHE_PATH, table="answer_chunks"
+)
+
+_PROMPT_HASH = hashlib.sha1(ANSWER_PROMPT.encode()).hexdigest()[:12]
+
+def _config_key(engine: RetrievalEngine, version: str, grading_mode: str, speculative: bool) -> str:
+    """
+    The corpus version the engine is serving (see RetrievalEngine.refresh)
+    plus a fingerprint of every setting that shapes a result besides the
+    question: retrieval backend, reranker mode, CRAG grading and
+    thresholds, and the call's own mode arguments. Read at call time,
+    so changing any of them misses the question-level cache.
+    """
+    config = [
+        engine.model_name, engine.vector_backend, engine.use_shards,
+        reranker.RERANK_MODES[reranker.RERANK_MODE],
+        grading_mode or crag.CRAG_GRADING_MODE,
+        crag.CRAG_ACCEPT_SCORE, crag.CRAG_REJECT_SCORE,
+        crag.CRAG_TARGET_RELEVANT, crag.CRAG_CORRECTION_DEPTH,
+        speculative, speculative and SPECULATIVE_MERGE,
+    ]
+    return f"{version}:{hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()[:12]}"
+
+def _result_key(query: str, config: str) -> str:
+    return f"{config}:{_PROMPT_HASH}:{normalize_question(query)}"
+
+def _chunk_set_key(query: str, chunks: list) -> str:
+    # Text hashes guard against an id being reused for different text
+    chunk_set = ",".join(
+        f"{c['id']}@{hashlib.sha1(c['text'].encode()).hexdigest()[:12]}" for c in chunks
+    )
+    return f"{_PROMPT_HASH}:{normalize_question(query)}:{chunk_set}"
+
+def run_pipeline(query: str, engine: RetrievalEngine = None, grading_mode: str = None,
+                 use_cache: bool = True, stream: bool = False, speculative: bool = None) -> dict:
+    """
+    Runs all five stages. With speculative=True, Stage 2 starts on the
+    original question while Stage 1 waits on the LLM (see _retrieve);
+    that is latency-neutral or worse unless rewrites are frequently
+    no-ops. With stream=True the result comes back as soon as
+    CRAG finishes, with "answer" set to None and "answer_stream" yielding
+    the answer text as it is generated; "answer", "ttft_s", "latency_s"
+    and "trace" are filled in once the stream is exhausted.
+    "trace" holds one span per stage (src.tracing) with wall time, LLM
+    calls, tokens and candidate counts.
+    """
+    start = time.perf_counter()
+    engine = engine or get_engine()
+    if speculative is None:
+        speculative = SPECULATIVE_RETRIEVAL
+    # Reopens indexes a re-ingest has replaced; results are keyed on the version served
+    config = _config_key(engine, engine.refresh(), grading_mode, speculative)
+    
+    if use_cache:
+        result = _cached_result(query, start, config)
+        if result is not None:
+            print("   Answer cache hit — skipping all stages")
+            if stream:
+                result["answer_stream"] = iter([result["answer"]])
+            return result
+    
+    # Companies/years named in the question narrow every retrieval,
+    # CRAG's re-retrieval included
+    filters = extract_filters(query)
+    if filters:
+        print(f"   Filters: {describe_filters(filters)}")
+    retrieve_fn = partial(hybrid_retrieve, engine=engine, filters=filters)
+    
+    stats = {"llm_calls": 0, "gated": 0, "graded": 0, "timeouts": 0}
+    trace = Trace(query)
     
-    # Stage 2: Hybrid Retrieval (Vector + BM25)
-    print("   Stage 2: Hybrid retrieval (Vector + BM25)...")
-    raw_chunks = hybrid_retrieve(rewritten, top_k=20)
+    # Stages 1 + 2: Query Rewriting, Hybrid Retrieval (Vector + BM25)
+    rewritten, raw_chunks, timings = _retrieve(query, retrieve_fn, stats, speculative, trace)
     
     # Stage 3: Re-ranking
     print("   Stage 3: Re-ranking top chunks...")
-    reranked = rerank(rewritten, raw_chunks, top_k=3)
+    t = time.perf_counter()
+    with trace.span("rerank", len(raw_chunks)) as s:
+        reranked = rerank(rewritten, raw_chunks, top_k=3)
+        s.candidates_out = len(reranked)
+    timings["rerank_s"] = round(time.perf_counter() - t, 4)
     
     # Stage 4: CRAG - Grade relevance, correct if needed
     print("   Stage 4: Corrective RAG grading...")
-    final_chunks, crag_status = apply_crag(query, reranked, hybrid_retrieve)
+    t = time.perf_counter()
+    with trace.span("crag", len(reranked)) as s:
+        final_chunks, crag_status = apply_crag(
+            query, reranked, retrieve_fn, mode=grading_mode, stats=stats, candidates=raw_chunks
+        )
+        s.candidates_out = len(final_chunks)
+        s.attrs["status"] = crag_status
+    timings["crag_s"] = round(time.perf_counter() - t, 4)
+    
+    result = _new_result(query, rewritten, filters, reranked, final_chunks, crag_status,
+                         stats, timings)
+    
+    def finish(answer: str):
+        _finish(result, answer, start, chunk_key if use_cache else None, trace, config)
     
     # Stage 5: Generate Answer
+    chunk_key = _chunk_set_key(query, final_chunks)
+    answer = chunk_set_cache.get(chunk_key) if use_cache else None
+    if answer is not None:
+        print("   Stage 5: Same chunks as a previous run — reusing its answer")
+        finish(answer)
+        if stream:
+            result["answer_stream"] = iter([answer])
+        return result
+    
     print("   Stage 5: Generating answer...")
-    answer = generate_answer(query, final_chunks)
+    result["llm_calls"] += 1
+    if not stream:
+        with trace.span("generate", len(final_chunks)):
+            answer = generate_answer(query, final_chunks)
+        finish(answer)
+        return result
     
+    def answer_stream():
+        parts = []
+        with trace.span("generate", len(final_chunks)) as s:
+            for token in generate_answer_stream(query, final_chunks):
+                if not parts:
+                    result["ttft_s"] = round(time.perf_counter() - start, 4)
+                    s.attrs["ttft_s"] = result["ttft_s"]
+                parts.append(token)
+                yield token
+        finish("".join(parts).strip())
+    
+    result["answer_stream"] = answer_stream()
+    return result
+
+
+def run_pipeline_batch(questions: list, engine: RetrievalEngine = None, grading_mode: str = None,
+                       use_cache: bool = True, llm_workers: int = BATCH_LLM_WORKERS) -> list:
+    """
+    run_pipeline for many questions, e.g. an evaluation set. Returns one
+    result per question, in order, with the same structure (no
+    streaming). Local models run once per stage for the whole batch:
+    all rewrites are retrieved with hybrid_retrieve_batch (one
+    embedding call, one BM25 pass) and all pools are reranked with
+    rerank_batch. The LLM stages (rewrite, CRAG, generation) run for up
+    to `llm_workers` questions at a time.
+    "stage_timings" for rewrite/retrieval/rerank are the batch-wide
+    times; "latency_s" counts from the start of the batch. The retrieval
+    and rerank spans of each "trace" are likewise batch-wide, marked
+    with "batch_size".
+    """
+    start = time.perf_counter()
+    engine = engine or get_engine()
+    config = _config_key(engine, engine.refresh(), grading_mode, False)
+    results = [_cached_result(q, start, config) if use_cache else None for q in questions]
+    todo = [i for i, r in enumerate(results) if r is None]
+    if len(todo) < len(questions):
+        print(f"   Answer cache hits: {len(questions) - len(todo)}/{len(questions)}")
+    if not todo:
+        return results
+    
+    filters = {i: extract_filters(questions[i]) for i in todo}
+    stats = {i: {"llm_calls": 0, "gated": 0, "graded": 0, "timeouts": 0} for i in todo}
+    traces = {i: Trace(questions[i]) for i in todo}
+    batch_trace = Trace(None)   # batch-wide stages, copied into every trace
+    timings = {}
+    
+    def rewrite(i):
+        with traces[i].span("rewrite"):
+            return rewrite_query(questions[i], stats=stats[i])
+    
+    with ThreadPoolExecutor(max_workers=max(1, llm_workers)) as pool:
+        print(f"   Stage 1: Rewriting {len(todo)} queries...")
+        t = time.perf_counter()
+        rewritten = list(pool.map(rewrite, todo))
+        timings["rewrite_s"] = round(time.perf_counter() - t, 4)
+        
+        print("   Stage 2: Hybrid retrieval (Vector + BM25), batched...")
+        t = time.perf_counter()
+        with batch_trace.span("retrieval", len(todo)) as s:
+            raw_pools = hybrid_retrieve_batch(rewritten, top_k=20, engine=engine,
+                                              filters=[filters[i] for i in todo])
+            s.candidates_out = sum(len(p) for p in raw_pools)
+        timings["retrieval_s"] = round(time.perf_counter() - t, 4)
+        
+        print("   Stage 3: Re-ranking top chunks, batched...")
+        t = time.perf_counter()
+        with batch_trace.span("rerank", sum(len(p) for p in raw_pools)) as s:
+            reranked = rerank_batch(rewritten, raw_pools, top_k=3)
+            s.candidates_out = sum(len(r) for r in reranked)
+        timings["rerank_s"] = round(time.perf_counter() - t, 4)
+        
+        for i in todo:
+            traces[i].add_spans(batch_trace.spans, batch_size=len(todo))
+        
+        print("   Stages 4-5: Corrective RAG grading + answers...")
+        def finish(i, rewritten_query, raw_chunks, reranked_chunks):
+            retrieve_fn = partial(hybrid_retrieve, engine=engine, filters=filters[i])
+            trace = traces[i]
+            t = time.perf_counter()
+            with trace.span("crag", len(reranked_chunks)) as s:
+                final_chunks, crag_status = apply_crag(
+                    questions[i], reranked_chunks, retrieve_fn, mode=grading_mode, stats=stats[i],
+                    candidates=raw_chunks
+                )
+                s.candidates_out = len(final_chunks)
+                s.attrs["status"] = crag_status
+            result = _new_result(questions[i], rewritten_query, filters[i], reranked_chunks,
+                                 final_chunks, crag_status, stats[i],
+                                 {**timings, "crag_s": round(time.perf_counter() - t, 4)})
+            chunk_key = _chunk_set_key(questions[i], final_chunks)
+            answer = chunk_set_cache.get(chunk_key) if use_cache else None
+            if answer is None:
+                result["llm_calls"] += 1
+                with trace.span("generate", len(final_chunks)):
+                    answer = generate_answer(questions[i], final_chunks)
+            _finish(result, answer, start, chunk_key if use_cache else None, trace, config)
+            results[i] = result
+        
+        list(pool.map(finish, todo, rewritten, raw_pools, reranked))
+    return results
+
+def _cached_result(query: str, start: float, config: str) -> dict:
+    # Answer-cache hit as a result dict, or None
+    trace = Trace(query)
+    with trace.span("cache") as s:
+        cached = result_cache.get(_result_key(query, config))
+        s.attrs["hit"] = cached is not None
+    if cached is None:
+        return None
+    elapsed = round(time.perf_counter() - start, 4)
+    result = {**cached, "cached": True, "llm_calls": 0, "ttft_s": elapsed, "latency_s": elapsed,
+              "trace": trace.to_dict()}
+    log_trace(result["trace"])
+    return result
+
+def _new_result(query: str, rewritten: str, filters: dict, reranked: list, final_chunks: list,
+                crag_status: str, stats: dict, timings: dict) -> dict:
     return {
         "original_query": query,
         "rewritten_query": rewritten,
+        "filters": filters,
         "reranked_chunks": reranked,
         "final_chunks": final_chunks,
         "crag_status": crag_status,
-        "answer": answer
-    }
\ No newline at end of file
+        "crag_gated": stats["gated"],    # decided by rerank score alone
+        "crag_graded": stats["graded"],  # sent to the LLM grader
+        "crag_timeouts": stats["timeouts"],  # grading calls that timed out
+        "answer": None,
+        # rewrite + CRAG grading/refinement + generation, minus cache hits
+        "llm_calls": stats["llm_calls"],
+        "cached": False,
+        "stage_timings": timings,
+        "ttft_s": None,      # time to first answer token
+        "latency_s": None,   # time to complete answer
+        "trace": None        # per-stage spans, see src.tracing
+    }
+
+def _finish(result: dict, answer: str, start: float, chunk_key: str = None, trace: Trace = None,
+            config: str = None):
+    # Completes the result; with a chunk_key, caches the answer both ways
+    # (the question-level entry under `config`, see _config_key)
+    result["answer"] = answer
+    result["latency_s"] = round(time.perf_counter() - start, 4)
+    if result["ttft_s"] is None:
+        result["ttft_s"] = result["latency_s"]
+    if trace is not None:
+        result["trace"] = {**trace.to_dict(), "latency_s": result["latency_s"]}
+        log_trace(result["trace"])
+    if chunk_key is not None:
+        chunk_set_cache.set(chunk_key, answer)
+        result_cache.set(_result_key(result["original_query"], config), {
+            k: v for k, v in result.items() if k not in ("answer_stream", "trace")
+        })
+
+def _retrieve(query: str, retrieve_fn, stats: dict, speculative: bool, trace: Trace):
+    """
+    Stages 1 and 2. Returns (rewritten query, candidate chunks, timings).
+
+    Speculatively, hybrid_retrieve runs on the original question in a
+    worker thread while rewrite_query waits on the network. If the rewrite
+    normalizes to the question itself, that pool is the answer; otherwise
+    the rewritten query is retrieved too and the two pools are merged
+    (or the speculative one dropped, per SPECULATIVE_MERGE).
+    "overlap_s" is how long the speculative retrieval ran alongside the
+    rewrite call. It is not time saved: only when the pool is used as is
+    ("speculative_used" on the retrieval span) does it replace a
+    retrieval. Otherwise the rewritten query is retrieved anyway and a
+    merged pool makes reranking up to twice as long, so the mode is
+    latency-neutral or worse unless rewrites are frequently no-ops.
+    """
+    timings = {}
+    if not speculative:
+        print("   Stage 1: Rewriting query...")
+        t = time.perf_counter()
+        with trace.span("rewrite"):
+            rewritten = rewrite_query(query, stats=stats)
+        timings["rewrite_s"] = round(time.perf_counter() - t, 4)
+        
+        print("   Stage 2: Hybrid retrieval (Vector + BM25)...")
+        t = time.perf_counter()
+        with trace.span("retrieval") as s:
+            raw_chunks = retrieve_fn(rewritten, top_k=20)
+            s.candidates_out = len(raw_chunks)
+        timings["retrieval_s"] = round(time.perf_counter() - t, 4)
+        return rewritten, raw_chunks, timings
+    
+    def timed_retrieve():
+        t = time.perf_counter()
+        with trace.span("retrieval.speculative") as s:
+            chunks = retrieve_fn(query, top_k=20)
+            s.candidates_out = len(chunks)
+        return chunks, time.perf_counter() - t
+    
+    print("   Stage 1: Rewriting query (retrieving for the original question meanwhile)...")
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        t = time.perf_counter()
+        future = pool.submit(timed_retrieve)
+        with trace.span("rewrite"):
+            rewritten = rewrite_query(query, stats=stats)
+        timings["rewrite_s"] = round(time.perf_counter() - t, 4)
+        speculative_chunks, speculative_s = future.result()
+    timings["speculative_retrieval_s"] = round(speculative_s, 4)
+    timings["overlap_s"] = round(min(speculative_s, timings["rewrite_s"]), 4)
+    
+    t = time.perf_counter()
+    with trace.span("retrieval") as s:
+        used = normalize_question(rewritten) == normalize_question(query)
+        s.attrs.update(speculative_used=used, overlap_s=timings["overlap_s"])
+        if used:
+            print("   Stage 2: Rewrite matches the question — using the speculative retrieval")
+            raw_chunks = speculative_chunks
+        else:
+            print("   Stage 2: Hybrid retrieval (Vector + BM25)...")
+            raw_chunks = retrieve_fn(rewritten, top_k=20)
+            if SPECULATIVE_MERGE:
+                raw_chunks = merge_candidates(raw_chunks, speculative_chunks)
+        s.candidates_out = len(raw_chunks)
+    timings["retrieval_s"] = round(time.perf_counter() - t, 4)
+    return rewritten, raw_chunks, timings
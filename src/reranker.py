@@ -1,9 +1,112 @@
-from flashrank import Ranker, RerankRequest
+import hashlib
+import threading
+import numpy as np
+from src.cache import TieredCache
 
-# Downloads model on first run (~50MB), cached after that
-ranker = Ranker(model_name="ms-marco-MiniLM-L-12-v2")
+# Cross-encoder settings per mode: model and the token budget of each
+# (query, passage) pair (longer passages are truncated to fit). "accurate"
+# is FlashRank's defaults; python -m benchmarks.bench_rerank measures
+# each mode's latency and its top-3 agreement with "accurate".
+RERANK_MODES = {
+    "accurate": {"model": "ms-marco-MiniLM-L-12-v2", "max_tokens": 512},
+    "fast": {"model": "ms-marco-MiniLM-L-12-v2", "max_tokens": 256},
+    "fastest": {"model": "ms-marco-TinyBERT-L-2-v2", "max_tokens": 256},
+}
+RERANK_MODE = "accurate"
+RERANK_THREADS = None    # ONNX intra-op threads; None = onnxruntime's default (all cores)
+RERANK_BATCH_SIZE = 64   # (query, passage) pairs per ONNX run in rerank_batch
+RERANK_CACHE_SIZE = 50_000   # cached (query, chunk) scores
+
+# (mode settings, query hash, chunk id + text hash) -> cross-encoder score,
+# so CRAG re-retrieval and repeated questions only score new chunks
+score_cache = TieredCache(maxsize=RERANK_CACHE_SIZE)
+
+_rankers = {}
+_ranker_lock = threading.Lock()
+
+def _settings() -> tuple:
+    mode = RERANK_MODES[RERANK_MODE]
+    return mode["model"], mode["max_tokens"], RERANK_THREADS
+
+def get_ranker():
+    """
+    The flashrank Ranker for the current RERANK_MODE and RERANK_THREADS,
+    loaded on first use (or by src.warmup). Downloads the model on first
+    run (~50MB for the MiniLM models), cached after that.
+    """
+    settings = _settings()
+    ranker = _rankers.get(settings)
+    if ranker is None:
+        with _ranker_lock:
+            ranker = _rankers.get(settings)
+            if ranker is None:
+                ranker = _rankers[settings] = _load_ranker(*settings)
+    return ranker
+
+def _load_ranker(model: str, max_tokens: int, threads: int):
+    from flashrank import Ranker
+    ranker = Ranker(model_name=model, max_length=max_tokens)
+    if threads and getattr(ranker, "session", None) is not None:
+        # Ranker builds its session with default options; rebuild it pinned to `threads`
+        import onnxruntime as ort
+        from flashrank.Config import model_file_map
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        ranker.session = ort.InferenceSession(
+            str(ranker.model_dir / model_file_map[model]), sess_options=options
+        )
+    return ranker
 
 def rerank(query: str, chunks: list, top_k: int = 3) -> list:
+    return rerank_batch([query], [chunks], top_k)[0]
+
+def rerank_batch(queries: list, pools: list, top_k: int = 3,
+                 batch_size: int = RERANK_BATCH_SIZE) -> list:
+    """
+    rerank for many (query, chunks) pools at once. Pairs already in
+    score_cache are not scored again; the rest, across all pools, are
+    scored together in ONNX runs of batch_size, ordered by length so
+    each run pads little, with the same tokenizer, session and score
+    transform as Ranker.rerank. Returns one top_k list per pool.
+    """
+    ranker = get_ranker()
+    if getattr(ranker, "session", None) is None:
+        # Listwise (LLM) rankers have no pairwise session to batch or cache
+        return [_rerank_listwise(ranker, q, chunks, top_k) for q, chunks in zip(queries, pools)]
+    
+    settings = _settings()[:2]
+    query_hashes = [hashlib.sha1(q.encode()).hexdigest() for q in queries]
+    pairs = [(i, c) for i, chunks in enumerate(pools) for c in chunks]
+    keys = [(settings, query_hashes[i], _chunk_key(c)) for i, c in pairs]
+    scores = np.array([score_cache.get(k) for k in keys], dtype=np.float64)
+    
+    missing = np.flatnonzero(np.isnan(scores)).tolist()
+    order = sorted(missing, key=lambda j: len(pairs[j][1]["text"]))
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        scores[batch] = _score_pairs(ranker, [[queries[pairs[j][0]], pairs[j][1]["text"]] for j in batch])
+    for j in missing:
+        score_cache.set(keys[j], float(scores[j]))
+    
+    scored = [[] for _ in pools]
+    for (i, chunk), score in zip(pairs, scores.tolist()):
+        scored[i].append((score, chunk))
+    reranked = []
+    for pool in scored:
+        pool.sort(key=lambda x: x[0], reverse=True)
+        top = []
+        for score, chunk in pool[:top_k]:
+            chunk["rerank_score"] = round(score, 4)
+            top.append(chunk)
+        reranked.append(top)
+    return reranked
+
+def _chunk_key(chunk: dict) -> str:
+    # Text hash guards against an id being reused for different text after re-ingest
+    return f"{chunk['id']}@{hashlib.sha1(chunk['text'].encode()).hexdigest()[:12]}"
+
+def _rerank_listwise(ranker, query: str, chunks: list, top_k: int) -> list:
+    from flashrank import RerankRequest
     passages = [
         {"id": i, "text": c["text"], "meta": c}
         for i, c in enumerate(chunks)
@@ -15,11 +118,26 @@ def rerank(query: str, chunks: list, top_k: int = 3) -> list:
     reranked = []
     for r in results[:top_k]:
         chunk = r["meta"]
-        chunk["rerank_score"] = round(r["score"], 4)
+        chunk["rerank_score"] = round(float(r["score"]), 4)
         reranked.append(chunk)
     
     return reranked
 
+def _score_pairs(ranker, pairs: list) -> np.ndarray:
+    # Ranker.rerank's pairwise path, minus the per-request sort
+    encoded = ranker.tokenizer.encode_batch(pairs)
+    input_ids = np.array([e.ids for e in encoded])
+    token_type_ids = np.array([e.type_ids for e in encoded])
+    attention_mask = np.array([e.attention_mask for e in encoded])
+    onnx_input = {"input_ids": input_ids.astype(np.int64), "attention_mask": attention_mask.astype(np.int64)}
+    if not np.all(token_type_ids == 0):
+        onnx_input["token_type_ids"] = token_type_ids.astype(np.int64)
+    logits = ranker.session.run(None, onnx_input)[0]
+    if logits.shape[1] == 1:
+        return 1 / (1 + np.exp(-logits.flatten()))
+    exp_logits = np.exp(logits)
+    return exp_logits[:, 1] / np.sum(exp_logits, axis=1)
+
 if __name__ == "__main__":
     from src.retriever import retrieve
 
@@ -1,29 +1,21 @@
-import chromadb
-from chromadb.utils import embedding_functions
+from src.engine import RetrievalEngine, get_engine
 
-CHROMA_PATH = "chroma_db"
+def get_collection(engine: RetrievalEngine = None):
+    return (engine or get_engine()).collection
 
-def get_collection():
-    ef = embedding_functions.SentenceTransformerEmbeddingFunction(
-        model_name="all-MiniLM-L6-v2"
-    )
-    client = chromadb.PersistentClient(path=CHROMA_PATH)
-    collection = client.get_collection("transcripts", embedding_function=ef)
-    return collection
-
-def retrieve(query: str, top_k: int = 20) -> list:
-    collection = get_collection()
-    results = collection.query(
-        query_texts=[query],
-        n_results=top_k
-    )
+def retrieve(query: str, top_k: int = 20, engine: RetrievalEngine = None,
+             filters: dict = None) -> list:
+    engine = engine or get_engine()
+    results = engine.vector_query([query], top_k, filters)
+    texts = engine.get_chunks(results["ids"][0])
     
     chunks = []
-    for i, doc in enumerate(results["documents"][0]):
+    for chunk_id, distance in zip(results["ids"][0], results["distances"][0]):
         chunks.append({
-            "text": doc,
-            "source": results["metadatas"][0][i]["source"],
-            "score": round(1 - results["distances"][0][i], 4)
+            "id": chunk_id,
+            "text": texts[chunk_id]["text"],
+            "source": texts[chunk_id]["source"],
+            "score": round(1 - distance, 4)
         })
     return chunks
 
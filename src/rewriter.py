@@ -1,9 +1,14 @@
 import os
-from groq import Groq
-from dotenv import load_dotenv
+import hashlib
+from src.cache import CACHE_DIR, TieredCache
+from src.llm import LLM_MODEL, chat
 
-load_dotenv()
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+REWRITE_MODEL = LLM_MODEL
+
+# Rewrites are cached in memory and on disk so repeat questions cost no LLM call
+REWRITE_CACHE_SIZE = 2048
+REWRITE_CACHE_TTL = 7 * 24 * 3600   # seconds
+REWRITE_CACHE_PATH = os.path.join(CACHE_DIR, "rewrites.sqlite")   # None = memory only
 
 REWRITE_PROMPT = """You are an expert at reformulating financial questions to improve document retrieval from earnings call transcripts.
 
@@ -22,16 +27,40 @@ User Question: {query}
 
 Return ONLY the rewritten query. No explanation, no preamble. Just the rewritten query."""
 
-def rewrite_query(query: str) -> str:
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=[
-            {"role": "user", "content": REWRITE_PROMPT.format(query=query)}
-        ],
+_PROMPT_HASH = hashlib.sha1(REWRITE_PROMPT.encode()).hexdigest()[:12]
+
+rewrite_cache = TieredCache(
+    maxsize=REWRITE_CACHE_SIZE,
+    ttl=REWRITE_CACHE_TTL,
+    path=REWRITE_CACHE_PATH,
+    table="rewrites",
+)
+
+def normalize_question(query: str) -> str:
+    # "How is Apple doing?" and "how is apple doing" share a cache entry
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+def rewrite_query(query: str, stats: dict = None) -> str:
+    """
+    Rewrites the question for retrieval, serving repeats from rewrite_cache.
+    If stats is given, the LLM call (if any) is added to stats["llm_calls"].
+    """
+    key = f"{REWRITE_MODEL}:{_PROMPT_HASH}:{normalize_question(query)}"
+    cached = rewrite_cache.get(key)
+    if cached is not None:
+        return cached
+    
+    rewritten = chat(
+        "rewrite",
+        [{"role": "user", "content": REWRITE_PROMPT.format(query=query)}],
+        model=REWRITE_MODEL,
         temperature=0.3,
         max_tokens=150
-    )
-    return response.choices[0].message.content.strip()
+    ).strip()
+    rewrite_cache.set(key, rewritten)
+    if stats is not None:
+        stats["llm_calls"] = stats.get("llm_calls", 0) + 1
+    return rewritten
 
 if __name__ == "__main__":
     test_queries = [
@@ -46,4 +75,5 @@ if __name__ == "__main__":
         rewritten = rewrite_query(q)
         print(f"Original : {q}")
         print(f"Rewritten: {rewritten}")
-        print("-"*50)
\ No newline at end of file
+        print("-"*50)
+    print(f"Cache: {rewrite_cache.stats()}")
\ No newline at end of file
@@ -0,0 +1,212 @@
+import json
+import multiprocessing as mp
+import os
+import shutil
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+from src.bm25_index import BM25_PATH, BM25Index, BM25IndexWriter, top_k_indices
+from src.chunk_store import ChunkStore
+from src.vector_index import VECTOR_PRECISION, VectorIndex, export_vector_index, fingerprint
+
+SHARDS_PATH = "shards"   # written next to chroma_db/
+SHARD_BY = "ticker"      # "ticker" (groups of tickers) or "year" (groups of years)
+NUM_SHARDS = 4
+SHARD_WORKERS = NUM_SHARDS
+BUILD_BATCH = 2048       # chunks per BM25IndexWriter.add() while splitting
+
+# Each shard directory holds a BM25 index + chunk store, and its
+# embeddings under VECTORS_DIR; MANIFEST_FILE lists the shards
+VECTORS_DIR = "vectors"
+MANIFEST_FILE = "manifest.json"
+
+def plan_shards(corpus: BM25Index, by: str = SHARD_BY, num_shards: int = NUM_SHARDS) -> list:
+    """
+    Groups the corpus's tickers (or years) into at most `num_shards`
+    lists of keys with similar chunk counts, largest key first into the
+    currently smallest shard.
+    """
+    counts = Counter(_doc_keys(corpus, by).tolist())
+    groups = [[] for _ in range(min(num_shards, len(counts)))]
+    sizes = [0] * len(groups)
+    for key, n in counts.most_common():
+        i = sizes.index(min(sizes))
+        groups[i].append(key)
+        sizes[i] += n
+    return [sorted(group) for group in groups]
+
+def _doc_keys(corpus: BM25Index, by: str) -> np.ndarray:
+    if corpus.doc_ticker is None:
+        raise ValueError("BM25 index has no ticker/year fields; re-run ingest before sharding")
+    if by == "ticker":
+        return np.asarray(corpus.tickers, dtype=object)[np.asarray(corpus.doc_ticker)]
+    if by == "year":
+        return np.asarray(corpus.doc_year).astype(np.int64)
+    raise ValueError(f"shard by 'ticker' or 'year', got {by!r}")
+
+def build_shards(collection, corpus_path=BM25_PATH, path=SHARDS_PATH, by: str = SHARD_BY,
+                 num_shards: int = NUM_SHARDS, precision: str = VECTOR_PRECISION):
+    """
+    Splits the corpus BM25 index + chunk store (and the collection's
+    embeddings) into shards by ticker group or year group. Shard BM25
+    indexes keep the corpus IDF and avgdl, so scores stay comparable
+    across shards. Built beside `path` and swapped in when complete.
+    """
+    corpus = BM25Index(corpus_path)
+    store = ChunkStore(corpus_path)
+    groups = plan_shards(corpus, by, num_shards)
+    shard_of_key = {key: i for i, group in enumerate(groups) for key in group}
+    doc_shard = np.array([shard_of_key[k] for k in _doc_keys(corpus, by).tolist()], dtype=np.int32)
+    tickers = np.asarray(corpus.tickers, dtype=object)[np.asarray(corpus.doc_ticker)]
+    years = np.asarray(corpus.doc_year).tolist()
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    if tmp.exists():
+        shutil.rmtree(tmp)
+    names = [f"shard-{i:02d}" for i in range(len(groups))]
+    writers = [BM25IndexWriter(tmp / name, corpus=corpus) for name in names]
+    for start in range(0, corpus.num_docs, BUILD_BATCH):
+        docs = np.arange(start, min(start + BUILD_BATCH, corpus.num_docs))
+        for i, writer in enumerate(writers):
+            mine = docs[doc_shard[docs] == i].tolist()
+            writer.add(
+                [corpus.chunk_ids[d] for d in mine],
+                [store.text(d) for d in mine],
+                [{"ticker": tickers[d], "year": years[d], "source": store.source(d)} for d in mine],
+            )
+
+    shards = []
+    for name, writer, group in zip(names, writers, groups):
+        writer.finish()
+        index = BM25Index(tmp / name)
+        export_vector_index(collection, index.chunk_ids, tmp / name / VECTORS_DIR, precision)
+        pairs = {(index.tickers[t], int(y)) for t, y in zip(np.asarray(index.doc_ticker).tolist(),
+                                                             np.asarray(index.doc_year).tolist())}
+        shards.append({"name": name, "keys": group, "num_docs": index.num_docs,
+                       "pairs": sorted(pairs)})
+        print(f"   {name}: {', '.join(map(str, group))} ({index.num_docs} chunks)")
+    # manifest.json goes last: shards_exist() keys on it
+    with open(tmp / MANIFEST_FILE, "w", encoding="utf-8") as f:
+        json.dump({"by": by, "precision": precision, "fingerprint": fingerprint(corpus.chunk_ids),
+                   "shards": shards}, f)
+
+    if path.exists():
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+
+def shards_exist(path=SHARDS_PATH) -> bool:
+    return (Path(path) / MANIFEST_FILE).exists()
+
+def load_manifest(path=SHARDS_PATH) -> dict:
+    with open(Path(path) / MANIFEST_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+# --- Worker side: each process opens the shards it is asked about once ---
+
+_root = None
+_open_shards = {}
+
+def _init_worker(root: str):
+    global _root
+    _root = root
+
+def _open(name: str) -> tuple:
+    if name not in _open_shards:
+        path = Path(_root) / name
+        _open_shards[name] = (BM25Index(path), VectorIndex(path / VECTORS_DIR), ChunkStore(path))
+    return _open_shards[name]
+
+def search_shard(name: str, query_vector, tokens: list, top_k: int, filters: dict = None) -> tuple:
+    """
+    One shard's top_k vector hits as (id, distance) and top_k BM25 hits
+    as (id, raw score), plus {id: (text, source)} for every hit.
+    Distances are the backend's l2 convention (2 - 2·cos).
+    """
+    bm25, vectors, store = _open(name)
+    mask = bm25.candidate_mask(filters)
+    if mask is not None and not mask.any():
+        return [], [], {}
+
+    docs, sims = vectors.search(query_vector, top_k, mask)
+    vector_hits = [(int(d), 2 - 2 * float(s)) for d, s in zip(docs[0].tolist(), sims[0].tolist())]
+
+    scores = bm25.get_scores(tokens, mask)
+    if mask is None:
+        top = top_k_indices(scores, top_k)
+    else:
+        candidates = np.flatnonzero(mask)
+        top = candidates[top_k_indices(scores[candidates], top_k)]
+    bm25_hits = [(int(d), float(scores[d])) for d in top]
+
+    texts = {}
+    for d, _ in vector_hits + bm25_hits:
+        texts[bm25.chunk_ids[d]] = (store.text(d), store.source(d))
+    return (
+        [(bm25.chunk_ids[d], dist) for d, dist in vector_hits],
+        [(bm25.chunk_ids[d], score) for d, score in bm25_hits],
+        texts,
+    )
+
+class ShardPool:
+    """
+    Coordinator for scatter-gather retrieval: routes a query to the
+    shards that can match its filters and searches them in parallel in
+    worker processes (spawned, so workers never inherit model or client
+    state). Each worker memory-maps only the shards it serves.
+    """
+
+    def __init__(self, path=SHARDS_PATH, workers: int = SHARD_WORKERS):
+        self.path = Path(path)
+        manifest = load_manifest(path)
+        self.by = manifest["by"]
+        self.fingerprint = manifest["fingerprint"]
+        self.shards = manifest["shards"]
+        self.executor = ProcessPoolExecutor(
+            max_workers=min(workers, len(self.shards)) or 1,
+            mp_context=mp.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(str(self.path),),
+        )
+
+    def route(self, filters: dict) -> tuple:
+        """
+        (shard names, filters) for a query. Filters matching no chunk
+        in any shard are dropped and every shard is searched, like the
+        single-index fallback.
+        """
+        if filters:
+            names = [
+                shard["name"] for shard in self.shards
+                if any(_pair_matches(filters, ticker, year) for ticker, year in shard["pairs"])
+            ]
+            if names:
+                return names, filters
+        return [shard["name"] for shard in self.shards], None
+
+    def search(self, query_vector, tokens: list, top_k: int, filters: dict = None) -> list:
+        """Fans out search_shard over the routed shards; one result per shard."""
+        names, filters = self.route(filters)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        futures = [
+            self.executor.submit(search_shard, name, query_vector, tokens, top_k, filters)
+            for name in names
+        ]
+        return [f.result() for f in futures]
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def _pair_matches(filters: dict, ticker: str, year: int) -> bool:
+    return ((not filters.get("ticker") or ticker in filters["ticker"])
+            and (not filters.get("year") or year in filters["year"]))
+
+if __name__ == "__main__":
+    import sys
+    from src.engine import get_engine
+    by = sys.argv[1] if len(sys.argv) > 1 else SHARD_BY
+    num_shards = int(sys.argv[2]) if len(sys.argv) > 2 else NUM_SHARDS
+    print(f"\n Splitting the corpus into {num_shards} shards by {by}...")
+    build_shards(get_engine().collection, by=by, num_shards=num_shards)
+    print(f" Saved to: {SHARDS_PATH}/")
@@ -0,0 +1,222 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+# Set to a file path to append every finished pipeline trace as a JSON line
+TRACE_LOG_PATH = None
+
+# Upper bounds (seconds) of the per-stage latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = "earningsiq_stage"
+
+# (trace, span) that LLM calls and nested spans are accounted to
+_current = contextvars.ContextVar("tracing_current", default=None)
+
+class Span:
+    """One timed stage: wall time, LLM usage and candidate counts."""
+
+    def __init__(self, name: str, parent: str = None):
+        self.name, self.parent = name, parent
+        self.wall_s = 0.0
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.candidates_in = None
+        self.candidates_out = None
+        self.attrs = {}
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "parent": self.parent,
+            "wall_s": round(self.wall_s, 6),
+            "llm_calls": self.llm_calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "candidates_in": self.candidates_in,
+            "candidates_out": self.candidates_out,
+            **self.attrs,
+        }
+
+class Trace:
+    """
+    The spans of one pipeline run. span() times a stage and makes it the
+    current span of the calling thread, so LLM calls made inside it
+    (src.llm) and nested tracing.span() calls are accounted to it.
+    """
+
+    def __init__(self, query: str):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.query = query
+        self.spans = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, candidates_in: int = None):
+        current = _current.get()
+        parent = current[1].name if current is not None and current[0] is self else None
+        s = Span(name, parent)
+        s.candidates_in = candidates_in
+        with self._lock:
+            self.spans.append(s)
+        token = _current.set((self, s))
+        start = time.perf_counter()
+        try:
+            yield s
+        finally:
+            s.wall_s = time.perf_counter() - start
+            try:
+                _current.reset(token)
+            except ValueError:
+                # Ended in another context (e.g. a stream consumed elsewhere)
+                _current.set(current)
+
+    def add_spans(self, spans: list, **attrs):
+        """Copies spans timed elsewhere, e.g. batch-wide stages, into this trace."""
+        with self._lock:
+            for s in spans:
+                copy = Span(s.name, s.parent)
+                copy.__dict__.update({k: v for k, v in s.__dict__.items() if k != "attrs"})
+                copy.attrs = {**s.attrs, **attrs}
+                self.spans.append(copy)
+
+    def record_llm(self, span: Span, prompt_tokens: int, completion_tokens: int):
+        with self._lock:
+            span.llm_calls += 1
+            span.prompt_tokens += prompt_tokens
+            span.completion_tokens += completion_tokens
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "trace_id": self.trace_id,
+                "query": self.query,
+                "spans": [s.to_dict() for s in self.spans],
+            }
+
+@contextmanager
+def span(name: str, candidates_in: int = None):
+    """
+    A span nested in the current one, or a no-op (yielding a detached
+    Span) when no trace is active on this thread.
+    """
+    current = _current.get()
+    if current is None:
+        s = Span(name)
+        s.candidates_in = candidates_in
+        yield s
+        return
+    with current[0].span(name, candidates_in) as s:
+        yield s
+
+def record_llm(prompt_tokens: int, completion_tokens: int):
+    """Accounts one completed LLM call to the current span, if any."""
+    current = _current.get()
+    if current is not None:
+        current[0].record_llm(current[1], prompt_tokens, completion_tokens)
+
+def bind(fn):
+    """fn, run under the caller's current span wherever it is called (e.g. a pool thread)."""
+    current = _current.get()
+    def bound(*args, **kwargs):
+        token = _current.set(current)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current.reset(token)
+    return bound
+
+def log_trace(trace: dict, path: str = None):
+    """Appends a finished trace dict to `path` (default TRACE_LOG_PATH) as one JSON line."""
+    path = path or TRACE_LOG_PATH
+    if path is None:
+        return
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(trace) + "\n")
+
+def to_json_lines(traces: list) -> str:
+    """One JSON object per span, tagged with its trace id, for log pipelines."""
+    lines = []
+    for trace in traces:
+        for s in trace["spans"]:
+            lines.append(json.dumps({"trace_id": trace["trace_id"], **s}))
+    return "\n".join(lines) + ("\n" if lines else "")
+
+def to_prometheus(traces: list, prefix: str = METRIC_PREFIX) -> str:
+    """
+    Prometheus text exposition of the spans of `traces`, aggregated by
+    stage: a latency histogram (so p95 can be taken with
+    histogram_quantile) plus LLM call, token and candidate counters.
+    """
+    stages = {}
+    for trace in traces:
+        for s in trace["spans"]:
+            stage = stages.setdefault(s["name"], {
+                "buckets": [0] * len(LATENCY_BUCKETS), "count": 0, "sum": 0.0,
+                "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "candidates": 0,
+            })
+            stage["count"] += 1
+            stage["sum"] += s["wall_s"]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if s["wall_s"] <= bound:
+                    stage["buckets"][i] += 1
+            for key in ("llm_calls", "prompt_tokens", "completion_tokens"):
+                stage[key] += s[key]
+            stage["candidates"] += s["candidates_out"] or 0
+
+    lines = [
+        f"# HELP {prefix}_seconds Wall time per pipeline stage.",
+        f"# TYPE {prefix}_seconds histogram",
+    ]
+    for name, stage in sorted(stages.items()):
+        for bound, n in zip(LATENCY_BUCKETS, stage["buckets"]):
+            lines.append(f'{prefix}_seconds_bucket{{stage="{name}",le="{bound}"}} {n}')
+        lines.append(f'{prefix}_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+        lines.append(f'{prefix}_seconds_sum{{stage="{name}"}} {stage["sum"]:.6f}')
+        lines.append(f'{prefix}_seconds_count{{stage="{name}"}} {stage["count"]}')
+    for key, help_text in (
+        ("llm_calls", "LLM calls made per stage."),
+        ("prompt_tokens", "LLM prompt tokens per stage."),
+        ("completion_tokens", "LLM completion tokens per stage."),
+        ("candidates", "Chunks output per stage."),
+    ):
+        lines.append(f"# HELP {prefix}_{key}_total {help_text}")
+        lines.append(f"# TYPE {prefix}_{key}_total counter")
+        for name, stage in sorted(stages.items()):
+            lines.append(f'{prefix}_{key}_total{{stage="{name}"}} {stage[key]}')
+    return "\n".join(lines) + "\n"
+
+def percentiles(values: list, ps: tuple = (50, 95, 99)) -> dict:
+    """{"count": n, "p50": ..., ...} of values (nearest rank)."""
+    values = sorted(values)
+    row = {"count": len(values)}
+    for p in ps:
+        row[f"p{p}"] = values[min(len(values) - 1, int(len(values) * p / 100))] if values else None
+    return row
+
+def stage_percentiles(traces: list, ps: tuple = (50, 95, 99)) -> dict:
+    """{stage: {"count": n, "p50": s, ...}} of span wall times across traces."""
+    walls = {}
+    for trace in traces:
+        for s in trace["spans"]:
+            walls.setdefault(s["name"], []).append(s["wall_s"])
+    return {name: percentiles(values, ps) for name, values in walls.items()}
+
+if __name__ == "__main__":
+    import sys
+
+    # python -m src.tracing traces.jsonl [--prometheus]
+    path = sys.argv[1] if len(sys.argv) > 1 else "traces.jsonl"
+    with open(path, encoding="utf-8") as f:
+        traces = [json.loads(line) for line in f if line.strip()]
+    if "--prometheus" in sys.argv:
+        print(to_prometheus(traces), end="")
+    else:
+        print(f"\n {len(traces)} traces from {path}")
+        print(f"  {'stage':<24} {'count':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+        for name, row in sorted(stage_percentiles(traces).items(), key=lambda x: -x[1]["p95"]):
+            print(f"  {name:<24} {row['count']:>6} {row['p50']:8.3f}s {row['p95']:8.3f}s {row['p99']:8.3f}s")
@@ -0,0 +1,144 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+import numpy as np
+
+VECTOR_PATH = "vector_index"   # written next to chroma_db/
+# int8 is 4x smaller than float32 and about as fast; float16 is 2x smaller
+# but numpy's half -> float upcast costs more than the matmul itself
+VECTOR_PRECISION = "int8"      # "float32", "float16" or "int8"
+PRECISIONS = ("float32", "float16", "int8")
+
+EXPORT_BATCH = 5_000        # embeddings per Chroma get() while exporting
+BLOCK_ROWS = 1 << 12        # float16/int8 rows upcast to float32 per matmul
+
+def fingerprint(chunk_ids: list) -> str:
+    """Identifies the row order: the index is stale once the BM25 doc ids change."""
+    return hashlib.sha1(json.dumps(list(chunk_ids)).encode("utf-8")).hexdigest()
+
+def export_vector_index(collection, chunk_ids: list, path=VECTOR_PATH,
+                        precision: str = VECTOR_PRECISION, batch_size: int = EXPORT_BATCH):
+    """
+    Copies the collection's embeddings into a dense matrix whose row i is
+    BM25 doc i (so filter masks and the chunk store apply as-is). Rows
+    are L2-normalized; int8 rows keep a float32 scale each. Ids missing
+    from the collection get a zero row and never rank.
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"precision must be one of {PRECISIONS}, got {precision!r}")
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    chunk_ids = list(chunk_ids)
+
+    matrix = scales = None
+    missing = 0
+    for start in range(0, len(chunk_ids), batch_size):
+        ids = chunk_ids[start:start + batch_size]
+        data = collection.get(ids=ids, include=["embeddings"])
+        found = dict(zip(data["ids"], data["embeddings"]))
+        if matrix is None and found:
+            dim = len(next(iter(found.values())))
+            tmp = path / "embeddings.npy.tmp"
+            matrix = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.dtype(precision),
+                                               shape=(len(chunk_ids), dim))
+            scales = np.ones(len(chunk_ids), dtype=np.float32)
+        if matrix is None:
+            missing += len(ids)
+            continue
+        rows = np.zeros((len(ids), matrix.shape[1]), dtype=np.float32)
+        for i, cid in enumerate(ids):
+            if cid in found:
+                rows[i] = found[cid]
+            else:
+                missing += 1
+        norms = np.linalg.norm(rows, axis=1, keepdims=True)
+        rows /= np.where(norms > 0, norms, 1)
+        if precision == "int8":
+            # Symmetric per-row quantization: row ≈ q * scale
+            peak = np.abs(rows).max(axis=1)
+            scale = np.where(peak > 0, peak / 127, 1).astype(np.float32)
+            matrix[start:start + len(ids)] = np.round(rows / scale[:, None]).astype(np.int8)
+            scales[start:start + len(ids)] = scale
+        else:
+            matrix[start:start + len(ids)] = rows
+    if matrix is None:
+        raise ValueError("collection has no embeddings to export")
+    matrix.flush()
+    del matrix
+    os.replace(path / "embeddings.npy.tmp", path / "embeddings.npy")
+
+    tmp = path / "scales.npy.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, scales)
+    os.replace(tmp, path / "scales.npy")
+    if missing:
+        print(f"   Warning: {missing} chunk ids had no embedding in the collection")
+    # meta.json goes last: VectorIndex.exists() keys on it
+    tmp = path / "meta.json.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"precision": precision, "num_docs": len(chunk_ids),
+                   "fingerprint": fingerprint(chunk_ids)}, f)
+    os.replace(tmp, path / "meta.json")
+
+class VectorIndex:
+    """
+    Exact (brute-force) cosine search over the exported embeddings.
+    The matrix is memory-mapped; a query batch costs one matmul (float32,
+    or per BLOCK_ROWS rows after upcasting float16/int8) plus an
+    argpartition, with no ANN graph to load.
+    """
+
+    def __init__(self, path=VECTOR_PATH):
+        path = Path(path)
+        self.embeddings = np.load(path / "embeddings.npy", mmap_mode="r")
+        self.scales = np.load(path / "scales.npy", mmap_mode="r")
+        with open(path / "meta.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.precision = meta["precision"]
+        self.fingerprint = meta["fingerprint"]
+        self.num_docs, self.dim = self.embeddings.shape
+
+    @staticmethod
+    def exists(path=VECTOR_PATH) -> bool:
+        return (Path(path) / "meta.json").exists()
+
+    def similarities(self, query_vectors, rows: np.ndarray = None) -> np.ndarray:
+        """Cosine similarity of each query (Q x dim) to every doc, or only to `rows`."""
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        embeddings, scales = self.embeddings, self.scales
+        if rows is not None:
+            embeddings, scales = embeddings[rows], scales[rows]
+        out = np.empty((len(embeddings), len(queries)), dtype=np.float32)
+        if embeddings.dtype == np.float32:
+            np.matmul(embeddings, queries.T, out=out)
+        else:
+            # float16/int8 have no BLAS kernels: upcast a cache-sized block
+            # at a time into a reused buffer
+            buf = np.empty((min(BLOCK_ROWS, len(embeddings)), self.dim), dtype=np.float32)
+            for start in range(0, len(embeddings), BLOCK_ROWS):
+                block = embeddings[start:start + BLOCK_ROWS]
+                np.copyto(buf[:len(block)], block)
+                np.matmul(buf[:len(block)], queries.T, out=out[start:start + len(block)])
+        if self.precision == "int8":
+            out *= np.asarray(scales, dtype=np.float32)[:, None]
+        return out.T
+
+    def search(self, query_vectors, top_k: int, mask: np.ndarray = None) -> tuple:
+        """
+        Top `top_k` docs per query, best first, restricted to `mask` if
+        given. Returns (docs, similarities), both Q x k.
+        """
+        rows = np.flatnonzero(mask) if mask is not None else None
+        sims = self.similarities(query_vectors, rows)
+        k = min(top_k, sims.shape[1])
+        if k == 0:
+            return np.empty((len(sims), 0), dtype=np.int64), np.empty((len(sims), 0), dtype=np.float32)
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        top_sims = np.take_along_axis(sims, top, axis=1)
+        order = np.argsort(-top_sims, axis=1, kind="stable")
+        top = np.take_along_axis(top, order, axis=1)
+        top_sims = np.take_along_axis(top_sims, order, axis=1)
+        docs = rows[top] if rows is not None else top
+        return docs, top_sims
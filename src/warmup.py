@@ -0,0 +1,86 @@
+import threading
+import time
+from src.engine import RetrievalEngine, get_engine
+
+class Warmup:
+    """
+    Loads the pipeline's heavy components in parallel background threads:
+    the reranker model, the embedder (plus one encode to initialise it),
+    the Chroma collection, the BM25 index and chunk store (and the
+    numpy vector index or shard workers when configured), and the LLM
+    client. Every component also loads itself on first use, behind the
+    same locks, so a query asked mid-warm-up just waits for what it needs.
+    `timings` maps each finished component to its load time in seconds;
+    `errors` holds the exceptions of any that failed (they are raised
+    again on first use).
+    """
+
+    def __init__(self, engine: RetrievalEngine = None):
+        self.engine = engine or get_engine()
+        self.timings = {}
+        self.errors = {}
+        self.started = time.perf_counter()
+        self._ended = {}
+        self._threads = [
+            threading.Thread(target=self._load, args=(name, fn), name=f"warmup-{name}", daemon=True)
+            for name, fn in self._components().items()
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _components(self) -> dict:
+        from src import llm, reranker
+        engine = self.engine
+
+        def indexes():
+            engine.chunk_store()
+            if engine.use_shards:
+                engine.shard_pool()
+            elif engine.vector_backend == "numpy":
+                engine.vector_index()
+
+        return {
+            "reranker": reranker.get_ranker,
+            "embedder": lambda: engine.embedding_function(["warm-up"]),
+            "collection": lambda: engine.collection,
+            "indexes": indexes,
+            "llm": llm.get_gateway,
+        }
+
+    def _load(self, name: str, fn):
+        t = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self.errors[name] = e
+        self._ended[name] = time.perf_counter()
+        self.timings[name] = round(self._ended[name] - t, 4)
+
+    def done(self) -> bool:
+        return len(self._ended) == len(self._threads)
+
+    def wait(self, timeout: float = None) -> bool:
+        """Blocks until every component has loaded (or failed); False on timeout."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.perf_counter()))
+        return all(not thread.is_alive() for thread in self._threads)
+
+    def elapsed(self) -> float:
+        """Seconds from start until every component was ready (or until now)."""
+        end = max(self._ended.values()) if self.done() else time.perf_counter()
+        return round(end - self.started, 4)
+
+    def report(self) -> str:
+        parts = [f"{name} {seconds:.2f}s" for name, seconds in sorted(self.timings.items(),
+                                                                       key=lambda x: -x[1])]
+        parts += [f"{name} FAILED ({e})" for name, e in self.errors.items()]
+        state = "done" if self.done() else "still running"
+        return f"warm-up {state} in {self.elapsed():.2f}s ({', '.join(parts)})"
+
+def warmup(engine: RetrievalEngine = None, wait: bool = False) -> Warmup:
+    """Starts a Warmup in the background; with wait=True, returns once it has finished."""
+    w = Warmup(engine)
+    if wait:
+        w.wait()
+    return w